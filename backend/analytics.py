@@ -0,0 +1,320 @@
+# backend/analytics.py
+
+# =============================================================================
+# A N A L Y T I C S   C U B E
+# =============================================================================
+# Pre-aggregated counts of counterfeit reports and ADR reports for the dashboard
+# KPIs and trend charts. The counts are kept per
+#
+#     (source, day, state, drug, manufacturer, status)
+#
+# in `analytics_cube`. Triggers maintain it in the same transaction as every
+# INSERT, DELETE and relevant UPDATE on `reports` and `adr_reports`, so a trend
+# query reads aggregate rows and never the report tables.
+#
+#   - `analytics_facts` remembers the dimensions each row was counted under.
+#     When a row changes or is deleted, exactly that cell is decremented, even
+#     if (say) its batch was registered in `drugs` after it was reported.
+#   - drug and manufacturer come from the registered batch when it exists.
+#     Otherwise drug is the name the reporter typed and manufacturer is
+#     'Unknown'. ADR reports always reference a registered drug.
+#   - state is matched from the location text (state names, capitals and
+#     large cities, see STATE_PLACES). Failing that, the nearest state capital
+#     within ~2 degrees of the coordinates is used, else 'Unknown'. ADR reports
+#     carry no location.
+#   - status follows backend/report_counters.py: 0/NULL/'New' are 'New', and
+#     linked near-duplicates are 'Duplicate', which queries leave out unless
+#     asked for.
+#
+#   python -m backend.analytics rebuild
+#   python -m backend.analytics show [day|week|month]
+# =============================================================================
+
+import sqlite3
+import sys
+
+from backend.config import get_config
+from backend.report_counters import counter_key
+
+cfg = get_config()
+
+SOURCES = ("reports", "adr_reports")
+DIMENSIONS = ("state", "drug", "manufacturer", "status")
+BUCKETS = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",  # Monday of the ISO week
+    "month": "strftime('%Y-%m-01', day)",
+}
+# Squared degrees; about 2 degrees around a state capital.
+MAX_CAPITAL_DISTANCE = 4.0
+
+# (state, capital latitude, capital longitude, other place names that identify it)
+STATE_PLACES = [
+    ("Abia", 5.5263, 7.4896, ["umuahia", "aba"]),
+    ("Adamawa", 9.2035, 12.4954, ["yola"]),
+    ("Akwa Ibom", 5.0377, 7.9128, ["uyo"]),
+    ("Anambra", 6.2104, 7.0741, ["awka", "onitsha", "nnewi"]),
+    ("Bauchi", 10.3158, 9.8442, []),
+    ("Bayelsa", 4.9267, 6.2676, ["yenagoa"]),
+    ("Benue", 7.7337, 8.5217, ["makurdi"]),
+    ("Borno", 11.8311, 13.1510, ["maiduguri"]),
+    ("Cross River", 4.9757, 8.3417, ["calabar"]),
+    ("Delta", 6.1980, 6.7319, ["asaba", "warri"]),
+    ("Ebonyi", 6.3249, 8.1137, ["abakaliki"]),
+    ("Edo", 6.3350, 5.6037, ["benin city"]),
+    ("Ekiti", 7.6211, 5.2214, ["ado ekiti"]),
+    ("Enugu", 6.4584, 7.5464, ["nsukka"]),
+    ("FCT", 9.0765, 7.3986, ["abuja", "federal capital territory"]),
+    ("Gombe", 10.2897, 11.1673, []),
+    ("Imo", 5.4840, 7.0351, ["owerri"]),
+    ("Jigawa", 11.7560, 9.3390, ["dutse"]),
+    ("Kaduna", 10.5105, 7.4165, ["zaria"]),
+    ("Kano", 12.0022, 8.5920, []),
+    ("Katsina", 12.9908, 7.6018, []),
+    ("Kebbi", 12.4539, 4.1975, ["birnin kebbi"]),
+    ("Kogi", 7.8023, 6.7333, ["lokoja"]),
+    ("Kwara", 8.4966, 4.5426, ["ilorin"]),
+    ("Lagos", 6.6018, 3.3515, ["ikeja", "lekki", "ikorodu", "surulere", "yaba", "victoria island", "epe"]),
+    ("Nasarawa", 8.4939, 8.5153, ["lafia", "keffi"]),
+    ("Niger", 9.5836, 6.5463, ["minna", "suleja"]),
+    ("Ogun", 7.1475, 3.3619, ["abeokuta", "ijebu ode", "sagamu", "ota"]),
+    ("Ondo", 7.2571, 5.2058, ["akure"]),
+    ("Osun", 7.7827, 4.5418, ["osogbo", "ile ife"]),
+    ("Oyo", 7.3775, 3.9470, ["ibadan", "ogbomoso"]),
+    ("Plateau", 9.8965, 8.8583, ["jos"]),
+    ("Rivers", 4.8156, 7.0498, ["port harcourt"]),
+    ("Sokoto", 13.0059, 5.2476, []),
+    ("Taraba", 8.8937, 11.3596, ["jalingo"]),
+    ("Yobe", 11.7470, 11.9608, ["damaturu"]),
+    ("Zamfara", 12.1704, 6.6641, ["gusau"]),
+]
+
+
+class AnalyticsQueryError(ValueError):
+    """Raised for a malformed analytics query; the message is safe to show."""
+
+
+# --- Dimension expressions (SQL, evaluated for a row named `row`) ------------------
+
+def _normalized_location(row):
+    return (f"(' ' || replace(replace(replace(replace(lower({row}.location), ',', ' '), '.', ' '), "
+            f"'-', ' '), '/', ' ') || ' ')")
+
+
+def _dimension_values(source, row):
+    """SQL expressions for (day, state, drug, manufacturer, status) of a row of `source`."""
+    if source == "reports":
+        distance = (f"((latitude - {row}.latitude) * (latitude - {row}.latitude)"
+                    f" + (longitude - {row}.longitude) * (longitude - {row}.longitude))")
+        day = f"COALESCE(date({row}.reported_on), date('now'))"
+        state = f"""COALESCE(
+            (SELECT state FROM analytics_state_places
+             WHERE {_normalized_location(row)} LIKE '% ' || place || ' %'
+             ORDER BY length(place) DESC LIMIT 1),
+            (SELECT substr(MIN(printf('%09.4f|', {distance}) || state), 11) FROM analytics_state_places
+             WHERE latitude IS NOT NULL AND {distance} < {MAX_CAPITAL_DISTANCE}),
+            'Unknown')"""
+        drug = (f"COALESCE((SELECT name FROM drugs WHERE batch_number = {row}.batch_number), "
+                f"NULLIF(trim({row}.drug_name), ''), 'Unknown')")
+        manufacturer = f"COALESCE((SELECT manufacturer FROM drugs WHERE batch_number = {row}.batch_number), 'Unknown')"
+    else:
+        day = f"COALESCE(date({row}.report_date), date('now'))"
+        state = "'Unknown'"
+        drug = f"COALESCE((SELECT name FROM drugs WHERE id = {row}.drug_id), 'Unknown')"
+        manufacturer = f"COALESCE((SELECT manufacturer FROM drugs WHERE id = {row}.drug_id), 'Unknown')"
+    return day, state, drug, manufacturer, counter_key(source, row)
+
+
+CELL = "(source, day, state, drug, manufacturer, status)"
+
+
+def _fact_cell(source, row):
+    return (f"(SELECT source, day, state, drug, manufacturer, status FROM analytics_facts "
+            f"WHERE source = '{source}' AND row_id = {row}.id)")
+
+
+def _add_fact(source, row):
+    values = ", ".join(_dimension_values(source, row))
+    return f"""
+        INSERT OR REPLACE INTO analytics_facts (source, row_id, day, state, drug, manufacturer, status)
+        VALUES ('{source}', {row}.id, {values});
+        INSERT INTO analytics_cube (source, day, state, drug, manufacturer, status, count)
+        SELECT source, day, state, drug, manufacturer, status, 1 FROM analytics_facts
+        WHERE source = '{source}' AND row_id = {row}.id
+        ON CONFLICT (source, day, state, drug, manufacturer, status) DO UPDATE SET count = count + 1;
+    """
+
+
+def _remove_fact(source, row):
+    return f"""
+        UPDATE analytics_cube SET count = count - 1 WHERE {CELL} = {_fact_cell(source, row)};
+        DELETE FROM analytics_cube WHERE count <= 0 AND {CELL} = {_fact_cell(source, row)};
+        DELETE FROM analytics_facts WHERE source = '{source}' AND row_id = {row}.id;
+    """
+
+
+WATCHED_COLUMNS = {
+    "reports": "reported_on, status, cluster_id, location, latitude, longitude, drug_name, batch_number",
+    "adr_reports": "report_date, status, drug_id",
+}
+
+
+def _triggers(source):
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {source}_analytics_insert AFTER INSERT ON {source} BEGIN
+            {_add_fact(source, "new")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {source}_analytics_delete AFTER DELETE ON {source} BEGIN
+            {_remove_fact(source, "old")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {source}_analytics_update
+        AFTER UPDATE OF {WATCHED_COLUMNS[source]} ON {source} BEGIN
+            {_remove_fact(source, "old")}
+            {_add_fact(source, "new")}
+        END
+        """,
+    ]
+
+
+def init_analytics(conn):
+    """Create the cube tables and triggers (called from init_db). Builds the cube the first time."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'analytics_cube'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_state_places (
+            place TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_facts (
+            source TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            state TEXT NOT NULL,
+            drug TEXT NOT NULL,
+            manufacturer TEXT NOT NULL,
+            status TEXT NOT NULL,
+            PRIMARY KEY (source, row_id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS analytics_cube (
+            source TEXT NOT NULL,
+            day TEXT NOT NULL,
+            state TEXT NOT NULL,
+            drug TEXT NOT NULL,
+            manufacturer TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (source, day, state, drug, manufacturer, status)
+        ) WITHOUT ROWID
+    """)
+    places = []
+    for state, latitude, longitude, others in STATE_PLACES:
+        places.append((state.lower(), state, latitude, longitude))
+        places.extend((other, state, None, None) for other in others)
+    conn.executemany(
+        "INSERT OR IGNORE INTO analytics_state_places (place, state, latitude, longitude) VALUES (?, ?, ?, ?)",
+        places,
+    )
+    for source in SOURCES:
+        for statement in _triggers(source):
+            conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Recompute every fact and the whole cube from the report tables."""
+    conn.execute("DELETE FROM analytics_facts")
+    conn.execute("DELETE FROM analytics_cube")
+    for source in SOURCES:
+        values = ", ".join(_dimension_values(source, source))
+        conn.execute(f"""
+            INSERT INTO analytics_facts (source, row_id, day, state, drug, manufacturer, status)
+            SELECT '{source}', {source}.id, {values} FROM {source}
+        """)
+    conn.execute("""
+        INSERT INTO analytics_cube (source, day, state, drug, manufacturer, status, count)
+        SELECT source, day, state, drug, manufacturer, status, COUNT(*)
+        FROM analytics_facts GROUP BY source, day, state, drug, manufacturer, status
+    """)
+
+
+# --- Queries ------------------------------------------------------------------------
+
+def query(conn, source="reports", bucket="day", start=None, end=None, group_by=(), filters=None):
+    """
+    Time-bucketed counts from the cube.
+
+    group_by   dimensions to split each period by (state, drug, manufacturer, status)
+    filters    {dimension: [values]}; 'Duplicate' is excluded unless asked for
+    start, end inclusive 'YYYY-MM-DD' bounds on the report day
+
+    Returns {"series": [{"period": ..., <group_by dims>..., "count": n}], "total": n}.
+    """
+    if source not in SOURCES:
+        raise AnalyticsQueryError(f"source must be one of: {', '.join(SOURCES)}")
+    if bucket not in BUCKETS:
+        raise AnalyticsQueryError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    unknown = [d for d in list(group_by) + list(filters or {}) if d not in DIMENSIONS]
+    if unknown:
+        raise AnalyticsQueryError(f"Unknown dimensions: {', '.join(unknown)}")
+
+    where, params = ["source = ?"], [source]
+    if start:
+        where.append("day >= ?")
+        params.append(start)
+    if end:
+        where.append("day <= ?")
+        params.append(end)
+    filters = dict(filters or {})
+    if "status" not in filters:
+        where.append("status != 'Duplicate'")
+    for dimension, values in filters.items():
+        where.append(f"{dimension} IN ({','.join('?' * len(values))})")
+        params.extend(values)
+
+    columns = "".join(f", {d}" for d in group_by)
+    rows = conn.execute(
+        f"""
+        SELECT {BUCKETS[bucket]} AS period{columns}, SUM(count) AS count
+        FROM analytics_cube
+        WHERE {" AND ".join(where)}
+        GROUP BY period{columns}
+        ORDER BY period{columns}
+        """,
+        params,
+    ).fetchall()
+    series = [dict(zip(("period",) + tuple(group_by) + ("count",), row)) for row in rows]
+    return {"series": series, "total": sum(item["count"] for item in series)}
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "show"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "rebuild":
+        init_analytics(conn)
+        rebuild(conn)
+        conn.commit()
+        cells = conn.execute("SELECT COUNT(*) FROM analytics_cube").fetchone()[0]
+        print(f"✅ Analytics cube rebuilt ({cells} cells).")
+    elif command == "show":
+        bucket = sys.argv[2] if len(sys.argv) > 2 else "month"
+        for source in SOURCES:
+            print(f"{source}:")
+            for item in query(conn, source, bucket)["series"]:
+                print(f"  {item['period']}  {item['count']}")
+    else:
+        print("Usage: python -m backend.analytics [rebuild|show [day|week|month]]")
+        sys.exit(2)
+    conn.close()
@@ -39,7 +39,7 @@ from backend.database import init_db, get_db, close_db
 from backend.models import get_admin_by_email
 from backend.routes.register import register_bp
 from backend.routes.verify import verify_bp
-from backend.routes.report import report_bp
+from backend.routes.report import report_bp, report_image_url
 from backend.routes.sms import sms_bp
 from backend.routes.ai import ai_bp
 from backend.routes.admin import admin_bp
@@ -51,6 +51,13 @@ from backend.routes.adr import adr_bp
 from backend.routes.hotspot import hotspot_bp
 from backend.notifications import mail
 from backend.routes.stores import stores_bp
+from backend.routes.verify_api import verify_api_bp
+from backend.routes.ledger_api import ledger_bp
+from backend.routes.analysis import analysis_bp
+from backend.report_counters import register_socket_handlers
+from backend.export_jobs import export_jobs
+from backend.notification_queue import notification_worker
+from backend import packaging_match
 
 HAS_ADMIN = True
 
@@ -83,6 +90,9 @@ def create_app():
     app.config.from_object(cfg)
     
     socketio = SocketIO(app)
+    register_socket_handlers(socketio)
+    export_jobs.attach(socketio)
+    packaging_match.attach(socketio)
 
     app.config['LANGUAGES'] = ['en', 'yo', 'ha', 'ig'] # English, Yorùbá, Hausa, Igbo
     app.config['BABEL_DEFAULT_LOCALE'] = 'en'
@@ -100,6 +110,9 @@ def create_app():
     CORS(app, resources={r"/api/*": {"origins": cfg.CORS_ORIGINS}})
     _configure_logging(app)
     init_db()
+    # Start delivering at boot, so rows left pending or waiting for a retry
+    # by the previous process go out without waiting for a new enqueue().
+    notification_worker.ensure_started()
     
     def get_locale():
         if 'language' in session and session['language'] in app.config['LANGUAGES']:
@@ -113,6 +126,8 @@ def create_app():
     def inject_locale():
         return dict(current_locale=get_locale())
 
+    app.jinja_env.globals["report_image_url"] = report_image_url
+
     @app.teardown_appcontext
     def teardown_db(exception):
         close_db()
@@ -200,6 +215,9 @@ def create_app():
     app.register_blueprint(adr_bp)
     app.register_blueprint(stores_bp, url_prefix="/api")
     app.register_blueprint(hotspot_bp, url_prefix="/api")
+    app.register_blueprint(verify_api_bp, url_prefix="/api")
+    app.register_blueprint(ledger_bp, url_prefix="/api")
+    app.register_blueprint(analysis_bp, url_prefix="/api")
     if HAS_ADMIN:
         app.register_blueprint(admin_bp, url_prefix="/admin")
 
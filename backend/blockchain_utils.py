@@ -1,42 +1,55 @@
 # backend/blockchain_utils.py
 
-# This is a placeholder for a real Hyperledger Fabric SDK client.
-# In a full implementation, this would involve connecting to the peer nodes,
-# selecting a channel, and invoking the chaincode.
+# Chaincode-style entry points backed by the local ledger (backend/ledger.py).
+# They keep the function names of MedGuardChaincode so that a real Hyperledger
+# Fabric SDK client can be dropped in later without touching the callers.
+
+import json
+
+from backend.database import get_db
+from backend import ledger
+
 
 def invoke_chaincode(function_name, *args):
     """
-    Simulates invoking a function on the MedGuardChaincode.
-    Returns a simulated success message or raises an exception.
+    Invokes a MedGuardChaincode function against the local ledger.
+    Returns a status dict like the Fabric gateway would.
     """
-    print(f"--- SIMULATING BLOCKCHAIN INVOCATION ---")
-    print(f"Function: {function_name}")
-    print(f"Arguments: {args}")
-
-    # In a real application, this would be a network call to the blockchain.
-    # We simulate a successful transaction here.
+    conn = get_db()
     if function_name == "register_drug_batch":
-        return {"status": "SUCCESS", "message": f"Successfully registered batch {args[0]} on the blockchain."}
+        batch_number, drug_name, manufacturer, mfg_date, expiry_date = args
+        ledger.record_registration(conn, batch_number, drug_name, manufacturer, mfg_date, expiry_date)
+        conn.commit()
+        return {"status": "SUCCESS", "message": f"Successfully registered batch {batch_number} on the ledger."}
     if function_name == "transfer_drug_ownership":
-         return {"status": "SUCCESS", "message": f"Successfully transferred batch {args[0]} to {args[1]}."}
-    
+        batch_number, new_owner = args
+        events = ledger.get_events(conn, batch_number)
+        if not events:
+            return {"status": "ERROR", "message": f"The drug batch {batch_number} does not exist."}
+        previous_owner = _current_owner(events)
+        ledger.record_transfer(conn, batch_number, previous_owner, new_owner)
+        conn.commit()
+        return {"status": "SUCCESS", "message": f"Successfully transferred batch {batch_number} to {new_owner}."}
+
     return {"status": "ERROR", "message": "Function not found"}
 
+
 def query_chaincode(function_name, *args):
     """
-    Simulates querying a function on the MedGuardChaincode.
-    Returns simulated data.
+    Queries a MedGuardChaincode function against the local ledger.
     """
-    print(f"--- SIMULATING BLOCKCHAIN QUERY ---")
-    print(f"Function: {function_name}")
-    print(f"Arguments: {args}")
-
     if function_name == "query_drug_history":
-        # Simulate a typical supply chain journey
-        return [
-            "Registered by HealthWell Inc. on 2025-09-28 10:00:00",
-            "Transferred from HealthWell Inc. to Metro Distributors on 2025-09-29 14:30:00",
-            "Transferred from Metro Distributors to City Pharmacy on 2025-09-30 09:15:00"
-        ]
-    
-    return []
\ No newline at end of file
+        return ledger.get_history(get_db(), args[0])
+
+    return []
+
+
+def _current_owner(events):
+    owner = None
+    for _, event_type, payload, _, _, _ in events:
+        data = json.loads(payload)
+        if event_type == "registered":
+            owner = data.get("owner")
+        elif event_type == "transferred":
+            owner = data.get("to")
+    return owner
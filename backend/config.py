@@ -14,9 +14,86 @@ class Config:
     # Database
     DB_PATH: Path = Path(os.getenv("DB_PATH", BASE_DIR / "medguard.db"))
 
+    # Drug lookup cache (per worker)
+    DRUG_CACHE_MAX_ENTRIES: int = int(os.getenv("DRUG_CACHE_MAX_ENTRIES", "20000"))
+    DRUG_CACHE_CHECK_INTERVAL: float = float(os.getenv("DRUG_CACHE_CHECK_INTERVAL", "1.0"))
+
+    # Scan log group commit (backend/scan_log_writer.py)
+    SCAN_LOG_BATCH_SIZE: int = int(os.getenv("SCAN_LOG_BATCH_SIZE", "200"))
+    # Longest time a scan may sit in memory before it is committed. This is the
+    # maximum data-loss window if a worker dies without a clean shutdown.
+    SCAN_LOG_MAX_LATENCY_MS: int = int(os.getenv("SCAN_LOG_MAX_LATENCY_MS", "250"))
+    SCAN_LOG_QUEUE_SIZE: int = int(os.getenv("SCAN_LOG_QUEUE_SIZE", "10000"))
+    SCAN_LOG_PUT_TIMEOUT_MS: int = int(os.getenv("SCAN_LOG_PUT_TIMEOUT_MS", "50"))
+
+    # Scan anomaly state (backend/scan_anomaly.py)
+    ANOMALY_STATE_MAX_ENTRIES: int = int(os.getenv("ANOMALY_STATE_MAX_ENTRIES", "50000"))
+    ANOMALY_STATE_REFRESH: float = float(os.getenv("ANOMALY_STATE_REFRESH", "5.0"))
+
+    # Bulk inventory verification (POST /api/verify/bulk)
+    BULK_VERIFY_MAX_ITEMS: int = int(os.getenv("BULK_VERIFY_MAX_ITEMS", "5000"))
+    # Callers must be signed in or send one of these keys in X-API-Key (comma-separated).
+    BULK_VERIFY_API_KEYS = [k.strip() for k in os.getenv("BULK_VERIFY_API_KEYS", "").split(",") if k.strip()]
+    # Items each client may verify per window, per worker (backend/rate_limit.py).
+    BULK_VERIFY_RATE_ITEMS: int = int(os.getenv("BULK_VERIFY_RATE_ITEMS", "20000"))
+    BULK_VERIFY_RATE_WINDOW: float = float(os.getenv("BULK_VERIFY_RATE_WINDOW", "3600"))
+    # Bulk moderation of reports (POST /api/report/bulk, /api/adr-report/bulk)
+    BULK_MODERATION_MAX_IDS: int = int(os.getenv("BULK_MODERATION_MAX_IDS", "5000"))
+
+    # GET /api/report pagination
+    REPORT_PAGE_SIZE: int = int(os.getenv("REPORT_PAGE_SIZE", "50"))
+    REPORT_PAGE_SIZE_MAX: int = int(os.getenv("REPORT_PAGE_SIZE_MAX", "500"))
+    # Rows per page on the admin dashboard and its data API
+    DASHBOARD_PAGE_SIZE: int = int(os.getenv("DASHBOARD_PAGE_SIZE", "50"))
+
+    # Registered drugs page (admin_drugs): rows per page, and the most rows a
+    # filtered view counts before showing "10,000+"
+    DRUGS_PAGE_SIZE: int = int(os.getenv("DRUGS_PAGE_SIZE", "20"))
+    DRUG_COUNT_CAP: int = int(os.getenv("DRUG_COUNT_CAP", "10000"))
+
+    # Streaming CSV/NDJSON/XLSX exports (backend/exports.py): rows per written chunk
+    EXPORT_CHUNK_ROWS: int = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+
+    # Word/PDF export jobs (backend/export_jobs.py)
+    EXPORT_DIR: Path = Path(os.getenv("EXPORT_DIR", BASE_DIR / "instance" / "exports"))
+    EXPORT_ROWS_PER_TABLE: int = int(os.getenv("EXPORT_ROWS_PER_TABLE", "25"))  # one landscape PDF page
+    EXPORT_TTL_HOURS: float = float(os.getenv("EXPORT_TTL_HOURS", "24"))
+    EXPORT_PROGRESS_INTERVAL: float = float(os.getenv("EXPORT_PROGRESS_INTERVAL", "1.0"))  # seconds
+
+    # Near-duplicate report clusters (backend/report_clusters.py)
+    REPORT_DEDUP_CELL: float = float(os.getenv("REPORT_DEDUP_CELL", "0.01"))  # degrees, ~1.1 km
+    REPORT_DEDUP_NOTE_SIMILARITY: float = float(os.getenv("REPORT_DEDUP_NOTE_SIMILARITY", "0.5"))
+    REPORT_DEDUP_WINDOW_DAYS: int = int(os.getenv("REPORT_DEDUP_WINDOW_DAYS", "30"))  # same-photo matches
+
+    # EMDEX registry lookups (backend/emdex.py). Leave EMDEX_API_URL unset to use
+    # the built-in simulation.
+    EMDEX_API_URL = os.getenv("EMDEX_API_URL")
+    EMDEX_API_KEY = os.getenv("EMDEX_API_KEY")
+    EMDEX_TIMEOUT: float = float(os.getenv("EMDEX_TIMEOUT", "3.0"))
+    EMDEX_CACHE_TTL: float = float(os.getenv("EMDEX_CACHE_TTL", "3600"))
+    EMDEX_NEGATIVE_TTL: float = float(os.getenv("EMDEX_NEGATIVE_TTL", "300"))
+    EMDEX_CACHE_MAX_ENTRIES: int = int(os.getenv("EMDEX_CACHE_MAX_ENTRIES", "10000"))
+    EMDEX_BREAKER_FAILURES: int = int(os.getenv("EMDEX_BREAKER_FAILURES", "5"))
+    EMDEX_BREAKER_RESET: float = float(os.getenv("EMDEX_BREAKER_RESET", "30"))
+    EMDEX_POOL_SIZE: int = int(os.getenv("EMDEX_POOL_SIZE", "10"))
+
+    # Scan log rollups and retention (backend/scan_rollups.py)
+    SCAN_ROLLUP_CHUNK: int = int(os.getenv("SCAN_ROLLUP_CHUNK", "5000"))
+    SCAN_ROLLUP_INTERVAL: float = float(os.getenv("SCAN_ROLLUP_INTERVAL", "60"))  # seconds
+    SCAN_LOG_RETENTION_DAYS: int = int(os.getenv("SCAN_LOG_RETENTION_DAYS", "90"))
+    SCAN_ROLLUP_HOURLY_RETENTION_DAYS: int = int(os.getenv("SCAN_ROLLUP_HOURLY_RETENTION_DAYS", "400"))
+
+    # Local supply-chain ledger (backend/ledger.py)
+    LEDGER_BLOCK_SIZE: int = int(os.getenv("LEDGER_BLOCK_SIZE", "500"))
+    LEDGER_BLOCK_INTERVAL: float = float(os.getenv("LEDGER_BLOCK_INTERVAL", "60"))
+
     # Security (QR signing, etc.)
     QR_SIGNING_SECRET: str = os.getenv(
         "QR_SIGNING_SECRET", "sign-me-in-prod")
+    # Comma-separated `id:secret` pairs, newest first (ids are one base32 char).
+    # Empty means a single key "A" built from QR_SIGNING_SECRET.
+    QR_SIGNING_KEYS: str = os.getenv("QR_SIGNING_KEYS", "")
+    QR_TAG_LENGTH: int = int(os.getenv("QR_TAG_LENGTH", "16"))  # base32 chars, 5 bits each
 
     # CORS
     CORS_ORIGINS: list = os.getenv(
@@ -27,6 +104,20 @@ class Config:
     STATIC_DIR: Path = BASE_DIR / "frontend" / "static"
     TRANSLATIONS_DIR: Path = BASE_DIR / "frontend" / "translations" # <-- ADD THIS LINE
 
+    # Report image store (backend/image_store.py)
+    IMAGE_STORE_DIR: Path = Path(os.getenv("IMAGE_STORE_DIR", BASE_DIR / "frontend" / "static" / "uploads" / "cas"))
+    IMAGE_SPOOL_DIR: Path = Path(os.getenv("IMAGE_SPOOL_DIR", BASE_DIR / "instance" / "upload_spool"))
+    IMAGE_MAX_BYTES: int = int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+    IMAGE_THUMB_SIZE: int = int(os.getenv("IMAGE_THUMB_SIZE", "320"))  # px, longest side
+
+    # Processes in each web worker's shared pool for image variants, packaging
+    # analysis and Word/PDF exports (backend/worker_pool.py)
+    BACKGROUND_WORKERS: int = int(os.getenv("BACKGROUND_WORKERS", "2"))
+
+    # Packaging photo analysis (backend/packaging_match.py)
+    # Largest pHash distance (bits out of 64) still judged the same packaging.
+    PACKAGING_MATCH_DISTANCE: int = int(os.getenv("PACKAGING_MATCH_DISTANCE", "10"))
+
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     
@@ -44,6 +135,20 @@ class Config:
     MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('MAIL_USERNAME'))
+
+    # Outbound notification queue (backend/notification_queue.py)
+    TWILIO_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL")  # e.g. the local stub from backend/notify_stubs.py
+    NOTIFY_POLL_INTERVAL: float = float(os.getenv("NOTIFY_POLL_INTERVAL", "1"))
+    NOTIFY_MAX_ATTEMPTS: int = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8"))
+    NOTIFY_BACKOFF_BASE: float = float(os.getenv("NOTIFY_BACKOFF_BASE", "30"))  # seconds, doubled per attempt
+    NOTIFY_BACKOFF_MAX: float = float(os.getenv("NOTIFY_BACKOFF_MAX", "3600"))
+    NOTIFY_CLAIM_TIMEOUT: int = int(os.getenv("NOTIFY_CLAIM_TIMEOUT", "300"))
+    NOTIFY_DIGEST_WINDOW: int = int(os.getenv("NOTIFY_DIGEST_WINDOW", "300"))  # seconds
+    NOTIFY_RETENTION_DAYS: int = int(os.getenv("NOTIFY_RETENTION_DAYS", "7"))
+
+    # --- Unread report badges (backend/report_counters.py) ---
+    REPORT_COUNTS_PUSH_INTERVAL: float = float(os.getenv("REPORT_COUNTS_PUSH_INTERVAL", "1"))  # seconds
 
     
 class ProdConfig(Config):
@@ -0,0 +1,171 @@
+# backend/dashboard_queries.py
+
+# =============================================================================
+# A D M I N   D A S H B O A R D   P A G E S
+# =============================================================================
+# Page queries behind the regulator dashboard. They are used both for the
+# first page that admin.html renders and for the JSON API that loads the
+# following pages (/admin/api/reports, /admin/api/adr-reports).
+#
+#   - Keyset pagination on (epoch, id), so page N costs the same as page 1.
+#   - Filters use the dashboard's own query-string names and meaning:
+#         reports:     filter=today | start & end (YYYY-MM-DD) | search
+#         ADR reports: adr_search | adr_start & adr_end
+#     The API can therefore be called with the page's query string as it is.
+#   - sort=newest (default) or sort=oldest.
+#   - fields=id,batch_number,... limits the columns returned.
+#
+# Counterfeit reports only list the primary report of each near-duplicate
+# cluster (backend/report_clusters.py).
+# =============================================================================
+
+from backend import report_search
+from backend.config import get_config
+from backend.database import epoch_day_range, epoch_today_range
+from backend.routes.report import decode_cursor, encode_cursor
+
+cfg = get_config()
+
+REPORT_COLUMNS = {
+    "id": "r.id",
+    "drug_name": "r.drug_name",
+    "batch_number": "r.batch_number",
+    "location": "r.location",
+    "note": "r.note",
+    "image_filename": "r.image_filename",
+    "reported_on": "strftime('%Y-%m-%d %H:%M:%S', r.reported_on)",
+    "status": "r.status",
+    "duplicate_count": "r.duplicate_count",
+    "submitted_by": "u.email",
+}
+
+ADR_COLUMNS = {
+    "id": "ar.id",
+    "drug_name": "d.name",
+    "batch_number": "d.batch_number",
+    "patient_age_range": "ar.patient_age_range",
+    "patient_gender": "ar.patient_gender",
+    "reaction_description": "ar.reaction_description",
+    "report_date": "strftime('%Y-%m-%d %H:%M:%S', ar.report_date)",
+    "status": "ar.status",
+}
+
+SORTS = {"newest": ("DESC", "<"), "oldest": ("ASC", ">")}
+
+
+class PageRequestError(ValueError):
+    """Raised for a malformed page request; the message is safe to show."""
+
+
+def page_options(args, columns):
+    """Parse limit, sort, cursor and fields from the query string."""
+    fields = [f.strip() for f in args.get("fields", "").split(",") if f.strip()] or list(columns)
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise PageRequestError(f"Unknown fields: {', '.join(unknown)}")
+
+    sort = args.get("sort", "newest")
+    if sort not in SORTS:
+        raise PageRequestError("sort must be 'newest' or 'oldest'")
+
+    limit = args.get("limit", type=int) or cfg.DASHBOARD_PAGE_SIZE
+    limit = max(1, min(limit, cfg.REPORT_PAGE_SIZE_MAX))
+
+    cursor = args.get("cursor", "").strip()
+    if cursor:
+        try:
+            cursor = decode_cursor(cursor, int, int)
+        except (ValueError, UnicodeDecodeError):
+            raise PageRequestError("Invalid cursor")
+    return fields, sort, limit, cursor or None
+
+
+def _run_page(conn, columns, fields, select_from, where, params, epoch, id_column, sort, limit, cursor):
+    direction, comparison = SORTS[sort]
+    if cursor:
+        where.append(f"({epoch}, {id_column}) {comparison} (?, ?)")
+        params.extend(cursor)
+    selected = ", ".join(
+        f"{columns[f]} AS {f}" for f in dict.fromkeys(list(fields) + ["id"])
+    )
+    rows = conn.execute(
+        f"""
+        SELECT {selected}, {epoch} AS _epoch
+        {select_from}
+        WHERE {" AND ".join(where) or "1=1"}
+        ORDER BY {epoch} {direction}, {id_column} {direction}
+        LIMIT ?
+        """,
+        params + [limit + 1],
+    ).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["_epoch"], rows[-1]["id"])
+    return [{f: row[f] for f in fields} for row in rows], next_cursor
+
+
+def counterfeit_filters(args):
+    """WHERE clauses and parameters for the dashboard's counterfeit report filters."""
+    where, params = ["r.cluster_id IS NULL"], []
+
+    start, end = args.get("start", "").strip(), args.get("end", "").strip()
+    if args.get("filter", "").strip() == "today":
+        where.append("r.reported_on_epoch >= ? AND r.reported_on_epoch < ?")
+        params.extend(epoch_today_range())
+    elif start and end:
+        try:
+            params.extend(epoch_day_range(start, end))
+        except ValueError:
+            raise PageRequestError("start and end must be dates in YYYY-MM-DD format")
+        where.append("r.reported_on_epoch >= ? AND r.reported_on_epoch < ?")
+
+    search = args.get("search", "").strip()
+    match = report_search.build_match_query(search) if search and report_search.FTS5_AVAILABLE else None
+    if match:
+        where.append("r.id IN (SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?)")
+        params.append(match)
+    elif search:
+        where.append("(r.drug_name LIKE ? OR r.batch_number LIKE ? OR r.location LIKE ? OR r.note LIKE ?)")
+        params.extend([f"%{search}%"] * 4)
+    return where, params
+
+
+def adr_filters(args):
+    """WHERE clauses and parameters for the dashboard's ADR report filters."""
+    where, params = [], []
+
+    search = args.get("adr_search", "").strip()
+    if search:
+        where.append("(d.name LIKE ? OR d.batch_number LIKE ? OR ar.reaction_description LIKE ?)")
+        params.extend([f"%{search}%"] * 3)
+
+    start, end = args.get("adr_start", "").strip(), args.get("adr_end", "").strip()
+    if start and end:
+        try:
+            params.extend(epoch_day_range(start, end))
+        except ValueError:
+            raise PageRequestError("adr_start and adr_end must be dates in YYYY-MM-DD format")
+        where.append("ar.report_date_epoch >= ? AND ar.report_date_epoch < ?")
+    return where, params
+
+
+def counterfeit_page(conn, args, fields=None, sort="newest", limit=None, cursor=None):
+    """One page of counterfeit reports for the dashboard. Returns (rows, next_cursor)."""
+    where, params = counterfeit_filters(args)
+    return _run_page(
+        conn, REPORT_COLUMNS, fields or list(REPORT_COLUMNS),
+        "FROM reports r LEFT JOIN users u ON r.user_id = u.id",
+        where, params, "r.reported_on_epoch", "r.id", sort, limit or cfg.DASHBOARD_PAGE_SIZE, cursor,
+    )
+
+
+def adr_page(conn, args, fields=None, sort="newest", limit=None, cursor=None):
+    """One page of ADR reports for the dashboard. Returns (rows, next_cursor)."""
+    where, params = adr_filters(args)
+    return _run_page(
+        conn, ADR_COLUMNS, fields or list(ADR_COLUMNS),
+        "FROM adr_reports ar JOIN drugs d ON ar.drug_id = d.id",
+        where, params, "ar.report_date_epoch", "ar.id", sort, limit or cfg.DASHBOARD_PAGE_SIZE, cursor,
+    )
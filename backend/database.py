@@ -1,6 +1,16 @@
 import sqlite3
+from calendar import timegm
+from datetime import datetime, timedelta, timezone
 from flask import g
 from backend.config import get_config
+from backend.ledger import init_ledger
+from backend.scan_rollups import init_rollups
+from backend.notification_queue import init_notification_queue
+from backend.report_search import init_report_search
+from backend.report_clusters import init_report_clusters
+from backend.report_counters import init_report_counters
+from backend.packaging_match import init_packaging_references
+from backend.analytics import init_analytics
 from werkzeug.security import generate_password_hash
 
 # Load configuration
@@ -38,11 +48,93 @@ def close_db(e=None):
         db.close()
 
 
-def init_db():
+# Timestamps are stored as UTC text ('YYYY-MM-DD HH:MM:SS', SQLite's own
+# datetime('now') format). Each one also has a generated integer epoch column,
+# which is what range filters and ORDER BY use so that they can seek an index.
+#   (table, epoch column, source column)
+EPOCH_COLUMNS = [
+    ("reports", "reported_on_epoch", "reported_on"),
+    ("adr_reports", "report_date_epoch", "report_date"),
+    ("scan_logs", "scanned_at_epoch", "scanned_at"),
+    ("drugs", "created_at_epoch", "created_at"),
+    ("drugs", "expiry_date_epoch", "expiry_date"),
+]
+
+# Secondary indexes behind the hot queries in backend/routes. Add new indexes
+# here so that init_db() creates them on every database, old or new.
+# backend/query_plans.py checks the routes' queries against this set.
+INDEXES = [
+    ("idx_scan_logs_batch_epoch", "scan_logs", "batch_number, scanned_at_epoch"),
+    ("idx_reports_batch", "reports", "batch_number"),
+    ("idx_reports_status", "reports", "status"),
+    ("idx_reports_user_epoch", "reports", "user_id, reported_on_epoch"),
+    ("idx_reports_reported_epoch", "reports", "reported_on_epoch"),
+    ("idx_reports_dedup_key", "reports", "dedup_key"),
+    ("idx_reports_cluster", "reports", "cluster_id"),
+    ("idx_reports_image", "reports", "image_filename, reported_on_epoch"),
+    ("idx_adr_reports_drug", "adr_reports", "drug_id"),
+    ("idx_adr_reports_report_epoch", "adr_reports", "report_date_epoch"),
+    ("idx_drugs_created_epoch", "drugs", "created_at_epoch"),
+    ("idx_drugs_expiry_created", "drugs", "expiry_date_epoch, created_at_epoch"),
+    ("idx_export_jobs_expires", "export_jobs", "expires_at_epoch"),
+]
+
+# Indexes that were replaced by an entry above and are dropped on upgrade.
+RETIRED_INDEXES = [
+    "idx_scan_logs_batch_time",
+    "idx_reports_user_reported",
+    "idx_reports_reported_on",
+    "idx_adr_reports_report_date",
+    "idx_drugs_created_at",
+]
+
+
+def ensure_epoch_columns(conn):
+    """Add the generated epoch columns from EPOCH_COLUMNS to tables that lack them."""
+    for table, column, source in EPOCH_COLUMNS:
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_xinfo({table})")}
+        if column not in existing:
+            conn.execute(
+                f"ALTER TABLE {table} ADD COLUMN {column} INTEGER "
+                f"GENERATED ALWAYS AS (CAST(strftime('%s', {source}) AS INTEGER)) VIRTUAL"
+            )
+
+
+def ensure_indexes(conn):
+    """Create any index from INDEXES that does not exist yet."""
+    for name in RETIRED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for name, table, columns in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def to_epoch(value: datetime) -> int:
+    """Convert a naive UTC datetime to epoch seconds."""
+    return timegm(value.timetuple())
+
+
+def epoch_day_range(start: str, end: str):
+    """
+    Turn an inclusive 'YYYY-MM-DD' date range from a filter form into a half-open
+    epoch range [start 00:00, day after end 00:00) for the *_epoch columns.
+    Raises ValueError on malformed dates.
+    """
+    first = datetime.strptime(start, "%Y-%m-%d")
+    after_last = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)
+    return to_epoch(first), to_epoch(after_last)
+
+
+def epoch_today_range():
+    """Half-open epoch range covering today's UTC date, like SQLite's date('now')."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    return epoch_day_range(today, today)
+
+
+def init_db(db_path=None):
     """
     Initialize the database tables if they don't exist.
     """
-    conn = sqlite3.connect(cfg.DB_PATH)
+    conn = sqlite3.connect(db_path or cfg.DB_PATH)
     c = conn.cursor()
 
     # Create drugs table
@@ -114,6 +206,38 @@ def init_db():
         )
     """)
 
+    # Incrementally maintained anomaly state per batch (backend/scan_anomaly.py).
+    # `buckets` holds 60 one-minute scan counts as packed unsigned ints.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS scan_anomaly_state (
+            batch_number TEXT PRIMARY KEY,
+            total_scans INTEGER NOT NULL,
+            head_minute INTEGER NOT NULL,
+            buckets BLOB NOT NULL,
+            last_scanned_at REAL,
+            last_latitude REAL,
+            last_longitude REAL
+        ) WITHOUT ROWID
+    """)
+
+    # Word/PDF export jobs (backend/export_jobs.py). Rendered files live in
+    # EXPORT_DIR until expires_at_epoch.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id TEXT PRIMARY KEY,
+            admin_id INTEGER,
+            dataset TEXT NOT NULL,
+            format TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            rows_done INTEGER NOT NULL DEFAULT 0,
+            total_rows INTEGER,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT (datetime('now')),
+            finished_at TIMESTAMP,
+            expires_at_epoch INTEGER NOT NULL
+        )
+    """)
+
     # NEW: Create the adr_reports table
     c.execute("""
         CREATE TABLE IF NOT EXISTS adr_reports (
@@ -125,10 +249,50 @@ def init_db():
             reaction_start_date TEXT,
             other_medications TEXT,
             report_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'New',
             FOREIGN KEY (drug_id) REFERENCES drugs (id)
         )
     """)
 
+    # Generation counters for the per-worker drug lookup cache (backend/drug_cache.py).
+    # Any change to the drugs table bumps `generation`; an UPDATE or DELETE also
+    # bumps `rebuild_generation`, which a worker cannot catch up on from new rows.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS drug_cache_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0,
+            rebuild_generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO drug_cache_state (id, generation) VALUES (1, 0)")
+    existing = {row[1] for row in c.execute("PRAGMA table_info(drug_cache_state)")}
+    if "rebuild_generation" not in existing:
+        c.execute("ALTER TABLE drug_cache_state ADD COLUMN rebuild_generation INTEGER NOT NULL DEFAULT 0")
+        c.execute("DROP TRIGGER IF EXISTS drugs_cache_update")
+        c.execute("DROP TRIGGER IF EXISTS drugs_cache_delete")
+    for event, rebuild in (("INSERT", ""), ("UPDATE", ", rebuild_generation = rebuild_generation + 1"),
+                           ("DELETE", ", rebuild_generation = rebuild_generation + 1")):
+        c.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS drugs_cache_{event.lower()}
+            AFTER {event} ON drugs
+            BEGIN
+                UPDATE drug_cache_state SET generation = generation + 1{rebuild} WHERE id = 1;
+            END
+        """)
+
+    # Local supply-chain ledger tables (backend/ledger.py)
+    init_ledger(c)
+    init_rollups(c)
+    init_notification_queue(c)
+    init_report_search(c)
+    init_report_clusters(c)
+    init_report_counters(c)
+    init_packaging_references(c)
+    init_analytics(c)
+
+    ensure_epoch_columns(c)
+    ensure_indexes(c)
+
     # Add default admin user if table is empty
     c.execute("SELECT COUNT(*) FROM admin_users")
     if c.fetchone()[0] == 0:
@@ -0,0 +1,254 @@
+# backend/drug_cache.py
+
+# =============================================================================
+# D R U G   L O O K U P   C A C H E
+# =============================================================================
+# A shared, in-process cache in front of `SELECT ... FROM drugs WHERE batch_number = ?`.
+# It is used by the verify page, the Twilio SMS webhook and the chat assistant.
+#
+#   - Known batches are kept in a bounded LRU map.
+#   - Unknown codes are cached too (negative caching), so repeated fake scans are cheap.
+#   - A Bloom filter over every registered batch number rejects most fake codes
+#     without touching SQLite at all.
+#
+# Each gunicorn worker holds its own copy. A trigger on the `drugs` table bumps
+# `drug_cache_state.generation` on every change, and each worker re-checks that
+# number at most once per DRUG_CACHE_CHECK_INTERVAL seconds. A batch registered
+# through another worker can therefore be reported as unknown for at most that
+# long; fake codes are still rejected without a query.
+#
+# Inserts are added to the filter by reading only the rows past the highest id
+# seen. An UPDATE or DELETE also bumps `rebuild_generation`; the filter is then
+# reloaded on a background thread, and lookups go to SQLite until it is ready.
+# =============================================================================
+
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from backend.config import get_config
+
+cfg = get_config()
+
+DRUG_COLUMNS = ("id", "name", "batch_number", "mfg_date", "expiry_date", "manufacturer")
+
+# Sentinel stored in the LRU map for codes that are known not to exist.
+_MISSING = object()
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter using double hashing over a single SHA-256 digest."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str) -> None:
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class DrugLookupCache:
+    """Bounded LRU cache of drug rows keyed by batch number."""
+
+    def __init__(self, max_entries: int, check_interval: float):
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._bloom: Optional[BloomFilter] = None
+        self._max_id = 0
+        self._generation = None
+        self._rebuild_generation = None
+        self._checked_at = 0.0
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "bloom_rejects": 0}
+
+    # --- Generation tracking -------------------------------------------------
+    def _sync(self, conn) -> None:
+        """Catch up with changes that any worker made to the drugs table."""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        row = conn.execute(
+            "SELECT generation, rebuild_generation FROM drug_cache_state WHERE id = 1"
+        ).fetchone()
+        generation, rebuild_generation = row if row else (0, 0)
+
+        rebuild_inline = False
+        with self._lock:
+            self._checked_at = now
+            if generation == self._generation:
+                if self._bloom is None:
+                    rebuild_inline = self._start_rebuild(conn)
+                max_id = None
+            elif self._bloom is None or rebuild_generation != self._rebuild_generation:
+                # Rows changed or disappeared: drop what we know and reload the
+                # filter in the background. Until then lookups go to SQLite.
+                self._entries.clear()
+                self._bloom = None
+                self._generation = generation
+                self._rebuild_generation = rebuild_generation
+                rebuild_inline = self._start_rebuild(conn)
+                max_id = None
+            else:
+                max_id = self._max_id
+        if rebuild_inline:
+            self._rebuild(conn)
+        if max_id is None:
+            return
+
+        # Only inserts since the filter was built: add the new rows.
+        added = conn.execute(
+            "SELECT id, batch_number FROM drugs WHERE id > ? ORDER BY id", (max_id,)
+        ).fetchall()
+        with self._lock:
+            if self._bloom is None or self._max_id != max_id:
+                return  # a rebuild or another catch-up got there first
+            for drug_id, batch in added:
+                self._bloom.add(batch)
+                self._entries.pop(batch, None)
+                self._max_id = drug_id
+            self._generation = generation
+
+    def _start_rebuild(self, conn) -> bool:
+        """
+        Reload the Bloom filter off the request path. Called with the lock held.
+        Returns True when the caller has to rebuild inline instead: an in-memory
+        database is only visible through its own connection.
+        """
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return False
+        db_path = conn.execute("PRAGMA database_list").fetchone()[2]
+        if not db_path:
+            return True
+        self._rebuild_thread = threading.Thread(
+            target=self._rebuild_in_background, args=(db_path,),
+            name="drug-cache-rebuild", daemon=True,
+        )
+        self._rebuild_thread.start()
+        return False
+
+    def _rebuild_in_background(self, db_path: str) -> None:
+        try:
+            conn = sqlite3.connect(db_path, timeout=10)
+            try:
+                while not self._rebuild(conn):
+                    pass
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"Drug cache rebuild failed: {e}")
+
+    def _rebuild(self, conn) -> bool:
+        """Build the filter from one snapshot of the table. False if it was already stale."""
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute("BEGIN")
+        try:
+            row = conn.execute(
+                "SELECT generation, rebuild_generation FROM drug_cache_state WHERE id = 1"
+            ).fetchone()
+            generation, rebuild_generation = row if row else (0, 0)
+            rows = conn.execute("SELECT id, batch_number FROM drugs").fetchall()
+        finally:
+            if own_transaction:
+                conn.commit()
+
+        bloom = BloomFilter(capacity=len(rows) * 2 + 1024)
+        for _, batch in rows:
+            bloom.add(batch)
+        with self._lock:
+            if self._rebuild_generation is not None and rebuild_generation < self._rebuild_generation:
+                return False  # an UPDATE or DELETE landed after the snapshot
+            self._entries.clear()
+            self._bloom = bloom
+            self._max_id = max((r[0] for r in rows), default=0)
+            self._rebuild_generation = rebuild_generation
+            # Inserts committed after the snapshot are picked up by the next
+            # _sync, which sees this older generation and reads rows past _max_id.
+            self._generation = generation
+            self._checked_at = 0.0
+        return True
+
+    # --- Public API ------------------------------------------------------------
+    def lookup(self, conn, batch_number: str) -> Optional[Dict]:
+        """Return the drug row for `batch_number` as a dict, or None if it is not registered."""
+        self._sync(conn)
+
+        with self._lock:
+            if self._bloom is not None and batch_number not in self._bloom:
+                self.stats["bloom_rejects"] += 1
+                return None
+            cached = self._entries.get(batch_number)
+            if cached is not None:
+                self._entries.move_to_end(batch_number)
+                if cached is _MISSING:
+                    self.stats["negative_hits"] += 1
+                    return None
+                self.stats["hits"] += 1
+                return dict(cached)
+            self.stats["misses"] += 1
+            generation = self._generation
+
+        row = conn.execute(
+            f"SELECT {', '.join(DRUG_COLUMNS)} FROM drugs WHERE batch_number = ?",
+            (batch_number,)
+        ).fetchone()
+        drug = dict(zip(DRUG_COLUMNS, row)) if row else None
+
+        with self._lock:
+            # A write that was applied meanwhile may already have made this row stale.
+            if self._generation == generation:
+                self._entries[batch_number] = drug if drug else _MISSING
+                self._entries.move_to_end(batch_number)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return dict(drug) if drug else None
+
+    def invalidate(self, batch_number: Optional[str] = None, added: bool = False) -> None:
+        """
+        Drop cached state after a write in this worker.
+        A newly added batch is put straight into the Bloom filter; anything else
+        clears the cached rows and makes the next lookup re-check the table.
+        """
+        with self._lock:
+            if batch_number is not None and added:
+                if self._bloom is not None:
+                    self._bloom.add(batch_number)
+                self._entries.pop(batch_number, None)
+                return
+            self._entries.clear()
+            self._checked_at = 0.0
+
+
+drug_cache = DrugLookupCache(
+    max_entries=cfg.DRUG_CACHE_MAX_ENTRIES,
+    check_interval=cfg.DRUG_CACHE_CHECK_INTERVAL,
+)
+
+
+def lookup_drug(conn, batch_number: str) -> Optional[Dict]:
+    """Cached equivalent of selecting a drug row by its batch number."""
+    return drug_cache.lookup(conn, batch_number)
+
+
+def invalidate_drug(batch_number: Optional[str] = None, added: bool = False) -> None:
+    """Invalidate the local cache entry for a batch (or the whole cache)."""
+    drug_cache.invalidate(batch_number, added=added)
@@ -0,0 +1,151 @@
+# backend/drug_filters.py
+
+# =============================================================================
+# R E G I S T E R E D   D R U G   F I L T E R S
+# =============================================================================
+# One compiler for the filters of the registered-drugs page. The page
+# (admin_drugs) and every export format (CSV, NDJSON, XLSX, Word, PDF) get
+# the same SQL from it:
+#
+#   search=...                 name or batch number contains the text
+#   status=valid|expired|soon  expiry status on the local date
+#   start=...&end=...          registered between two dates (YYYY-MM-DD)
+#
+# Expiry status is computed on `expiry_date_epoch`, the generated integer
+# column behind idx_drugs_expiry_created (backend/database.py). The day
+# boundaries are computed once per request and passed as parameters, so every
+# status is a range on the index. The old way evaluated date(expiry_date) on
+# every row.
+#
+# The page itself is keyset-paginated on (created_at_epoch, id), newest first,
+# with `after`/`before` cursors in the URL. Page 5,000 therefore costs the same
+# as page 1. Its total comes from the trigger-maintained counter
+# (backend/report_counters.py) when unfiltered. Filtered views count at most
+# DRUG_COUNT_CAP + 1 rows and show "10,000+" beyond that.
+#
+# A batch expires at the start of its expiry date. It is "soon" from today up
+# to and including SOON_DAYS days from now. Soon batches are also valid.
+# =============================================================================
+
+from datetime import date, timedelta
+
+from backend.config import get_config
+from backend.dashboard_queries import PageRequestError
+from backend.database import epoch_day_range
+from backend.report_counters import registered_drug_count
+from backend.routes.report import encode_cursor
+
+cfg = get_config()
+
+SOON_DAYS = 30
+STATUSES = ("valid", "expired", "soon")
+
+
+def expiry_bounds(today=None):
+    """Epochs of the start of today and of the first day after the soon window."""
+    today = today or date.today()
+    return epoch_day_range(today.isoformat(), (today + timedelta(days=SOON_DAYS)).isoformat())
+
+
+def expiry_status_sql(labels=None):
+    """
+    SQL expression for a row's expiry status: 'expired', 'soon' or 'valid', or
+    the matching text from `labels`. The bounds are taken from the local date
+    when the statement runs, so the expression can be built once and reused.
+    """
+    labels = labels or {status: status for status in STATUSES}
+    today = "CAST(strftime('%s', date('now', 'localtime')) AS INTEGER)"
+    after_soon = f"CAST(strftime('%s', date('now', 'localtime', '+{SOON_DAYS + 1} day')) AS INTEGER)"
+    return (f"(CASE WHEN expiry_date_epoch < {today} THEN '{labels['expired']}' "
+            f"WHEN expiry_date_epoch < {after_soon} THEN '{labels['soon']}' "
+            f"ELSE '{labels['valid']}' END)")
+
+
+def compile_drug_filter(args, today=None):
+    """
+    WHERE clauses and parameters for the drugs page's query-string `args`.
+    Raises PageRequestError for a malformed filter.
+    """
+    where, params = [], []
+    search = args.get("search", "").strip()
+    if search:
+        where.append("(name LIKE ? OR batch_number LIKE ?)")
+        params.extend([f"%{search}%", f"%{search}%"])
+
+    status = args.get("status", "").strip()
+    if status and status not in STATUSES:
+        raise PageRequestError(f"status must be one of: {', '.join(STATUSES)}")
+    today_epoch, soon_epoch = expiry_bounds(today)
+    if status == "valid":
+        where.append("expiry_date_epoch >= ?")
+        params.append(today_epoch)
+    elif status == "expired":
+        where.append("expiry_date_epoch < ?")
+        params.append(today_epoch)
+    elif status == "soon":
+        where.append("expiry_date_epoch >= ? AND expiry_date_epoch < ?")
+        params.extend([today_epoch, soon_epoch])
+
+    start, end = args.get("start", "").strip(), args.get("end", "").strip()
+    if start and end:
+        try:
+            params.extend(epoch_day_range(start, end))
+        except ValueError:
+            raise PageRequestError("start and end must be dates in YYYY-MM-DD format")
+        where.append("created_at_epoch >= ? AND created_at_epoch < ?")
+    return where, params
+
+
+def drug_page(conn, where, params, after=None, before=None, limit=None):
+    """
+    One page of registered drugs, newest first. `after` continues past the
+    last row of a page and `before` goes back from its first row; both are
+    (created_at_epoch, id) pairs. Returns (rows, prev_cursor, next_cursor).
+    """
+    limit = limit or cfg.DRUGS_PAGE_SIZE
+    where, params = list(where), list(params)
+    backwards = before is not None and after is None
+    if after is not None:
+        where.append("(created_at_epoch, id) < (?, ?)")
+        params.extend(after)
+    elif backwards:
+        where.append("(created_at_epoch, id) > (?, ?)")
+        params.extend(before)
+    direction = "ASC" if backwards else "DESC"
+    rows = conn.execute(
+        f"""
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at,
+               {expiry_status_sql()} AS expiry_status, created_at_epoch
+        FROM drugs
+        WHERE {" AND ".join(where) or "1=1"}
+        ORDER BY created_at_epoch {direction}, id {direction}
+        LIMIT ?
+        """,
+        params + [limit + 1],
+    ).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+    has_prev = more if backwards else after is not None
+    has_next = backwards or more
+    first, last = rows[0], rows[-1]
+    prev_cursor = encode_cursor(first["created_at_epoch"], first["id"]) if has_prev else None
+    next_cursor = encode_cursor(last["created_at_epoch"], last["id"]) if has_next else None
+    return rows, prev_cursor, next_cursor
+
+
+def drug_total(conn, where, params):
+    """
+    (count, exact) for a drugs view. Unfiltered views read the maintained
+    counter. Filtered views stop counting after DRUG_COUNT_CAP rows.
+    """
+    if not where:
+        return registered_drug_count(conn), True
+    count = conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM drugs WHERE {' AND '.join(where)} LIMIT ?)",
+        params + [cfg.DRUG_COUNT_CAP + 1],
+    ).fetchone()[0]
+    return min(count, cfg.DRUG_COUNT_CAP), count <= cfg.DRUG_COUNT_CAP
@@ -1,27 +1,241 @@
+# backend/emdex.py
+
+# =============================================================================
+# E M D E X   L O O K U P   C L I E N T
+# =============================================================================
+# Looks up batches that are not in our own `drugs` table in the EMDEX registry.
+# The lookup runs inside the verify request, so the client is built to never
+# let a slow or failing upstream hold eventlet workers hostage:
+#
+#   - one pooled `requests.Session` (keep-alive connections) per worker
+#   - a TTL cache for hits and a shorter-TTL negative cache for misses
+#   - single-flight: concurrent lookups of the same code share one upstream call
+#   - a circuit breaker that fails fast while the upstream keeps erroring
+#
+# When EMDEX_API_URL is not configured the client falls back to the simulated
+# response used during development. `python -m backend.emdex_stub` serves the
+# same data over HTTP for local testing.
+# =============================================================================
+
+import threading
+import time
+from collections import OrderedDict
+
 import requests
+from requests.adapters import HTTPAdapter
 
-def get_drug_info_from_emdex(api_key, batch_number):
+from backend.config import get_config
+
+cfg = get_config()
+
+
+class CircuitOpenError(Exception):
+    """Raised when the EMDEX circuit breaker is open and calls are being skipped."""
+
+
+class CircuitBreaker:
     """
-    This function will handle the live call to the EMDEX API.
-    For now, it acts as a placeholder.
+    Classic three-state breaker. After `failure_threshold` consecutive failures it
+    opens for `reset_timeout` seconds; then a single trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
     """
-    #
-    # --- THIS IS WHERE THE LIVE API CALL WILL GO ---
-    #
-    # Once we have our API key and the official documentation, we will
-    # replace the placeholder logic below with a real `requests.get()` call
-    # to the official EMDEX endpoint, like this:
-    #
-    # emdex_api_url = f"https://api.emdex.org/v1/drugs/verify?batch_number={batch_number}&apiKey={api_key}"
-    # response = requests.get(emdex_api_url, timeout=10)
-    # if response.status_code == 200:
-    #     return response.json()
-    # else:
-    #     return None
-    #
-    
-    # --- Placeholder Logic (for now) ---
-    print(f"--- SIMULATING EMDEX API CALL for batch: {batch_number} ---")
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError or let the call through. Returns True for the half-open trial."""
+        with self._lock:
+            state = self._state()
+            if state == "open" or (state == "half_open" and self._trial_in_flight):
+                raise CircuitOpenError("EMDEX circuit is open")
+            if state == "half_open":
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def end_trial(self):
+        """Let the next call be a trial again if this one ended without a recorded outcome."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class TTLCache:
+    """Bounded LRU map whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class EmdexClient:
+    def __init__(self, base_url, timeout, cache_ttl, negative_ttl, max_entries,
+                 failure_threshold, reset_timeout, pool_size):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(max_entries)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.pool_size = pool_size
+        self._session = None
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "negative_hits": 0, "coalesced": 0, "upstream_calls": 0,
+                      "failures": 0, "short_circuited": 0}
+
+    @property
+    def session(self):
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def lookup(self, api_key, batch_number):
+        """
+        Return the EMDEX record for `batch_number`, or None if EMDEX does not know it.
+        Raises CircuitOpenError while the upstream is considered down, and
+        requests.RequestException when the call itself fails or, for a
+        coalesced lookup, when the shared call outlives the wait.
+        """
+        found, value = self.cache.get(batch_number)
+        if found:
+            self.stats["hits" if value is not None else "negative_hits"] += 1
+            return value
+
+        with self._lock:
+            flight = self._flights.get(batch_number)
+            leader = flight is None
+            if leader:
+                flight = self._flights[batch_number] = _Flight()
+
+        if not leader:
+            self.stats["coalesced"] += 1
+            if not flight.done.wait(self.timeout * 2):
+                # Not a miss: the leader's call is still hanging.
+                raise requests.Timeout("Timed out waiting for the in-flight EMDEX lookup")
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._fetch(api_key, batch_number)
+            self.cache.set(batch_number, flight.result,
+                           self.cache_ttl if flight.result is not None else self.negative_ttl)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(batch_number, None)
+            flight.done.set()
+
+    def _fetch(self, api_key, batch_number):
+        if not self.base_url:
+            return _simulated_lookup(batch_number)
+
+        try:
+            is_trial = self.breaker.before_call()
+        except CircuitOpenError:
+            self.stats["short_circuited"] += 1
+            raise
+
+        self.stats["upstream_calls"] += 1
+        try:
+            try:
+                response = self.session.get(
+                    self.base_url,
+                    params={"batch_number": batch_number, "apiKey": api_key},
+                    timeout=self.timeout,
+                )
+                if response.status_code == 404:
+                    self.breaker.record_success()
+                    return None
+                response.raise_for_status()
+                data = response.json()
+            except (requests.RequestException, ValueError):
+                self.stats["failures"] += 1
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+            return data or None
+        finally:
+            # Any other exception would otherwise leave the breaker half-open
+            # with a trial that never ends, short-circuiting every later call.
+            if is_trial:
+                self.breaker.end_trial()
+
+
+def _simulated_lookup(batch_number):
+    """Development stand-in used until the live EMDEX endpoint is configured."""
     if batch_number == "SAM-0808":
         return {
             "drug_name": "Ibuprofen 200mg (from EMDEX simulation)",
@@ -29,4 +243,24 @@ def get_drug_info_from_emdex(api_key, batch_number):
             "status": "Registered",
             "details": "This is a simulated response for a valid drug."
         }
-    return None
\ No newline at end of file
+    return None
+
+
+emdex_client = EmdexClient(
+    base_url=cfg.EMDEX_API_URL,
+    timeout=cfg.EMDEX_TIMEOUT,
+    cache_ttl=cfg.EMDEX_CACHE_TTL,
+    negative_ttl=cfg.EMDEX_NEGATIVE_TTL,
+    max_entries=cfg.EMDEX_CACHE_MAX_ENTRIES,
+    failure_threshold=cfg.EMDEX_BREAKER_FAILURES,
+    reset_timeout=cfg.EMDEX_BREAKER_RESET,
+    pool_size=cfg.EMDEX_POOL_SIZE,
+)
+
+
+def get_drug_info_from_emdex(api_key, batch_number):
+    """
+    Look up a batch in EMDEX through the shared client (cached, coalesced and
+    protected by the circuit breaker). Returns the record or None.
+    """
+    return emdex_client.lookup(api_key, batch_number)
@@ -0,0 +1,89 @@
+"""
+A local stand-in for the EMDEX verification API, for development and tests.
+
+    python -m backend.emdex_stub --port 8765 [--latency 0.5] [--fail-rate 0.2]
+
+then point MedGuard at it:
+
+    EMDEX_API_URL=http://127.0.0.1:8765/v1/drugs/verify
+
+It answers GET /v1/drugs/verify?batch_number=... with the same record as the
+built-in simulation (SAM-0808 is registered, everything else is a 404), and
+counts requests at GET /stats so that caching and coalescing can be observed.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+REGISTRY = {
+    "SAM-0808": {
+        "drug_name": "Ibuprofen 200mg (from EMDEX stub)",
+        "manufacturer": "HealthWell Inc.",
+        "status": "Registered",
+        "details": "This is a stubbed response for a valid drug."
+    },
+}
+
+
+def make_handler(latency=0.0, fail_rate=0.0, registry=REGISTRY):
+    counts = {"requests": 0}
+    lock = threading.Lock()
+
+    class EmdexStubHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                return self._send(200, counts)
+            if url.path != "/v1/drugs/verify":
+                return self._send(404, {"error": "Not found"})
+
+            with lock:
+                counts["requests"] += 1
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                return self._send(503, {"error": "Upstream unavailable"})
+
+            batch_number = parse_qs(url.query).get("batch_number", [""])[0]
+            record = registry.get(batch_number)
+            if record is None:
+                return self._send(404, {"error": "Drug not found"})
+            return self._send(200, record)
+
+        def log_message(self, format, *args):
+            pass
+
+    return EmdexStubHandler
+
+
+def serve(host="127.0.0.1", port=8765, latency=0.0, fail_rate=0.0):
+    """Start the stub in a background thread and return the server (call .shutdown() to stop)."""
+    server = ThreadingHTTPServer((host, port), make_handler(latency, fail_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local EMDEX API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.latency, args.fail_rate))
+    print(f"EMDEX stub listening on http://{args.host}:{args.port}/v1/drugs/verify")
+    server.serve_forever()
@@ -0,0 +1,341 @@
+# backend/export_jobs.py
+
+# =============================================================================
+# W O R D / P D F   E X P O R T   J O B S
+# =============================================================================
+# Laying out a reportlab or python-docx table of tens of thousands of rows is
+# pure CPU work. Done inside an eventlet worker, it froze every other request
+# on that worker until it finished. Word and PDF exports are therefore jobs:
+#
+#   - POST /admin/exports creates a row in `export_jobs` and returns its id.
+#     The document is rendered in the shared process pool
+#     (backend/worker_pool.py).
+#   - The renderer reads the rows in chunks of EXPORT_ROWS_PER_TABLE. Each
+#     chunk becomes its own table on its own page, so no single table has to
+#     be laid out across thousands of rows.
+#   - The renderer writes its progress to the job row. A background task in
+#     the submitting worker reads that row every EXPORT_PROGRESS_INTERVAL
+#     seconds and pushes `export_progress` events to the admin sockets.
+#   - Finished files are kept in EXPORT_DIR for EXPORT_TTL_HOURS. Expired jobs
+#     and their files are removed whenever a new job is submitted, or with:
+#
+#   python -m backend.export_jobs purge
+#   python -m backend.export_jobs list
+# =============================================================================
+
+import os
+import secrets
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from docx import Document
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import landscape, letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from backend import worker_pool
+from backend.config import get_config
+from backend.exports import DATASETS, build_query
+from backend.report_counters import ADMIN_ROOM
+
+cfg = get_config()
+
+FORMATS = {
+    "pdf": ("application/pdf", "pdf"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+}
+FINISHED = ("done", "failed")
+
+
+def _expression(dataset, key):
+    return next(expression for _, column, expression in DATASETS[dataset][3] if column == key)
+
+
+# dataset -> (title, download name, [(header, SQL expression)])
+DOCUMENTS = {
+    "drugs": ("Registered Drugs Report", "registered_drugs", [
+        ("Name", "name"),
+        ("Batch Number", "batch_number"),
+        ("Manufacturer", "manufacturer"),
+        ("Mfg Date", "mfg_date"),
+        ("Expiry Date", "expiry_date"),
+        ("Status", _expression("drugs", "status")),
+        ("Registered On", "created_at"),
+    ]),
+    "reports": ("Counterfeit Reports", "counterfeit_reports", [
+        ("Drug Name", "r.drug_name"),
+        ("Batch #", "r.batch_number"),
+        ("Location", "r.location"),
+        ("Note", "r.note"),
+        ("Status", _expression("reports", "status")),
+        ("Reported On", _expression("reports", "reported_on")),
+    ]),
+    "adr_reports": ("Adverse Drug Reaction Reports", "adr_reports", [
+        ("Drug Name", "d.name"),
+        ("Batch #", "d.batch_number"),
+        ("Patient", "COALESCE(ar.patient_age_range, 'N/A') || ' / ' || COALESCE(ar.patient_gender, 'N/A')"),
+        ("Reaction", "ar.reaction_description"),
+        ("Status", _expression("adr_reports", "status")),
+        ("Report Date", "strftime('%Y-%m-%d', ar.report_date)"),
+    ]),
+}
+
+
+class ExportJobError(ValueError):
+    """Raised for an export request that cannot be queued; the message is safe to show."""
+
+
+def job_path(job_id, fmt):
+    return cfg.EXPORT_DIR / f"{job_id}.{FORMATS[fmt][1]}"
+
+
+def download_name(job):
+    return f"{DOCUMENTS[job['dataset']][1]}.{FORMATS[job['format']][1]}"
+
+
+def get_job(conn, job_id):
+    row = conn.execute(
+        """
+        SELECT id, admin_id, dataset, format, status, rows_done, total_rows, error, created_at, finished_at,
+               expires_at_epoch
+        FROM export_jobs WHERE id = ?
+        """,
+        (job_id,),
+    ).fetchone()
+    if row is None:
+        return None
+    keys = ("id", "admin_id", "dataset", "format", "status", "rows_done", "total_rows", "error",
+            "created_at", "finished_at", "expires_at_epoch")
+    job = dict(zip(keys, row))
+    job["expires_at"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(job.pop("expires_at_epoch")))
+    return job
+
+
+def purge_expired(conn):
+    """Delete expired jobs and their files. Returns the number of jobs removed."""
+    expired = conn.execute(
+        "SELECT id, format FROM export_jobs WHERE expires_at_epoch < ?", (int(time.time()),)
+    ).fetchall()
+    for job_id, fmt in expired:
+        for path in (job_path(job_id, fmt), job_path(job_id, fmt).with_suffix(".part")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    conn.executemany("DELETE FROM export_jobs WHERE id = ?", [(job_id,) for job_id, _ in expired])
+    return len(expired)
+
+
+# --- Rendering (runs in a pool process) ---------------------------------------------
+
+class _Progress:
+    """Write rows_done to the job row, at most once per EXPORT_PROGRESS_INTERVAL."""
+
+    def __init__(self, conn, job_id):
+        self.conn, self.job_id = conn, job_id
+        self.rows, self._written = 0, 0.0
+
+    def add(self, rows, force=False):
+        self.rows += rows
+        now = time.monotonic()
+        if force or now - self._written >= cfg.EXPORT_PROGRESS_INTERVAL:
+            self.conn.execute("UPDATE export_jobs SET rows_done = ? WHERE id = ?", (self.rows, self.job_id))
+            self.conn.commit()
+            self._written = now
+
+
+def _text(value):
+    # One line per cell keeps every chunk table to a single page.
+    return " ".join(str(value).split()) if value is not None else "N/A"
+
+
+def _chunks(conn, sql, params):
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(cfg.EXPORT_ROWS_PER_TABLE)
+        if not rows:
+            return
+        yield [[_text(value) for value in row] for row in rows]
+
+
+def _render_pdf(path, title, headers, chunks, progress):
+    class ProgressDocTemplate(SimpleDocTemplate):
+        def afterFlowable(self, flowable):
+            progress.add(getattr(flowable, "export_rows", 0))
+
+    style = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f4f4f4")),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+        ("TOPPADDING", (0, 0), (-1, -1), 2),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("BOX", (0, 0), (-1, -1), 1, colors.black),
+    ])
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(title, styles["Title"]), Spacer(1, 12)]
+    for rows in chunks:
+        if len(elements) > 2:
+            elements.append(PageBreak())
+        table = Table([headers] + rows, repeatRows=1)
+        table.setStyle(style)
+        table.export_rows = len(rows)
+        elements.append(table)
+    generated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    elements.append(Spacer(1, 20))
+    elements.append(Paragraph(f"Generated on {generated_on} by Admin System", styles["Normal"]))
+    ProgressDocTemplate(str(path), pagesize=landscape(letter)).build(elements)
+
+
+def _render_docx(path, title, headers, chunks, progress):
+    doc = Document()
+    doc.add_heading(title, 0)
+    first = True
+    for rows in chunks:
+        if not first:
+            doc.add_page_break()
+        first = False
+        table = doc.add_table(rows=1, cols=len(headers))
+        table.style = "Table Grid"
+        for cell, header in zip(table.rows[0].cells, headers):
+            cell.text = header
+        for row in rows:
+            for cell, value in zip(table.add_row().cells, row):
+                cell.text = value
+        progress.add(len(rows))
+    doc.add_paragraph()
+    doc.add_paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} by Admin System")
+    doc.save(str(path))
+
+
+RENDERERS = {"pdf": _render_pdf, "docx": _render_docx}
+
+
+def render_job(job_id, dataset, fmt, sql, params):
+    """Render one export job to EXPORT_DIR. Runs in a pool process."""
+    conn = sqlite3.connect(str(cfg.DB_PATH), timeout=30)
+    path = job_path(job_id, fmt)
+    partial = path.with_suffix(".part")
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+        conn.execute("UPDATE export_jobs SET status = 'running', total_rows = ? WHERE id = ?", (total, job_id))
+        conn.commit()
+        title, _, columns = DOCUMENTS[dataset]
+        progress = _Progress(conn, job_id)
+        RENDERERS[fmt](partial, title, [header for header, _ in columns], _chunks(conn, sql, params), progress)
+        os.replace(partial, path)
+        progress.add(0, force=True)
+        conn.execute(
+            """
+            UPDATE export_jobs SET status = 'done', finished_at = datetime('now'), expires_at_epoch = ?
+            WHERE id = ?
+            """,
+            (int(time.time() + cfg.EXPORT_TTL_HOURS * 3600), job_id),
+        )
+        conn.commit()
+    except Exception as e:
+        print(f"ERROR: Export job {job_id} failed - {e}")
+        conn.rollback()
+        conn.execute(
+            "UPDATE export_jobs SET status = 'failed', error = ?, finished_at = datetime('now') WHERE id = ?",
+            (str(e), job_id),
+        )
+        conn.commit()
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+    finally:
+        conn.close()
+
+
+# --- Submitting and watching (web workers) ------------------------------------------
+
+class ExportJobRunner:
+    """Submits jobs to the shared process pool and runs one watcher task per running job."""
+
+    def __init__(self):
+        self._socketio = None
+
+    def attach(self, socketio):
+        self._socketio = socketio
+
+    def submit(self, conn, admin_id, dataset, fmt, args):
+        """Queue an export of `dataset` as `fmt`, filtered by the page's `args`. Returns the job."""
+        if dataset not in DOCUMENTS:
+            raise ExportJobError(f"dataset must be one of: {', '.join(DOCUMENTS)}")
+        if fmt not in FORMATS:
+            raise ExportJobError(f"format must be one of: {', '.join(FORMATS)}")
+        sql, params = build_query(dataset, args, [expression for _, expression in DOCUMENTS[dataset][2]])
+
+        cfg.EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+        purge_expired(conn)
+        job_id = secrets.token_hex(16)
+        conn.execute(
+            "INSERT INTO export_jobs (id, admin_id, dataset, format, expires_at_epoch) VALUES (?, ?, ?, ?, ?)",
+            (job_id, admin_id, dataset, fmt, int(time.time() + cfg.EXPORT_TTL_HOURS * 3600)),
+        )
+        conn.commit()
+        future = worker_pool.submit(render_job, job_id, dataset, fmt, sql, params)
+        if self._socketio is not None:
+            self._socketio.start_background_task(self._watch, job_id, future)
+        return get_job(conn, job_id)
+
+    def _watch(self, job_id, future):
+        conn = sqlite3.connect(str(cfg.DB_PATH), timeout=30)
+        last = None
+        try:
+            while True:
+                job = get_job(conn, job_id)
+                if job is None:
+                    return
+                if future.done() and job["status"] not in FINISHED:
+                    # The pool process died before it could record the outcome.
+                    error = str(future.exception() or "export process exited")
+                    conn.execute(
+                        "UPDATE export_jobs SET status = 'failed', error = ?, finished_at = datetime('now') "
+                        "WHERE id = ?",
+                        (error, job_id),
+                    )
+                    conn.commit()
+                    continue
+                state = (job["status"], job["rows_done"], job["total_rows"])
+                if state != last:
+                    job.pop("admin_id")
+                    self._socketio.emit("export_progress", job, to=ADMIN_ROOM, namespace="/")
+                    last = state
+                if job["status"] in FINISHED:
+                    return
+                self._socketio.sleep(cfg.EXPORT_PROGRESS_INTERVAL)
+        except sqlite3.Error as e:
+            print(f"ERROR: Watching export job {job_id} failed - {e}")
+        finally:
+            conn.close()
+
+
+export_jobs = ExportJobRunner()
+
+
+if __name__ == "__main__":
+    from backend.database import init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    init_db()
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "purge":
+        count = purge_expired(conn)
+        conn.commit()
+        print(f"✅ {count} expired export jobs removed.")
+    elif command == "list":
+        for row in conn.execute(
+            "SELECT id, dataset, format, status, rows_done, total_rows, created_at FROM export_jobs ORDER BY created_at"
+        ):
+            print("  ".join("" if value is None else str(value) for value in row))
+    else:
+        print("Usage: python -m backend.export_jobs [purge|list]")
+        sys.exit(2)
+    conn.close()
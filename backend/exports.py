@@ -0,0 +1,276 @@
+# backend/exports.py
+
+# =============================================================================
+# S T R E A M I N G   T A B U L A R   E X P O R T S
+# =============================================================================
+# CSV, NDJSON and XLSX downloads of registered drugs, counterfeit reports and
+# ADR reports. The body is generated while the SQLite cursor is read, in
+# chunks of EXPORT_CHUNK_ROWS rows. Nothing holds the whole result set, so a
+# 500k-row export uses the same worker memory as a 50-row one, and the
+# download starts as soon as the first chunk is ready.
+#
+#   - The filters are the query-string parameters of the page the export link
+#     sits on (admin_drugs.html, admin.html), with the same meaning.
+#   - XLSX is written by hand: one worksheet with inline strings, zipped
+#     through zipfile into an unseekable sink that is drained after every
+#     chunk. The sheet is deflated as it is written, so nothing is buffered.
+#   - CSV starts with a UTF-8 BOM so Excel detects the encoding. Text cells
+#     that begin with =, +, - or @ get a leading apostrophe: report notes and
+#     locations come from the public and must not run as spreadsheet formulas.
+# =============================================================================
+
+import csv
+import io
+import json
+import re
+import sqlite3
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+from flask import Response
+
+from backend.config import get_config
+from backend.dashboard_queries import adr_filters, counterfeit_filters
+from backend.drug_filters import compile_drug_filter, expiry_status_sql
+
+cfg = get_config()
+
+
+EXPIRY_LABELS = {"valid": "Valid", "expired": "Expired", "soon": "Expiring Soon"}
+
+# dataset -> (filter function, FROM clause, ORDER BY, [(header, key, SQL expression)])
+DATASETS = {
+    "drugs": (compile_drug_filter, "FROM drugs", "created_at_epoch DESC, id DESC", [
+        ("ID", "id", "id"),
+        ("Name", "name", "name"),
+        ("Batch Number", "batch_number", "batch_number"),
+        ("Manufacturer", "manufacturer", "manufacturer"),
+        ("Mfg Date", "mfg_date", "mfg_date"),
+        ("Expiry Date", "expiry_date", "expiry_date"),
+        ("Status", "status", expiry_status_sql(EXPIRY_LABELS)),
+        ("Registered On", "created_at", "created_at"),
+    ]),
+    "reports": (counterfeit_filters, "FROM reports r LEFT JOIN users u ON r.user_id = u.id",
+                "r.reported_on_epoch DESC, r.id DESC", [
+        ("ID", "id", "r.id"),
+        ("Drug Name", "drug_name", "r.drug_name"),
+        ("Batch Number", "batch_number", "r.batch_number"),
+        ("Location", "location", "r.location"),
+        ("Latitude", "latitude", "r.latitude"),
+        ("Longitude", "longitude", "r.longitude"),
+        ("Note", "note", "r.note"),
+        ("Status", "status", "CASE WHEN r.status IS NULL OR r.status = 0 THEN 'New' ELSE r.status END"),
+        ("Similar Reports", "duplicate_count", "r.duplicate_count"),
+        ("Reported On", "reported_on", "strftime('%Y-%m-%d %H:%M:%S', r.reported_on)"),
+        ("Reporter", "reporter", "u.email"),
+    ]),
+    "adr_reports": (adr_filters, "FROM adr_reports ar JOIN drugs d ON ar.drug_id = d.id",
+                    "ar.report_date_epoch DESC, ar.id DESC", [
+        ("ID", "id", "ar.id"),
+        ("Drug Name", "drug_name", "d.name"),
+        ("Batch Number", "batch_number", "d.batch_number"),
+        ("Patient Age Range", "patient_age_range", "ar.patient_age_range"),
+        ("Patient Gender", "patient_gender", "ar.patient_gender"),
+        ("Reaction", "reaction_description", "ar.reaction_description"),
+        ("Reaction Start Date", "reaction_start_date", "ar.reaction_start_date"),
+        ("Other Medications", "other_medications", "ar.other_medications"),
+        ("Status", "status", "COALESCE(ar.status, 'New')"),
+        ("Report Date", "report_date", "strftime('%Y-%m-%d %H:%M:%S', ar.report_date)"),
+    ]),
+}
+
+
+def _rows(sql, params):
+    """Yield lists of rows, EXPORT_CHUNK_ROWS at a time, straight off the cursor."""
+    # The body is sent after the request's own connection (get_db) has been
+    # closed at teardown, so the export reads through a connection of its own.
+    conn = sqlite3.connect(str(cfg.DB_PATH), timeout=10)
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(cfg.EXPORT_CHUNK_ROWS)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        conn.close()
+
+
+# --- Writers ------------------------------------------------------------------------
+# Each takes the column list and the chunk iterator and yields bytes.
+
+FORMULA_START = ("=", "+", "-", "@")
+
+
+def _csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_START):
+        return "'" + value
+    return value
+
+
+def write_csv(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow([header for header, _, _ in columns])
+    for chunk in chunks:
+        writer.writerows([_csv_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def write_ndjson(columns, chunks):
+    keys = [key for _, key, _ in columns]
+    for chunk in chunks:
+        yield "".join(
+            json.dumps(dict(zip(keys, row)), ensure_ascii=False, default=str) + "\n" for row in chunk
+        ).encode("utf-8")
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable file that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+# Characters XML 1.0 does not allow, even escaped.
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def _column_letter(index):
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_row(number, letters, values):
+    cells = []
+    for letter, value in zip(letters, values):
+        if value is None:
+            continue
+        ref = f"{letter}{number}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+        else:
+            text = escape(_XML_ILLEGAL.sub("", str(value)))
+            cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+def write_xlsx(columns, chunks):
+    sink = _Sink()
+    letters = [_column_letter(i) for i in range(len(columns))]
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _xlsx_row(1, letters, [header for header, _, _ in columns])
+            ).encode("utf-8"))
+            number = 1
+            for chunk in chunks:
+                rows = []
+                for row in chunk:
+                    number += 1
+                    rows.append(_xlsx_row(number, letters, row))
+                sheet.write("".join(rows).encode("utf-8"))
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+FORMATS = {
+    "csv": (write_csv, "text/csv; charset=utf-8"),
+    "ndjson": (write_ndjson, "application/x-ndjson"),
+    "xlsx": (write_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def build_query(dataset, args, expressions=None):
+    """
+    (sql, params) selecting `expressions` (default: every export column) from
+    `dataset`, filtered by the page's query-string `args` and newest first.
+    Raises PageRequestError for a malformed filter.
+    """
+    filters, select_from, order_by, columns = DATASETS[dataset]
+    where, params = filters(args)
+    sql = f"""
+        SELECT {", ".join(expressions or [expression for _, _, expression in columns])}
+        {select_from}
+        WHERE {" AND ".join(where) or "1=1"}
+        ORDER BY {order_by}
+    """
+    return sql, params
+
+
+def export_response(dataset, fmt, args):
+    """
+    A streamed download of `dataset` (drugs, reports, adr_reports) in `fmt`
+    (csv, ndjson, xlsx), filtered by the page's query-string `args`.
+    Raises PageRequestError for a malformed filter before anything is sent.
+    """
+    sql, params = build_query(dataset, args)
+    writer, mimetype = FORMATS[fmt]
+    filename = f"{dataset}_{date.today().isoformat()}.{fmt}"
+    return Response(
+        writer(DATASETS[dataset][3], _rows(sql, params)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
@@ -15,7 +15,7 @@ def get_existing_hotspots():
     c.execute("""
         SELECT latitude, longitude
         FROM reports
-        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND cluster_id IS NULL
     """)
     rows = c.fetchall()
     conn.close()
@@ -0,0 +1,272 @@
+# backend/image_store.py
+
+# =============================================================================
+# C O N T E N T - A D D R E S S E D   I M A G E   S T O R E
+# =============================================================================
+# Report photos are stored once per distinct content, keyed by SHA-256:
+#
+#   1. The request streams the upload in chunks to a private spool directory
+#      while hashing it, then renames it to `<sha256>.<ext>`, where <ext> comes
+#      from the format Pillow detects in the content, not from the filename.
+#      If that content is already stored (or already spooled), the new copy is
+#      simply discarded.
+#      The request returns as soon as the bytes are on disk.
+#   2. The shared process pool (backend/worker_pool.py) turns the spooled file into the public variants
+#      under IMAGE_STORE_DIR/<first two hex chars>/:
+#         <sha256>.<ext>         the original, EXIF and other metadata stripped
+#         <sha256>.webp          full-size WebP
+#         <sha256>_thumb.webp    IMAGE_THUMB_SIZE px thumbnail for list pages
+#      and deletes the spooled file, so GPS tags from phones are never served.
+#   3. The image route serves a variant with a one-year immutable Cache-Control
+#      (the content can never change under the same key). A variant that the pool
+#      has not produced yet is a 404, and the upload is queued again if it is no
+#      longer waiting; decoding never runs on a request thread.
+#
+# reports.image_filename holds the key `<sha256>.<ext>`. Filenames written before
+# this store existed are still served from the uploads folder as they are.
+# =============================================================================
+
+import functools
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+from PIL import Image, ImageOps
+
+from backend import worker_pool
+from backend.config import get_config
+
+cfg = get_config()
+
+CHUNK_SIZE = 64 * 1024
+VARIANTS = ("original", "webp", "thumb")
+KEY_PATTERN = re.compile(r"^(?P<digest>[0-9a-f]{64})\.(?P<ext>png|jpg|gif)$")
+FORMATS = {"PNG": "png", "JPEG": "jpg", "GIF": "gif"}
+# Modes each original format can be written in; anything else is converted.
+SAVE_MODES = {"jpg": ("RGB", "L", "CMYK"), "png": ("1", "L", "LA", "I", "P", "RGB", "RGBA"), "gif": None}
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds IMAGE_MAX_BYTES."""
+
+
+class InvalidImage(Exception):
+    """Raised when an upload is not an image Pillow can safely decode."""
+
+
+# --- Paths ---------------------------------------------------------------------
+
+def parse_key(key):
+    """Return (digest, ext) for a store key, or None for legacy filenames."""
+    match = KEY_PATTERN.match(key or "")
+    return match.group("digest", "ext") if match else None
+
+
+def spool_path(digest, ext, spool_dir=None):
+    return os.path.join(str(spool_dir or cfg.IMAGE_SPOOL_DIR), f"{digest}.{ext}")
+
+
+def variant_path(digest, ext, variant, store_dir=None):
+    folder = os.path.join(str(store_dir or cfg.IMAGE_STORE_DIR), digest[:2])
+    if variant == "original":
+        return os.path.join(folder, f"{digest}.{ext}")
+    if variant == "webp":
+        return os.path.join(folder, f"{digest}.webp")
+    return os.path.join(folder, f"{digest}_thumb.webp")
+
+
+# --- Request side ----------------------------------------------------------------
+
+def save_upload(file_storage):
+    """
+    Stream an uploaded file into the store and queue its variants.
+    Returns the store key, or raises UploadTooLarge or InvalidImage.
+    """
+    spool_dir = str(cfg.IMAGE_SPOOL_DIR)
+    os.makedirs(spool_dir, exist_ok=True)
+
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=spool_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file_storage.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > cfg.IMAGE_MAX_BYTES:
+                    raise UploadTooLarge(f"Images must be at most {cfg.IMAGE_MAX_BYTES // (1024 * 1024)} MB")
+                sha256.update(chunk)
+                out.write(chunk)
+        ext = check_image(tmp_path)
+        digest = sha256.hexdigest()
+        target = spool_path(digest, ext)
+        if os.path.exists(variant_path(digest, ext, "original")) or os.path.exists(target):
+            os.remove(tmp_path)  # Same content already stored or waiting for the pool.
+        else:
+            os.replace(tmp_path, target)
+            submit(digest, ext)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return f"{digest}.{ext}"
+
+
+def check_image(path):
+    """
+    Read just the image header, so a file Pillow cannot decode, or whose pixel
+    count trips its decompression-bomb limit, is refused before it is queued.
+    Returns the store extension for the detected format.
+    """
+    try:
+        with Image.open(path) as img:
+            fmt = img.format
+    except Image.DecompressionBombError:
+        raise InvalidImage("Image dimensions are too large")
+    except Exception:  # UnidentifiedImageError, OSError, or a plugin's own error
+        raise InvalidImage("The file is not a readable image")
+    if fmt not in FORMATS:
+        raise InvalidImage("Only PNG, JPEG and GIF images are accepted")
+    return FORMATS[fmt]
+
+
+# --- Worker side -----------------------------------------------------------------
+
+def process_image(digest, ext, spool_dir, store_dir, thumb_size):
+    """
+    Write the stripped original, WebP and thumbnail variants for a spooled upload,
+    then remove it from the spool. Safe to run more than once for the same key.
+    Runs in a pool process, so it only takes plain arguments.
+    """
+    source = spool_path(digest, ext, spool_dir)
+    if not os.path.exists(source):
+        return False
+    os.makedirs(os.path.dirname(variant_path(digest, ext, "original", store_dir)), exist_ok=True)
+
+    try:
+        with Image.open(source) as img:
+            img.load()
+            _write_variants(img, digest, ext, store_dir, thumb_size)
+    except Exception as e:
+        # Undecodable, too large or unwritable: leaving it spooled would only
+        # fail the same way on every retry.
+        print(f"WARNING: Discarding upload {digest}.{ext} - {e}")
+        _remove(source)
+        return False
+
+    _remove(source)
+    return True
+
+
+def _write_variants(img, digest, ext, store_dir, thumb_size):
+    icc_profile = img.info.get("icc_profile")
+    transposed = ImageOps.exif_transpose(img)
+
+    # The original keeps the key's format; convert modes that format cannot hold
+    # (e.g. RGBA for JPEG, which keys created from the filename may still have).
+    original = transposed
+    modes = SAVE_MODES[ext]
+    if modes is not None and original.mode not in modes:
+        original = original.convert("RGBA" if ext == "png" else "RGB")
+
+    # Pillow only writes metadata it is given, so saving without `exif`
+    # (or PNG text chunks) strips it.
+    original_opts = {}
+    if ext == "jpg":
+        if original is img and img.format == "JPEG":
+            original_opts["quality"] = "keep"
+        else:
+            original_opts["quality"] = 90
+        if icc_profile:
+            original_opts["icc_profile"] = icc_profile
+    elif ext == "gif" and getattr(img, "is_animated", False):
+        original_opts["save_all"] = True
+    _atomic_save(original, variant_path(digest, ext, "original", store_dir),
+                 "JPEG" if ext == "jpg" else ext.upper(), **original_opts)
+
+    frame = transposed.convert("RGBA" if transposed.mode in ("RGBA", "LA", "P") else "RGB")
+    _atomic_save(frame, variant_path(digest, ext, "webp", store_dir), "WEBP", quality=80, method=4)
+    frame.thumbnail((thumb_size, thumb_size))
+    _atomic_save(frame, variant_path(digest, ext, "thumb", store_dir), "WEBP", quality=75, method=4)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # Another process finished the same image first.
+
+
+def _atomic_save(img, path, fmt, **opts):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    img.save(tmp_path, format=fmt, **opts)
+    os.replace(tmp_path, path)
+
+
+def _run(digest, ext):
+    return process_image(digest, ext, str(cfg.IMAGE_SPOOL_DIR), str(cfg.IMAGE_STORE_DIR), cfg.IMAGE_THUMB_SIZE)
+
+
+_queued = set()
+_queued_lock = threading.Lock()
+
+
+def _finished(key, future):
+    with _queued_lock:
+        _queued.discard(key)
+    error = future.exception()
+    if error is not None:
+        print(f"ERROR: Image processing failed - {error}")
+
+
+def submit(digest, ext):
+    """Queue variant generation for a spooled upload, unless it is already queued here."""
+    key = (digest, ext)
+    with _queued_lock:
+        if key in _queued:
+            return
+        _queued.add(key)
+    try:
+        future = worker_pool.submit(_run, digest, ext)
+    except RuntimeError as e:
+        # Pool is shutting down; the next request for the image queues it again.
+        with _queued_lock:
+            _queued.discard(key)
+        print(f"WARNING: Could not queue image {digest} - {e}")
+        return
+    future.add_done_callback(functools.partial(_finished, key))
+
+
+def ensure_variant(digest, ext, variant):
+    """
+    Return the path of a variant, or None while the pool has not produced it.
+    A spooled upload that is not queued in this process (e.g. after a restart)
+    is queued again; decoding never happens on the request thread.
+    """
+    path = variant_path(digest, ext, variant)
+    if os.path.exists(path):
+        return path
+    if os.path.exists(spool_path(digest, ext)):
+        submit(digest, ext)
+    return None
+
+
+def process_spool():
+    """Produce variants for everything left in the spool (e.g. after a crash). Returns the count."""
+    spool_dir = str(cfg.IMAGE_SPOOL_DIR)
+    if not os.path.isdir(spool_dir):
+        return 0
+    count = 0
+    for name in os.listdir(spool_dir):
+        key = parse_key(name)
+        if key and _run(*key):
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    print(f"✅ {process_spool()} spooled images processed.")
@@ -0,0 +1,438 @@
+# backend/ledger.py
+
+# =============================================================================
+# L O C A L   S U P P L Y - C H A I N   L E D G E R
+# =============================================================================
+# A local stand-in for the Hyperledger Fabric network (see blockchain/chaincode.py).
+#
+#   - `ledger_events` is an append-only, hash-chained event log: each event's
+#     hash covers its content and the previous event's hash, and triggers reject
+#     UPDATE and DELETE. The fields are hashed as a JSON array, so no value can
+#     move a field boundary (hash_version 2). Events written before that joined
+#     them with "|" (hash_version 1) and are still verified that way.
+#   - The (batch_number, seq) index maps a batch to its event offsets, so a
+#     batch's history is a single index range read.
+#   - Events are sealed into blocks of up to LEDGER_BLOCK_SIZE events, each
+#     with a Merkle root over its event hashes and a link to the previous block.
+#     Many registrations are written in one transaction and share a block. A
+#     partial block is sealed once its oldest event is LEDGER_BLOCK_INTERVAL
+#     seconds old: by the next append, or by the next proof request that finds
+#     it overdue, so a quiet registry does not leave events unproven.
+#   - Any event in a sealed block can be returned with its Merkle inclusion proof.
+#
+# Events are written on the caller's connection and committed with the caller's
+# transaction (e.g. together with the `drugs` row they describe).
+#
+#   python -m backend.ledger backfill   # register every drug that has no events yet
+#   python -m backend.ledger seal       # seal pending events into blocks now
+#   python -m backend.ledger verify     # re-check the hash chain and block roots
+# =============================================================================
+
+import hashlib
+import json
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+from backend.config import get_config
+
+cfg = get_config()
+
+GENESIS_HASH = "0" * 64
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ledger_events (
+        seq INTEGER PRIMARY KEY,
+        batch_number TEXT NOT NULL,
+        event_type TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        prev_hash TEXT NOT NULL,
+        event_hash TEXT NOT NULL,
+        block_height INTEGER,
+        hash_version INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ledger_events_batch ON ledger_events (batch_number, seq)",
+    "CREATE INDEX IF NOT EXISTS idx_ledger_events_pending ON ledger_events (block_height, seq)",
+    """
+    CREATE TABLE IF NOT EXISTS ledger_blocks (
+        height INTEGER PRIMARY KEY,
+        first_seq INTEGER NOT NULL,
+        last_seq INTEGER NOT NULL,
+        merkle_root TEXT NOT NULL,
+        prev_block_hash TEXT NOT NULL,
+        block_hash TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """,
+    # Events are immutable once written; only sealing them into a block is allowed.
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_events_no_update
+    BEFORE UPDATE ON ledger_events
+    WHEN OLD.block_height IS NOT NULL
+      OR NEW.seq IS NOT OLD.seq OR NEW.batch_number IS NOT OLD.batch_number
+      OR NEW.event_type IS NOT OLD.event_type OR NEW.payload IS NOT OLD.payload
+      OR NEW.created_at IS NOT OLD.created_at OR NEW.prev_hash IS NOT OLD.prev_hash
+      OR NEW.event_hash IS NOT OLD.event_hash OR NEW.hash_version IS NOT OLD.hash_version
+    BEGIN
+        SELECT RAISE(ABORT, 'ledger_events is append-only');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_events_no_delete
+    BEFORE DELETE ON ledger_events
+    BEGIN
+        SELECT RAISE(ABORT, 'ledger_events is append-only');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS ledger_blocks_no_change
+    BEFORE UPDATE ON ledger_blocks
+    BEGIN
+        SELECT RAISE(ABORT, 'ledger_blocks is append-only');
+    END
+    """,
+]
+
+
+def init_ledger(conn):
+    """Create the ledger tables, indexes and guard triggers if they don't exist."""
+    conn.execute(SCHEMA[0])
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(ledger_events)")}
+    if "hash_version" not in existing:
+        # Events written before hash_version existed used the "|" encoding.
+        conn.execute("ALTER TABLE ledger_events ADD COLUMN hash_version INTEGER NOT NULL DEFAULT 1")
+        conn.execute("DROP TRIGGER IF EXISTS ledger_events_no_update")
+    for statement in SCHEMA[1:]:
+        conn.execute(statement)
+
+
+# --- Hashing -------------------------------------------------------------------
+
+def _sha256(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+EVENT_HASH_VERSION = 2
+
+
+def event_hash(prev_hash, batch_number, event_type, payload, created_at, version=EVENT_HASH_VERSION):
+    fields = [prev_hash, batch_number, event_type, payload, created_at]
+    if version == 1:
+        return _sha256("|".join(fields))
+    return _sha256(json.dumps(fields, ensure_ascii=False, separators=(",", ":")))
+
+
+def _hash_pair(left: str, right: str) -> str:
+    return _sha256(left + right)
+
+
+def merkle_root(leaves):
+    """Merkle root over hex leaf hashes; an odd node is paired with itself."""
+    if not leaves:
+        return GENESIS_HASH
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+    return level[0]
+
+
+def merkle_proof(leaves, index):
+    """Inclusion proof for leaves[index]: a list of {"hash", "position"} siblings, leaf to root."""
+    proof = []
+    level = list(leaves)
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        sibling = index ^ 1
+        proof.append({"hash": level[sibling], "position": "left" if sibling < index else "right"})
+        level = [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf, proof, root):
+    """Recompute the root from a leaf and its proof."""
+    current = leaf
+    for step in proof:
+        if step["position"] == "left":
+            current = _hash_pair(step["hash"], current)
+        else:
+            current = _hash_pair(current, step["hash"])
+    return current == root
+
+
+def block_hash(height, first_seq, last_seq, root, prev_block_hash):
+    return _sha256(f"{height}|{first_seq}|{last_seq}|{root}|{prev_block_hash}")
+
+
+# --- Writing -------------------------------------------------------------------
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _age(created_at):
+    """Seconds since a created_at timestamp."""
+    return time.time() - datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+
+def append_events(conn, events):
+    """
+    Append (batch_number, event_type, payload_dict) events to the ledger on `conn`.
+    The caller commits. Full blocks are sealed in the same transaction.
+    """
+    events = list(events)
+    if not events:
+        return
+    if not conn.in_transaction:
+        # Take the write lock before reading the chain head.
+        conn.execute("BEGIN IMMEDIATE")
+
+    head = conn.execute("SELECT seq, event_hash FROM ledger_events ORDER BY seq DESC LIMIT 1").fetchone()
+    seq, prev_hash = (head[0], head[1]) if head else (0, GENESIS_HASH)
+    created_at = _now()
+
+    rows = []
+    for batch_number, event_type, payload in events:
+        seq += 1
+        payload_json = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        this_hash = event_hash(prev_hash, batch_number, event_type, payload_json, created_at)
+        rows.append((seq, batch_number, event_type, payload_json, created_at, prev_hash, this_hash,
+                     EVENT_HASH_VERSION))
+        prev_hash = this_hash
+    conn.executemany(
+        """
+        INSERT INTO ledger_events (seq, batch_number, event_type, payload, created_at, prev_hash, event_hash,
+                                   hash_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        rows
+    )
+    seal_blocks(conn)
+
+
+def seal_blocks(conn, force=False):
+    """
+    Seal pending events into blocks of LEDGER_BLOCK_SIZE. A partial block is sealed
+    when `force` is set or its oldest event is older than LEDGER_BLOCK_INTERVAL seconds.
+    Returns the number of blocks written.
+    """
+    block_size = cfg.LEDGER_BLOCK_SIZE
+    sealed = 0
+    while True:
+        pending = conn.execute(
+            """
+            SELECT seq, event_hash, created_at FROM ledger_events
+            WHERE block_height IS NULL ORDER BY seq LIMIT ?
+            """,
+            (block_size,)
+        ).fetchall()
+        if not pending:
+            return sealed
+        if len(pending) < block_size and not force and _age(pending[0][2]) < cfg.LEDGER_BLOCK_INTERVAL:
+            return sealed
+
+        tip = conn.execute("SELECT height, block_hash FROM ledger_blocks ORDER BY height DESC LIMIT 1").fetchone()
+        height, prev_block = (tip[0] + 1, tip[1]) if tip else (1, GENESIS_HASH)
+        first_seq, last_seq = pending[0][0], pending[-1][0]
+        root = merkle_root([row[1] for row in pending])
+        conn.execute(
+            """
+            INSERT INTO ledger_blocks (height, first_seq, last_seq, merkle_root, prev_block_hash, block_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (height, first_seq, last_seq, root, prev_block,
+             block_hash(height, first_seq, last_seq, root, prev_block), _now())
+        )
+        conn.execute(
+            "UPDATE ledger_events SET block_height = ? WHERE seq BETWEEN ? AND ?",
+            (height, first_seq, last_seq)
+        )
+        sealed += 1
+
+
+def seal_overdue(conn):
+    """
+    Seal the pending block if it is overdue, for readers that want proofs.
+    Commits on its own unless the caller already has a transaction open.
+    Returns the number of blocks written.
+    """
+    oldest = conn.execute(
+        "SELECT created_at FROM ledger_events WHERE block_height IS NULL ORDER BY seq LIMIT 1"
+    ).fetchone()
+    if oldest is None or _age(oldest[0]) < cfg.LEDGER_BLOCK_INTERVAL:
+        return 0
+    if conn.in_transaction:
+        return seal_blocks(conn)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        sealed = seal_blocks(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return sealed
+
+
+def record_registration(conn, batch_number, name, manufacturer, mfg_date, expiry_date):
+    append_events(conn, [(batch_number, "registered", {
+        "drug_name": name, "manufacturer": manufacturer,
+        "mfg_date": mfg_date, "expiry_date": expiry_date, "owner": manufacturer,
+    })])
+
+
+def record_transfer(conn, batch_number, previous_owner, new_owner):
+    append_events(conn, [(batch_number, "transferred", {"from": previous_owner, "to": new_owner})])
+
+
+# --- Reading -------------------------------------------------------------------
+
+def get_events(conn, batch_number):
+    return conn.execute(
+        """
+        SELECT seq, event_type, payload, created_at, event_hash, block_height
+        FROM ledger_events WHERE batch_number = ? ORDER BY seq
+        """,
+        (batch_number,)
+    ).fetchall()
+
+
+def describe_event(event_type, payload, created_at):
+    """Human-readable line for the verify page's supply-chain journey."""
+    if event_type == "registered":
+        return f"Registered by {payload.get('manufacturer')} on {created_at}"
+    if event_type == "transferred":
+        return f"Transferred from {payload.get('from')} to {payload.get('to')} on {created_at}"
+    return f"{event_type.capitalize()} on {created_at}"
+
+
+def get_history(conn, batch_number):
+    """The batch's supply-chain journey as a list of sentences (oldest first)."""
+    return [describe_event(row[1], json.loads(row[2]), row[3]) for row in get_events(conn, batch_number)]
+
+
+def get_history_with_proofs(conn, batch_number):
+    """
+    Each event of a batch with its block and Merkle inclusion proof. Pending
+    events are sealed first if their block is overdue; the proof is None only
+    for events younger than LEDGER_BLOCK_INTERVAL.
+    """
+    events = get_events(conn, batch_number)
+    if any(row[5] is None for row in events) and seal_overdue(conn):
+        events = get_events(conn, batch_number)
+    blocks = {}
+    history = []
+    for seq, event_type, payload, created_at, ev_hash, height in events:
+        payload = json.loads(payload)
+        entry = {
+            "seq": seq,
+            "event_type": event_type,
+            "payload": payload,
+            "created_at": created_at,
+            "event_hash": ev_hash,
+            "description": describe_event(event_type, payload, created_at),
+            "block": None,
+            "proof": None,
+        }
+        if height is not None:
+            if height not in blocks:
+                block = conn.execute(
+                    """
+                    SELECT height, first_seq, last_seq, merkle_root, prev_block_hash, block_hash, created_at
+                    FROM ledger_blocks WHERE height = ?
+                    """,
+                    (height,)
+                ).fetchone()
+                leaves = [r[0] for r in conn.execute(
+                    "SELECT event_hash FROM ledger_events WHERE seq BETWEEN ? AND ? ORDER BY seq",
+                    (block[1], block[2])
+                )]
+                blocks[height] = (block, leaves)
+            block, leaves = blocks[height]
+            entry["block"] = {
+                "height": block[0], "merkle_root": block[3],
+                "prev_block_hash": block[4], "block_hash": block[5], "sealed_at": block[6],
+            }
+            entry["proof"] = merkle_proof(leaves, seq - block[1])
+        history.append(entry)
+    return history
+
+
+def verify_chain(conn):
+    """Re-check every event hash, the event chain and every block root. Returns a list of problems."""
+    problems = []
+    prev, prev_version = GENESIS_HASH, 1
+    for seq, batch_number, event_type, payload, created_at, prev_hash, ev_hash, version in conn.execute(
+        """
+        SELECT seq, batch_number, event_type, payload, created_at, prev_hash, event_hash, hash_version
+        FROM ledger_events ORDER BY seq
+        """
+    ):
+        if prev_hash != prev:
+            problems.append(f"event {seq}: broken link to previous event")
+        if version < prev_version:
+            problems.append(f"event {seq}: older hash encoding after a newer one")
+        if event_hash(prev_hash, batch_number, event_type, payload, created_at, version) != ev_hash:
+            problems.append(f"event {seq}: hash mismatch")
+        prev, prev_version = ev_hash, version
+    prev_block = GENESIS_HASH
+    for height, first_seq, last_seq, root, prev_block_hash, b_hash in conn.execute(
+        "SELECT height, first_seq, last_seq, merkle_root, prev_block_hash, block_hash FROM ledger_blocks ORDER BY height"
+    ):
+        leaves = [r[0] for r in conn.execute(
+            "SELECT event_hash FROM ledger_events WHERE seq BETWEEN ? AND ? ORDER BY seq", (first_seq, last_seq)
+        )]
+        if merkle_root(leaves) != root:
+            problems.append(f"block {height}: Merkle root mismatch")
+        if prev_block_hash != prev_block or block_hash(height, first_seq, last_seq, root, prev_block_hash) != b_hash:
+            problems.append(f"block {height}: broken block chain")
+        prev_block = b_hash
+    return problems
+
+
+def backfill(conn):
+    """Register every drug that has no ledger events yet, in one transaction."""
+    rows = conn.execute(
+        """
+        SELECT d.batch_number, d.name, d.manufacturer, d.mfg_date, d.expiry_date
+        FROM drugs d
+        WHERE NOT EXISTS (SELECT 1 FROM ledger_events e WHERE e.batch_number = d.batch_number)
+        ORDER BY d.id
+        """
+    ).fetchall()
+    append_events(conn, [
+        (batch, "registered", {"drug_name": name, "manufacturer": maker,
+                               "mfg_date": mfg, "expiry_date": exp, "owner": maker})
+        for batch, name, maker, mfg, exp in rows
+    ])
+    seal_blocks(conn, force=True)
+    conn.commit()
+    return len(rows)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=10)
+    init_ledger(conn)
+    if command == "backfill":
+        print(f"✅ {backfill(conn)} drug batches registered on the ledger.")
+    elif command == "seal":
+        count = seal_blocks(conn, force=True)
+        conn.commit()
+        print(f"✅ {count} blocks sealed.")
+    elif command == "verify":
+        problems = verify_chain(conn)
+        for problem in problems:
+            print(f"  - {problem}")
+        print("✅ Ledger is consistent." if not problems else "❌ Ledger verification failed.")
+        sys.exit(1 if problems else 0)
+    else:
+        print("Usage: python -m backend.ledger [backfill|seal|verify]")
+        sys.exit(2)
+    conn.close()
@@ -2,6 +2,8 @@ import sqlite3
 import time
 from typing import Optional, Dict
 from backend.database import get_db
+from backend.drug_cache import invalidate_drug
+from backend.ledger import record_registration
 
 # ---------------------------
 # Retry Settings
@@ -42,7 +44,9 @@ def insert_drug(name: str, batch_number: str, mfg_date: str, expiry_date: str, m
         """,
                         (name, batch_number, mfg_date, expiry_date, manufacturer)
                         )
+    record_registration(conn, batch_number, name, manufacturer, mfg_date, expiry_date)
     conn.commit()
+    invalidate_drug(batch_number, added=True)
 
 
 def get_drug_by_batch(batch_number: str) -> Optional[Dict]:
@@ -87,7 +91,7 @@ def count_reports_for_batch(batch_number: str) -> int:
     conn = get_db()
     c = conn.cursor()
     c.execute(
-        "SELECT COUNT(*) as cnt FROM reports WHERE batch_number = ?",
+        "SELECT COUNT(*) as cnt FROM reports WHERE batch_number = ? AND cluster_id IS NULL",
         (batch_number,)
     )
     cnt = c.fetchone()["cnt"]
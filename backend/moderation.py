@@ -0,0 +1,176 @@
+# backend/moderation.py
+
+# =============================================================================
+# B U L K   M O D E R A T I O N
+# =============================================================================
+# Status changes and deletions of many counterfeit or ADR reports in one
+# request (POST /api/report/bulk, POST /api/adr-report/bulk):
+#
+#   {"action": "status", "status": "Resolved", "ids": [12, 15, 19]}
+#   {"action": "delete", "filter": {"search": "AMX-001", "start": "2025-06-01",
+#                                   "end": "2025-06-30"}}
+#
+#   - `ids` or `filter` picks the rows. A filter takes the same keys as the
+#     dashboard's query string (dashboard_queries.counterfeit_filters and
+#     adr_filters), so "everything the regulator is looking at" is one call.
+#   - "include_duplicates": true also takes in the near-duplicates clustered
+#     under the chosen counterfeit reports (backend/report_clusters.py), so a
+#     500-report cluster is triaged through its primary.
+#   - At most BULK_MODERATION_MAX_IDS rows per request. A filter matching more
+#     is refused rather than applied in part.
+#   - Everything runs in one write transaction, with executemany for the
+#     writes. Either every row is moderated or none is. The counter and
+#     analytics triggers fire per row inside it, as for the single-row routes.
+#   - Each id gets an outcome: updated, unchanged (already had that status),
+#     deleted or not_found.
+#   - One `reports_moderated` SocketIO event goes to the admin room for the
+#     whole request, listing the changed ids, instead of one per row.
+# =============================================================================
+
+from flask import current_app
+from flask_socketio import emit
+
+from backend.dashboard_queries import PageRequestError, adr_filters, counterfeit_filters
+from backend.report_counters import ADMIN_ROOM
+from backend.routes.verify_api import chunked
+
+ACTIONS = ("status", "delete")
+NEW_STATUSES = (None, 0, "New")
+
+# target -> (table, filter function, FROM clause with aliases, id column)
+TARGETS = {
+    "reports": ("reports", counterfeit_filters,
+                "FROM reports r LEFT JOIN users u ON r.user_id = u.id", "r.id"),
+    "adr_reports": ("adr_reports", adr_filters,
+                    "FROM adr_reports ar JOIN drugs d ON ar.drug_id = d.id", "ar.id"),
+}
+
+
+class ModerationError(ValueError):
+    """Raised for a bulk request that cannot be applied; the message is safe to show."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _parse_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        raise ModerationError("ids must be a non-empty list of report ids")
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ModerationError("ids must be integers")
+    # Keep the caller's order, drop duplicates.
+    return list(dict.fromkeys(ids))
+
+
+def _filter_ids(conn, target, filters, max_ids):
+    if not isinstance(filters, dict) or not any(str(v).strip() for v in filters.values()):
+        raise ModerationError("filter must set at least one dashboard filter")
+    _, filter_fn, select_from, id_column = TARGETS[target]
+    args = {key: str(value) for key, value in filters.items()}
+    try:
+        where, params = filter_fn(args)
+    except PageRequestError as e:
+        raise ModerationError(str(e))
+    rows = conn.execute(
+        f"SELECT {id_column} {select_from} WHERE {' AND '.join(where) or '1=1'} ORDER BY {id_column} LIMIT ?",
+        params + [max_ids + 1],
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def _duplicate_ids(conn, ids):
+    duplicates = []
+    for chunk in chunked(ids):
+        placeholders = ",".join("?" * len(chunk))
+        duplicates.extend(row[0] for row in conn.execute(
+            f"SELECT id FROM reports WHERE cluster_id IN ({placeholders})", chunk
+        ))
+    # Sorted here: ORDER BY id would make SQLite walk the table instead of idx_reports_cluster.
+    return sorted(duplicates)
+
+
+def _fetch_rows(conn, table, ids):
+    """{id: (status, clustered)} for the ids that exist."""
+    clustered = "cluster_id IS NOT NULL" if table == "reports" else "0"
+    rows = {}
+    for chunk in chunked(ids):
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"SELECT id, status, {clustered} FROM {table} WHERE id IN ({placeholders})", chunk
+        ):
+            rows[row[0]] = (row[1], bool(row[2]))
+    return rows
+
+
+def _same_status(current, status):
+    return current == status or (status == "New" and current in NEW_STATUSES)
+
+
+def moderate(conn, target, data):
+    """
+    Apply the bulk request `data` (the JSON body) to `target` ('reports' or
+    'adr_reports') in one transaction, then announce it to the admin sockets.
+    Returns the response body. Raises ModerationError for a bad request.
+    """
+    table = TARGETS[target][0]
+    action = data.get("action")
+    if action not in ACTIONS:
+        raise ModerationError(f"action must be one of: {', '.join(ACTIONS)}")
+    status = data.get("status")
+    if action == "status" and (not isinstance(status, str) or not status.strip()):
+        raise ModerationError("New status is required.")
+    status = status.strip() if action == "status" else None
+    if ("ids" in data) == ("filter" in data):
+        raise ModerationError("Send either ids or filter")
+
+    max_ids = current_app.config.get("BULK_MODERATION_MAX_IDS", 5000)
+    # Take the write lock before reading, so the rows matched are the rows changed.
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if "ids" in data:
+            ids = _parse_ids(data["ids"])
+        else:
+            ids = _filter_ids(conn, target, data["filter"], max_ids)
+        if data.get("include_duplicates") and table == "reports":
+            ids = list(dict.fromkeys(ids + _duplicate_ids(conn, ids)))
+        if len(ids) > max_ids:
+            raise ModerationError(f"At most {max_ids} reports can be moderated per request", 413)
+
+        rows = _fetch_rows(conn, table, ids)
+        if action == "status":
+            changed = [i for i in ids if i in rows and not _same_status(rows[i][0], status)]
+            conn.executemany(f"UPDATE {table} SET status = ? WHERE id = ?", [(status, i) for i in changed])
+            done = "updated"
+        else:
+            # Duplicates go before their primaries, so deleting a whole cluster
+            # does not promote a new primary for every row removed.
+            changed = sorted((i for i in ids if i in rows), key=lambda i: not rows[i][1])
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in changed])
+            done = "deleted"
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    changed_set = set(changed)
+    results = []
+    summary = {}
+    for i in ids:
+        outcome = done if i in changed_set else "unchanged" if i in rows else "not_found"
+        summary[outcome] = summary.get(outcome, 0) + 1
+        results.append({"id": i, "outcome": outcome})
+
+    if changed:
+        emit("reports_moderated", {"table": table, "action": action, "status": status, "ids": changed},
+             to=ADMIN_ROOM, namespace="/")
+    return {
+        "message": f"{len(changed)} of {len(ids)} reports {done}.",
+        "action": action,
+        "status": status,
+        "count": len(results),
+        "summary": summary,
+        "results": results,
+    }
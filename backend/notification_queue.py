@@ -0,0 +1,390 @@
+# backend/notification_queue.py
+
+# =============================================================================
+# D U R A B L E   O U T B O U N D   N O T I F I C A T I O N   Q U E U E
+# =============================================================================
+# SMS and email alerts are not sent inside the request. The request inserts a
+# row into `notification_queue`, in the same transaction as the data it is about,
+# and a background worker delivers it:
+#
+#   - Every process starts its worker at boot, so rows still pending or
+#     waiting for a retry after a restart or deploy are delivered without
+#     waiting for a new report.
+#   - The worker keeps one Twilio client and one SMTP connection for its lifetime
+#     (the SMTP connection is re-opened when the server drops it).
+#   - Each worker claims due rows in a short IMMEDIATE transaction, so several
+#     gunicorn workers never send the same row. A claim left behind by a dead
+#     process is released after NOTIFY_CLAIM_TIMEOUT seconds (at-least-once).
+#   - A failed send is retried with exponential backoff (NOTIFY_BACKOFF_BASE *
+#     2^attempts, plus jitter) up to NOTIFY_MAX_ATTEMPTS, then marked 'failed'.
+#   - Messages with a digest key are batched per recipient. The first one is
+#     sent right away. Those that arrive within NOTIFY_DIGEST_WINDOW seconds of
+#     the last send wait for the end of the window and go out as one message,
+#     e.g. "37 new counterfeit reports in the last 5 minutes".
+#
+# backend/notify_stubs.py provides local Twilio and SMTP stand-ins for testing.
+# =============================================================================
+
+import atexit
+import math
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+
+from backend.config import get_config
+
+cfg = get_config()
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS notification_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        subject TEXT,
+        body TEXT NOT NULL,
+        summary TEXT,
+        digest_key TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created_at INTEGER NOT NULL,
+        next_attempt_at INTEGER NOT NULL,
+        claimed_at INTEGER,
+        sent_at INTEGER,
+        last_error TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_notification_queue_due ON notification_queue (status, next_attempt_at)",
+    """
+    CREATE TABLE IF NOT EXISTS notification_digests (
+        channel TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        digest_key TEXT NOT NULL,
+        last_sent_at INTEGER NOT NULL,
+        PRIMARY KEY (channel, recipient, digest_key)
+    ) WITHOUT ROWID
+    """,
+]
+
+# What a digest of each key is counting, e.g. "37 new counterfeit reports".
+DIGEST_LABELS = {
+    "new_report": "new counterfeit reports",
+}
+DIGEST_PREVIEW_LINES = 5
+CLAIM_BATCH = 100
+PRUNE_INTERVAL = 3600
+
+
+def init_notification_queue(conn):
+    """Create the queue tables (called from init_db)."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+# --- Producer side ---------------------------------------------------------------
+
+def enqueue(conn, channel, recipient, body, subject=None, summary=None, digest_key=None, now=None):
+    """
+    Queue one message on the caller's connection; it is durable once the caller
+    commits. `summary` is the one-line form used when the message is folded into
+    a digest with others of the same `digest_key`.
+    """
+    now = int(time.time() if now is None else now)
+    send_at = now
+    if digest_key:
+        pending = conn.execute(
+            """
+            SELECT MIN(next_attempt_at) FROM notification_queue
+            WHERE status = 'pending' AND channel = ? AND recipient = ? AND digest_key = ?
+            """,
+            (channel, recipient, digest_key)
+        ).fetchone()[0]
+        last = conn.execute(
+            "SELECT last_sent_at FROM notification_digests WHERE channel = ? AND recipient = ? AND digest_key = ?",
+            (channel, recipient, digest_key)
+        ).fetchone()
+        if pending is not None:
+            send_at = pending  # Join the digest that is already waiting.
+        elif last and now - last[0] < cfg.NOTIFY_DIGEST_WINDOW:
+            send_at = last[0] + cfg.NOTIFY_DIGEST_WINDOW
+    conn.execute(
+        """
+        INSERT INTO notification_queue
+            (channel, recipient, subject, body, summary, digest_key, created_at, next_attempt_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (channel, recipient, subject, body, summary, digest_key, now, send_at)
+    )
+    notification_worker.ensure_started()
+
+
+# --- Transports ------------------------------------------------------------------
+
+class TwilioTransport:
+    """Sends SMS through one long-lived Twilio client."""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url=None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.base_url = base_url
+        self._client = None
+
+    @property
+    def configured(self):
+        return all([self.account_sid, self.auth_token, self.from_number])
+
+    def send(self, recipient, subject, body):
+        if self._client is None:
+            from twilio.rest import Client
+            self._client = Client(self.account_sid, self.auth_token)
+            if self.base_url:
+                self._client.api.base_url = self.base_url
+        return self._client.messages.create(body=body, from_=self.from_number, to=recipient).sid
+
+
+class SmtpTransport:
+    """Sends email over one SMTP connection, reconnecting when it has been dropped."""
+
+    def __init__(self, host, port, use_tls, username, password, sender, timeout=30):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.timeout = timeout
+        self._smtp = None
+
+    @property
+    def configured(self):
+        return bool(self.host and self.sender)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def send(self, recipient, subject, body):
+        msg = EmailMessage()
+        msg["Subject"] = subject or "MedGuard notification"
+        msg["From"] = self.sender
+        msg["To"] = recipient
+        msg.set_content(body)
+        for attempt in range(2):
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._smtp.send_message(msg)
+                return None
+            except smtplib.SMTPServerDisconnected:
+                self._smtp = None
+                if attempt:
+                    raise
+            except smtplib.SMTPException:
+                raise  # Rejected message; the connection itself is still usable.
+            except OSError:
+                self._smtp = None
+                raise
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+
+# --- Worker ----------------------------------------------------------------------
+
+def compose_digest(channel, digest_key, rows, now):
+    """Fold several queued rows into one (subject, body)."""
+    if len(rows) == 1:
+        return rows[0]["subject"], rows[0]["body"]
+    label = DIGEST_LABELS.get(digest_key, "notifications")
+    minutes = max(1, math.ceil((now - min(row["created_at"] for row in rows)) / 60))
+    period = "minute" if minutes == 1 else f"{minutes} minutes"
+    headline = f"MedGuard: {len(rows)} {label} in the last {period}."
+    lines = [row["summary"] or row["body"].splitlines()[0] for row in rows[:DIGEST_PREVIEW_LINES]]
+    if len(rows) > DIGEST_PREVIEW_LINES:
+        lines.append(f"... and {len(rows) - DIGEST_PREVIEW_LINES} more")
+    body = headline + "\n" + "\n".join(lines)
+    if channel == "email":
+        body += "\n\nPlease log in to the MedGuard admin dashboard to view the full reports."
+    return headline.replace("MedGuard: ", "MedGuard - "), body
+
+
+class NotificationWorker:
+    """Background thread that delivers queued notifications."""
+
+    def __init__(self, db_path, transports, poll_interval, max_attempts, backoff_base,
+                 backoff_max, claim_timeout, retention_days):
+        self.db_path = db_path
+        self.transports = transports
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.claim_timeout = claim_timeout
+        self.retention_days = retention_days
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._last_prune = 0.0
+        self.stats = {"sent": 0, "digests": 0, "retried": 0, "failed": 0}
+
+    # --- Lifecycle -------------------------------------------------------------
+    def ensure_started(self):
+        # Started per process: at boot (create_app, gunicorn post_fork) so
+        # leftover rows are drained, and again from enqueue() after a fork.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._thread = None
+                self._stopping = threading.Event()
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notification-worker", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        for transport in self.transports.values():
+            if hasattr(transport, "close"):
+                transport.close()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        while not self._stopping.is_set():
+            try:
+                while self.run_once(conn):
+                    pass
+            except sqlite3.Error as e:
+                print(f"ERROR: Notification worker - {e}")
+            self._stopping.wait(self.poll_interval)
+        conn.close()
+
+    # --- One pass --------------------------------------------------------------
+    def claim(self, conn, now):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE notification_queue SET status = 'pending' WHERE status = 'sending' AND claimed_at < ?",
+                (now - self.claim_timeout,)
+            )
+            rows = conn.execute(
+                """
+                SELECT id, channel, recipient, subject, body, summary, digest_key, attempts, created_at
+                FROM notification_queue
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY next_attempt_at, id LIMIT ?
+                """,
+                (now, CLAIM_BATCH)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE notification_queue SET status = 'sending', claimed_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def run_once(self, conn, now=None):
+        """Deliver every due message once. Returns the number of rows handled."""
+        now = int(time.time() if now is None else now)
+        rows = self.claim(conn, now)
+
+        groups = {}
+        for row in rows:
+            if row["digest_key"]:
+                key = (row["channel"], row["recipient"], row["digest_key"])
+            else:
+                key = (row["channel"], row["recipient"], None, row["id"])
+            groups.setdefault(key, []).append(row)
+
+        for key, group in groups.items():
+            channel, recipient, digest_key = key[0], key[1], key[2]
+            ids = [row["id"] for row in group]
+            try:
+                transport = self.transports[channel]
+                subject, body = compose_digest(channel, digest_key, group, now)
+                transport.send(recipient, subject, body)
+            except Exception as e:
+                self._failed(conn, ids, max(row["attempts"] for row in group) + 1, str(e), now)
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE notification_queue SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                [(now, row_id) for row_id in ids]
+            )
+            if digest_key:
+                conn.execute(
+                    "INSERT OR REPLACE INTO notification_digests (channel, recipient, digest_key, last_sent_at) VALUES (?, ?, ?, ?)",
+                    (channel, recipient, digest_key, now)
+                )
+            conn.execute("COMMIT")
+            self.stats["sent"] += 1
+            if len(group) > 1:
+                self.stats["digests"] += 1
+
+        if time.monotonic() - self._last_prune > PRUNE_INTERVAL:
+            self._last_prune = time.monotonic()
+            conn.execute(
+                "DELETE FROM notification_queue WHERE status = 'sent' AND sent_at < ?",
+                (now - self.retention_days * 86400,)
+            )
+        return len(rows)
+
+    def _failed(self, conn, ids, attempts, error, now):
+        if attempts >= self.max_attempts:
+            status, next_attempt = "failed", now
+            self.stats["failed"] += 1
+            print(f"ERROR: Giving up on notifications {ids} after {attempts} attempts - {error}")
+        else:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+            status, next_attempt = "pending", now + int(delay * random.uniform(1.0, 1.25))
+            self.stats["retried"] += 1
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            """
+            UPDATE notification_queue
+            SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, claimed_at = NULL
+            WHERE id = ?
+            """,
+            [(status, attempts, next_attempt, error[:500], row_id) for row_id in ids]
+        )
+        conn.execute("COMMIT")
+
+
+notification_worker = NotificationWorker(
+    db_path=cfg.DB_PATH,
+    transports={
+        "sms": TwilioTransport(cfg.TWILIO_ACCOUNT_SID, cfg.TWILIO_AUTH_TOKEN, cfg.TWILIO_PHONE_NUMBER,
+                               base_url=cfg.TWILIO_API_BASE_URL),
+        "email": SmtpTransport(cfg.MAIL_SERVER, cfg.MAIL_PORT, cfg.MAIL_USE_TLS,
+                               cfg.MAIL_USERNAME, cfg.MAIL_PASSWORD, cfg.MAIL_DEFAULT_SENDER),
+    },
+    poll_interval=cfg.NOTIFY_POLL_INTERVAL,
+    max_attempts=cfg.NOTIFY_MAX_ATTEMPTS,
+    backoff_base=cfg.NOTIFY_BACKOFF_BASE,
+    backoff_max=cfg.NOTIFY_BACKOFF_MAX,
+    claim_timeout=cfg.NOTIFY_CLAIM_TIMEOUT,
+    retention_days=cfg.NOTIFY_RETENTION_DAYS,
+)
+atexit.register(notification_worker.shutdown)
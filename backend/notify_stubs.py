@@ -0,0 +1,175 @@
+"""
+Local stand-ins for Twilio and SMTP, for development and tests of the
+notification queue (backend/notification_queue.py).
+
+    python -m backend.notify_stubs [--twilio-port 8766] [--smtp-port 1025] [--latency 0.5] [--fail-rate 0.2]
+
+then point MedGuard at them:
+
+    TWILIO_ACCOUNT_SID=ACstub TWILIO_AUTH_TOKEN=stub TWILIO_PHONE_NUMBER=+15550000000 \
+    TWILIO_API_BASE_URL=http://127.0.0.1:8766 \
+    MAIL_SERVER=127.0.0.1 MAIL_PORT=1025 MAIL_USE_TLS=false MAIL_DEFAULT_SENDER=alerts@medguard.local
+
+The Twilio stub answers POST /2010-04-01/Accounts/<sid>/Messages.json like the
+real API. The SMTP stub speaks enough SMTP for smtplib. Both keep what they
+received in `.messages`, and the Twilio stub serves GET /stats with its counts.
+"""
+
+import argparse
+import json
+import random
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+# --- Twilio ----------------------------------------------------------------------
+
+def make_twilio_handler(messages, latency=0.0, fail_rate=0.0):
+    lock = threading.Lock()
+
+    class TwilioStubHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                return self._send(200, {"messages": len(messages)})
+            return self._send(404, {"message": "Not found"})
+
+        def do_POST(self):
+            if not self.path.endswith("/Messages.json"):
+                return self._send(404, {"message": "Not found"})
+            length = int(self.headers.get("Content-Length", 0))
+            form = parse_qs(self.rfile.read(length).decode("utf-8"))
+            if latency:
+                time.sleep(latency)
+            if fail_rate and random.random() < fail_rate:
+                return self._send(503, {"code": 20503, "message": "Service unavailable", "status": 503})
+            with lock:
+                sid = f"SM{len(messages) + 1:032d}"
+                message = {
+                    "sid": sid,
+                    "to": form.get("To", [""])[0],
+                    "from": form.get("From", [""])[0],
+                    "body": form.get("Body", [""])[0],
+                    "status": "queued",
+                }
+                messages.append(message)
+            return self._send(201, message)
+
+        def log_message(self, format, *args):
+            pass
+
+    return TwilioStubHandler
+
+
+# --- SMTP ------------------------------------------------------------------------
+
+def make_smtp_handler(messages):
+    lock = threading.Lock()
+
+    class SmtpStubHandler(socketserver.StreamRequestHandler):
+        def reply(self, line):
+            self.wfile.write((line + "\r\n").encode("utf-8"))
+
+        def handle(self):
+            self.reply("220 medguard-smtp-stub ready")
+            sender, recipients = None, []
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    self.reply("250-medguard-smtp-stub")
+                    self.reply("250 8BITMIME")
+                elif verb == "HELO":
+                    self.reply("250 medguard-smtp-stub")
+                elif verb == "MAIL":
+                    sender, recipients = command.split(":", 1)[1].strip(" <>"), []
+                    self.reply("250 OK")
+                elif verb == "RCPT":
+                    recipients.append(command.split(":", 1)[1].strip(" <>"))
+                    self.reply("250 OK")
+                elif verb == "DATA":
+                    self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    lines = []
+                    while True:
+                        data_line = self.rfile.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    parsed = message_from_bytes(b"".join(lines))
+                    with lock:
+                        messages.append({
+                            "from": sender,
+                            "to": recipients,
+                            "subject": parsed["Subject"],
+                            "body": parsed.get_payload(decode=True).decode("utf-8", "replace"),
+                        })
+                    self.reply("250 OK: queued")
+                elif verb in ("RSET", "NOOP"):
+                    self.reply("250 OK")
+                elif verb == "QUIT":
+                    self.reply("221 Bye")
+                    return
+                else:
+                    self.reply("502 Command not implemented")
+
+    return SmtpStubHandler
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(host="127.0.0.1", twilio_port=8766, smtp_port=1025, latency=0.0, fail_rate=0.0):
+    """
+    Start both stubs in background threads. Returns (twilio_server, smtp_server);
+    each has a `.messages` list and is stopped with .shutdown().
+    """
+    twilio = ThreadingHTTPServer((host, twilio_port), None)
+    twilio.messages = []
+    twilio.RequestHandlerClass = make_twilio_handler(twilio.messages, latency, fail_rate)
+    smtp = _ThreadingTCPServer((host, smtp_port), None)
+    smtp.messages = []
+    smtp.RequestHandlerClass = make_smtp_handler(smtp.messages)
+    for server in (twilio, smtp):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return twilio, smtp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Twilio and SMTP stubs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--twilio-port", type=int, default=8766)
+    parser.add_argument("--smtp-port", type=int, default=1025)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the Twilio stub waits before answering")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of Twilio requests answered with 503")
+    args = parser.parse_args()
+
+    twilio, smtp = serve(args.host, args.twilio_port, args.smtp_port, args.latency, args.fail_rate)
+    print(f"Twilio stub listening on http://{args.host}:{args.twilio_port}")
+    print(f"SMTP stub listening on {args.host}:{args.smtp_port}")
+    seen = (0, 0)
+    try:
+        while True:
+            time.sleep(1)
+            for sms in twilio.messages[seen[0]:]:
+                print(f"SMS to {sms['to']}: {sms['body']!r}")
+            for email in smtp.messages[seen[1]:]:
+                print(f"Email to {', '.join(email['to'])}: {email['subject']}")
+            seen = (len(twilio.messages), len(smtp.messages))
+    except KeyboardInterrupt:
+        pass
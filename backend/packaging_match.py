@@ -0,0 +1,458 @@
+# backend/packaging_match.py
+
+# =============================================================================
+# P A C K A G I N G   M A T C H E R   (perceptual hashes)
+# =============================================================================
+# Compares the photo attached to a counterfeit report with reference photos of
+# genuine packaging, per product.
+#
+#   - Every image is reduced to two 64-bit perceptual hashes:
+#       pHash  low-frequency 8x8 DCT block of a 32x32 greyscale copy, thresholded
+#              at its median; robust to rescaling, compression and lighting.
+#       dHash  sign of horizontal gradients on a 9x8 copy; cheap tie-breaker.
+#     Similar images have hashes a few bits apart (Hamming distance).
+#   - Reference hashes live in `packaging_references`. Each worker keeps them in
+#     BK-trees (one per product and one over all products), reloaded when a
+#     trigger bumps `packaging_reference_state.generation`. A lookup visits a
+#     handful of nodes instead of every reference.
+#   - Decoding and hashing a photo is the only expensive step. It runs in the
+#     shared process pool (backend/worker_pool.py) right after the report is
+#     submitted, so the result is usually stored in reports.image_analysis_result before a regulator opens
+#     the report. POST /api/analyze-image/<id> returns the stored result. If the
+#     references changed since then, it re-matches the stored hashes in
+#     microseconds. A report that still has to be hashed gets 202: the request
+#     never waits for the pool, and the result is pushed to the regulators'
+#     room as a `report_analysis` Socket.IO event when it is stored.
+#
+# Reference photos are added from the command line:
+#
+#   python -m backend.packaging_match add "Amoxicillin 500mg" front.jpg back.jpg
+#   python -m backend.packaging_match import refs/       # refs/<product>/<photo>
+#   python -m backend.packaging_match list
+#   python -m backend.packaging_match analyze <report_id>
+# =============================================================================
+
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+
+from PIL import Image, ImageOps
+
+from backend import image_store, worker_pool
+from backend.config import get_config
+from backend.report_counters import ADMIN_ROOM
+
+cfg = get_config()
+
+HASH_BITS = 64
+# Returned by analyze_report while the photo is being hashed in the pool.
+PENDING = object()
+PUSH_POLL_INTERVAL = 0.2  # seconds between checks of a queued hash
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+
+
+def init_packaging_references(conn):
+    """Create the reference table and its generation trigger (called from init_db)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS packaging_references (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product TEXT NOT NULL,
+            label TEXT NOT NULL,
+            phash TEXT NOT NULL,
+            dhash TEXT NOT NULL,
+            source TEXT,
+            created_at TIMESTAMP DEFAULT (datetime('now'))
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS packaging_reference_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO packaging_reference_state (id, generation) VALUES (1, 0)")
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS packaging_references_{event.lower()}
+            AFTER {event} ON packaging_references
+            BEGIN
+                UPDATE packaging_reference_state SET generation = generation + 1 WHERE id = 1;
+            END
+        """)
+
+
+def product_key(name):
+    """Normalise a product name so "Amoxicillin  500MG" and "amoxicillin 500mg" match."""
+    return " ".join((name or "").lower().split())
+
+
+# --- Hashing (runs in the pool) ---------------------------------------------------
+
+# DCT-II basis for the 8 lowest frequencies of a 32-sample signal.
+_DCT = [[math.cos((2 * x + 1) * u * math.pi / 64) for x in range(32)] for u in range(8)]
+
+
+def _bits_to_hex(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | bit
+    return f"{value:016x}"
+
+
+def phash(img):
+    pixels = list(img.convert("L").resize((32, 32), Image.LANCZOS).getdata())
+    rows = [pixels[y * 32:(y + 1) * 32] for y in range(32)]
+    # Separable 2-D DCT, keeping only the top-left 8x8 block.
+    partial = [[sum(b * p for b, p in zip(basis, row)) for basis in _DCT] for row in rows]
+    block = [sum(_DCT[v][y] * partial[y][u] for y in range(32)) for v in range(8) for u in range(8)]
+    median = sorted(block)[32]
+    return _bits_to_hex(1 if c > median else 0 for c in block)
+
+
+def dhash(img):
+    pixels = list(img.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    return _bits_to_hex(
+        1 if pixels[y * 9 + x + 1] > pixels[y * 9 + x] else 0 for y in range(8) for x in range(8)
+    )
+
+
+def hash_file(path):
+    """Return (phash, dhash) hex strings for an image file."""
+    with Image.open(path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            # Transparent areas become white, as packaging shots on a web page would.
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img.convert("RGBA"), mask=img.convert("RGBA").split()[-1])
+            img = background
+        return phash(img), dhash(img)
+
+
+def distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+# --- BK-tree ------------------------------------------------------------------------
+
+class BKTree:
+    """Metric tree over hex hashes under Hamming distance."""
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+        self.size = 0
+
+    def add(self, key, item):
+        self.size += 1
+        if self.root is None:
+            self.root = [key, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = distance(key, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [key, [item], {}]
+                return
+            node = child
+
+    def search(self, key, radius):
+        """Return [(distance, item)] for every entry within `radius` bits, nearest first."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = distance(key, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+# --- Reference index (per worker) ------------------------------------------------
+
+class ReferenceIndex:
+    """BK-trees over packaging_references, reloaded when the table changes."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._generation = None
+        self._all = BKTree()
+        self._by_product = {}
+
+    def _refresh(self, conn):
+        generation = conn.execute(
+            "SELECT generation FROM packaging_reference_state WHERE id = 1"
+        ).fetchone()[0]
+        if generation == self._generation:
+            return generation
+        with self._lock:
+            if generation != self._generation:
+                all_refs, by_product = BKTree(), {}
+                for ref_id, product, label, p, d in conn.execute(
+                    "SELECT id, product, label, phash, dhash FROM packaging_references"
+                ):
+                    ref = {"id": ref_id, "product": product, "label": label, "dhash": d}
+                    all_refs.add(p, ref)
+                    by_product.setdefault(product, BKTree()).add(p, ref)
+                self._all, self._by_product, self._generation = all_refs, by_product, generation
+        return generation
+
+    def match(self, conn, hashes, product=None):
+        """Judge a (phash, dhash) pair against the references. Returns the result dict."""
+        generation = self._refresh(conn)
+        p, d = hashes
+        key = product_key(product)
+        tree = self._by_product.get(key)
+        result = {
+            "phash": p,
+            "dhash": d,
+            "product": key or None,
+            "reference_generation": generation,
+            "analyzed_at": datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if tree is None:
+            # No reference photos for this product: say which product it looks like, if any.
+            nearest = self._best(self._all, p, d, cfg.PACKAGING_MATCH_DISTANCE)
+            result.update({
+                "verdict": "no_reference",
+                "label": "No genuine reference packaging on file for this product",
+                "confidence": 0.0,
+                "closest_product": nearest[1]["label"] if nearest else None,
+            })
+            return result
+
+        nearest = self._best(tree, p, d, HASH_BITS)
+        bits = nearest[0]
+        if bits <= cfg.PACKAGING_MATCH_DISTANCE:
+            result.update({
+                "verdict": "match",
+                "label": "Packaging matches genuine reference",
+                "confidence": round(1 - bits / HASH_BITS, 3),
+            })
+        else:
+            result.update({
+                "verdict": "mismatch",
+                "label": "Packaging differs from genuine reference - possible counterfeit",
+                "confidence": round(min(1.0, bits / (HASH_BITS / 2)), 3),
+            })
+        result.update({"distance": bits, "reference_id": nearest[1]["id"]})
+        return result
+
+    @staticmethod
+    def _best(tree, p, d, radius):
+        # pHash decides; among equally close references, the dHash breaks the tie.
+        candidates = tree.search(p, radius)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda pair: (pair[0], distance(d, pair[1]["dhash"])))
+
+
+reference_index = ReferenceIndex(cfg.DB_PATH)
+
+
+# --- Report images ------------------------------------------------------------------
+
+def report_image_paths(image_filename):
+    """Files that may hold a report's photo, in the order to try them."""
+    parsed = image_store.parse_key(image_filename)
+    if parsed:
+        # The store writes the stripped original before it removes the spooled
+        # upload, so one of the two exists whenever the spool is checked first.
+        return [image_store.spool_path(*parsed), image_store.variant_path(*parsed, "original")]
+    return [os.path.join(str(cfg.STATIC_DIR), "uploads", image_filename)]
+
+
+def hash_report_image(paths):
+    """Hash the first readable file in `paths`. Runs in a pool process."""
+    for path in paths:
+        try:
+            return hash_file(path)
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError("report image not found")
+
+
+def _store(conn, report_id, result):
+    conn.execute("UPDATE reports SET image_analysis_result = ? WHERE id = ?", (json.dumps(result), report_id))
+
+
+def analyze_report(conn, report_id, refresh=False):
+    """
+    Return the analysis for a report, re-matching stored hashes if needed.
+    Returns None when the report does not exist, PENDING when the photo has
+    been queued for hashing, and raises FileNotFoundError when it has no
+    readable image. The caller commits.
+    """
+    row = conn.execute(
+        "SELECT image_filename, drug_name, image_analysis_result FROM reports WHERE id = ?", (report_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    image_filename, drug_name, stored = row[0], row[1], row[2]
+    if not image_filename:
+        raise FileNotFoundError("report has no image")
+
+    previous = json.loads(stored) if stored else None
+    if previous and not refresh:
+        generation = conn.execute("SELECT generation FROM packaging_reference_state WHERE id = 1").fetchone()[0]
+        if previous.get("reference_generation") == generation:
+            return previous
+
+    if previous and not refresh and previous.get("phash"):
+        result = reference_index.match(conn, (previous["phash"], previous["dhash"]), drug_name)
+        _store(conn, report_id, result)
+        return result
+
+    if not any(os.path.exists(path) for path in report_image_paths(image_filename)):
+        raise FileNotFoundError("report image not found")
+    if not submit_report(report_id, image_filename, drug_name):
+        raise RuntimeError("the worker pool is shutting down")
+    return PENDING
+
+
+# --- Background analysis ------------------------------------------------------------
+
+_socketio = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def attach(socketio):
+    """Push finished analyses to the regulators' room through this server."""
+    global _socketio
+    _socketio = socketio
+
+
+def _store_analysis(report_id, drug_name, future):
+    """Match and store the hashes from `future`. Returns the result, or None on failure."""
+    try:
+        hashes = future.result()
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"ERROR: Packaging analysis of report {report_id} failed - {e}")
+        return None
+    conn = sqlite3.connect(str(cfg.DB_PATH), timeout=30)
+    try:
+        result = reference_index.match(conn, hashes, drug_name)
+        _store(conn, report_id, result)
+        conn.commit()
+        return result
+    except sqlite3.Error as e:
+        print(f"ERROR: Storing packaging analysis of report {report_id} failed - {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _finish(report_id, drug_name, future):
+    # Runs on the pool's result thread, so it only does the BK-tree lookup and one UPDATE.
+    try:
+        return _store_analysis(report_id, drug_name, future)
+    finally:
+        with _pending_lock:
+            _pending.discard(report_id)
+
+
+def _finish_and_push(report_id, drug_name, future):
+    # A Socket.IO background task: it sleeps cooperatively instead of blocking on the future.
+    while not future.done():
+        _socketio.sleep(PUSH_POLL_INTERVAL)
+    result = _finish(report_id, drug_name, future)
+    payload = {"report_id": report_id, "result": result}
+    if result is None:
+        payload["error"] = "Image analysis failed."
+    _socketio.emit("report_analysis", payload, to=ADMIN_ROOM, namespace="/")
+
+
+def submit_report(report_id, image_filename, drug_name=None):
+    """
+    Hash a report's photo in the pool; the analysis is stored, and pushed to
+    regulators when a Socket.IO server is attached, once it is ready.
+    Returns False if the pool could not take it.
+    """
+    with _pending_lock:
+        if report_id in _pending:
+            return True
+        _pending.add(report_id)
+    try:
+        future = worker_pool.submit(hash_report_image, report_image_paths(image_filename))
+    except RuntimeError as e:
+        # Pool is shutting down; POST /api/analyze-image/<id> will queue it again.
+        with _pending_lock:
+            _pending.discard(report_id)
+        print(f"WARNING: Could not queue packaging analysis of report {report_id} - {e}")
+        return False
+    if _socketio is not None:
+        _socketio.start_background_task(_finish_and_push, report_id, drug_name, future)
+    else:
+        future.add_done_callback(lambda done: _finish(report_id, drug_name, done))
+    return True
+
+
+# --- References -------------------------------------------------------------------
+
+def add_reference(conn, product, path, label=None):
+    """Hash a genuine packaging photo and add it to the reference set."""
+    p, d = hash_file(path)
+    conn.execute(
+        "INSERT INTO packaging_references (product, label, phash, dhash, source) VALUES (?, ?, ?, ?, ?)",
+        (product_key(product), label or product, p, d, os.path.basename(path)),
+    )
+    return p, d
+
+
+if __name__ == "__main__":
+    from backend.database import init_db
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    init_db()
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "add" and len(sys.argv) > 3:
+        for path in sys.argv[3:]:
+            add_reference(conn, sys.argv[2], path)
+        conn.commit()
+        print(f"✅ {len(sys.argv) - 3} reference photos added for {sys.argv[2]}.")
+    elif command == "import" and len(sys.argv) > 2:
+        count = 0
+        for product in sorted(os.listdir(sys.argv[2])):
+            folder = os.path.join(sys.argv[2], product)
+            if not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    add_reference(conn, product, os.path.join(folder, name))
+                    count += 1
+        conn.commit()
+        print(f"✅ {count} reference photos imported.")
+    elif command == "list":
+        for product, label, count in conn.execute(
+            "SELECT product, MIN(label), COUNT(*) FROM packaging_references GROUP BY product ORDER BY product"
+        ):
+            print(f"{label}: {count} reference photos")
+    elif command == "analyze" and len(sys.argv) > 2:
+        # Hashes inline: nothing else is waiting on this process.
+        report_id = int(sys.argv[2])
+        row = conn.execute("SELECT image_filename, drug_name FROM reports WHERE id = ?", (report_id,)).fetchone()
+        if row is None or not row[0]:
+            print(f"❌ Report {report_id} does not exist or has no image.")
+            sys.exit(1)
+        result = reference_index.match(conn, hash_report_image(report_image_paths(row[0])), row[1])
+        _store(conn, report_id, result)
+        conn.commit()
+        print(json.dumps(result, indent=2))
+    else:
+        print("Usage: python -m backend.packaging_match [add <product> <image>... | import <dir> | list | analyze <report_id>]")
+        sys.exit(2)
+    conn.close()
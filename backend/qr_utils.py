@@ -1,19 +1,91 @@
+# backend/qr_utils.py
+
+# =============================================================================
+# S I G N E D   Q R   P A Y L O A D S
+# =============================================================================
+# Printed MedGuard codes carry `<batch_number>.<key id><tag>`, e.g.
+# `AMX-2024-001.AK3F7Q2MZXB6RTY4D` where `A` is the key id and the rest is the
+# first QR_TAG_LENGTH base32 characters of HMAC-SHA256(key, key id + batch).
+#
+#   - The payload stays in the QR "alphanumeric" character set for upper-case
+#     batch numbers, so the code fits a smaller QR version than the old
+#     `batch|sha256-hex` format (64 hex chars) and scans faster.
+#   - Verification needs no database access: a tampered or forged code is
+#     rejected before the drugs lookup and before a scan-log row is written.
+#   - Key rotation: QR_SIGNING_KEYS lists `id:secret` pairs. The first key
+#     signs new labels; every listed key is accepted, so labels printed with a
+#     retired key keep verifying until it is removed from the list.
+#
+# Plain batch numbers (older labels, manual entry) are not signed and go
+# through the normal lookup.
+# =============================================================================
+
+import base64
+import hashlib
+import hmac
 import io
+import re
 import qrcode
-import hashlib
 from backend.config import get_config
 
 cfg = get_config()
 
+SEPARATOR = "."
+BASE32_CHARS = "A-Z2-7"
+
+
+def _load_keys(spec, fallback_secret):
+    keys = {}
+    for item in (spec or "").split(","):
+        kid, _, secret = item.strip().partition(":")
+        if kid and secret:
+            kid = kid.upper()
+            if len(kid) != 1 or not re.fullmatch(f"[{BASE32_CHARS}]", kid):
+                raise ValueError(f"QR key id {kid!r} must be a single base32 character (A-Z, 2-7)")
+            keys[kid] = secret.encode()
+    if not keys:
+        keys["A"] = fallback_secret.encode()
+    return keys
+
+
+SIGNING_KEYS = _load_keys(cfg.QR_SIGNING_KEYS, cfg.QR_SIGNING_SECRET)
+ACTIVE_KEY_ID = next(iter(SIGNING_KEYS))
+TAG_LENGTH = cfg.QR_TAG_LENGTH
+SIGNED_PAYLOAD = re.compile(
+    rf"^(?P<batch>.+)\{SEPARATOR}(?P<kid>[{BASE32_CHARS}])(?P<tag>[{BASE32_CHARS}]{{{TAG_LENGTH}}})$"
+)
+
+
+def _tag(key: bytes, kid: str, batch_number: str) -> str:
+    digest = hmac.new(key, (kid + batch_number).encode(), hashlib.sha256).digest()
+    return base64.b32encode(digest).decode()[:TAG_LENGTH]
+
 
 def sign_batch(batch_number: str) -> str:
-    return hashlib.sha256((batch_number + cfg.QR_SIGNING_SECRET).encode()).hexdigest()
+    """The compact signed payload to print in a batch's QR code."""
+    kid = ACTIVE_KEY_ID
+    return f"{batch_number}{SEPARATOR}{kid}{_tag(SIGNING_KEYS[kid], kid, batch_number)}"
+
+
+def parse_scanned_data(data: str):
+    """
+    Split scanned data into (batch_number, signature) without touching the database.
+    `signature` is None for unsigned data, True for a valid signed payload and
+    False for a signed payload that is forged, tampered or signed with an unknown key.
+    """
+    match = SIGNED_PAYLOAD.match(data)
+    if not match:
+        return data, None
+    batch_number, kid, tag = match.group("batch", "kid", "tag")
+    key = SIGNING_KEYS.get(kid)
+    if key is None:
+        return batch_number, False
+    return batch_number, hmac.compare_digest(tag, _tag(key, kid, batch_number))
 
 
-def generate_qr_png(batch_number: str) -> io.BytesIO:
-    signed_data = f"{batch_number}|{sign_batch(batch_number)}"
-    qr = qrcode.QRCode(version=1, box_size=10, border=2)
-    qr.add_data(signed_data)
+def generate_qr_png(batch_number: str, box_size: int = 10, border: int = 2) -> io.BytesIO:
+    qr = qrcode.QRCode(box_size=box_size, border=border)
+    qr.add_data(sign_batch(batch_number))
     qr.make(fit=True)
     img = qr.make_image(fill_color="black", back_color="white")
     buf = io.BytesIO()
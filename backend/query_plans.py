@@ -0,0 +1,470 @@
+"""
+Query-plan regression check for MedGuard's hot SQL.
+
+Builds a throwaway database with the real schema and index set (init_db),
+seeds it with enough rows for the planner to care, runs EXPLAIN QUERY PLAN on
+the queries issued by backend/routes (admin, report, verify, auth, adr) and
+fails if any of them does a full table scan of a large table, or sorts or
+groups through a temporary B-tree that is not listed in ALLOW_TEMP_BTREE.
+
+tests/test_query_plans.py runs the same check under pytest. By hand:
+    python -m backend.query_plans
+"""
+
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+from backend.database import init_db
+from backend.ledger import backfill
+from backend.report_search import RANK_EXPRESSION, SNIPPET_EXPRESSION
+from backend.scan_rollups import rollup
+
+# Tables that grow with usage. A plain `SCAN <table>` on one of these is a regression.
+LARGE_TABLES = {"drugs", "reports", "adr_reports", "scan_logs", "users", "ledger_events",
+                "scan_rollups_hourly", "scan_rollups_daily", "scan_rollup_ips",
+                "analytics_facts", "analytics_cube"}
+
+SEED_ROWS = 5000
+
+# (name, sql, params, allow_scan)
+# `allow_scan` names the tables a query is expected to read in full, with the reason.
+HOT_QUERIES = [
+    # --- routes/admin.py ---
+    # --- backend/dashboard_queries.py (admin dashboard and /admin/api/...) ---
+    ("dashboard.reports_first_page", """
+        SELECT r.id AS id, r.drug_name AS drug_name, r.batch_number AS batch_number, r.location AS location,
+               r.note AS note, r.image_filename AS image_filename,
+               strftime('%Y-%m-%d %H:%M:%S', r.reported_on) AS reported_on, r.status AS status,
+               r.duplicate_count AS duplicate_count, u.email AS submitted_by, r.reported_on_epoch AS _epoch
+        FROM reports r LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.cluster_id IS NULL
+        ORDER BY r.reported_on_epoch DESC, r.id DESC LIMIT ?
+    """, (51,), {}),
+    ("dashboard.reports_range_page", """
+        SELECT r.id AS id, r.drug_name AS drug_name, r.batch_number AS batch_number, r.location AS location,
+               r.note AS note, r.image_filename AS image_filename,
+               strftime('%Y-%m-%d %H:%M:%S', r.reported_on) AS reported_on, r.status AS status,
+               r.duplicate_count AS duplicate_count, u.email AS submitted_by, r.reported_on_epoch AS _epoch
+        FROM reports r LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.cluster_id IS NULL AND r.reported_on_epoch >= ? AND r.reported_on_epoch < ?
+        AND (r.reported_on_epoch, r.id) < (?, ?)
+        ORDER BY r.reported_on_epoch DESC, r.id DESC LIMIT ?
+    """, (1704067200, 1738368000, 1735689600, 2500, 51), {}),
+    ("dashboard.reports_search_oldest", """
+        SELECT r.id AS id, r.drug_name AS drug_name, r.batch_number AS batch_number, r.location AS location,
+               r.note AS note, r.image_filename AS image_filename,
+               strftime('%Y-%m-%d %H:%M:%S', r.reported_on) AS reported_on, r.status AS status,
+               r.duplicate_count AS duplicate_count, u.email AS submitted_by, r.reported_on_epoch AS _epoch
+        FROM reports r LEFT JOIN users u ON r.user_id = u.id
+        WHERE r.cluster_id IS NULL AND r.id IN (SELECT rowid FROM reports_fts WHERE reports_fts MATCH ?)
+        AND (r.reported_on_epoch, r.id) > (?, ?)
+        ORDER BY r.reported_on_epoch ASC, r.id ASC LIMIT ?
+    """, ('"drug"*', 1704067200, 10, 51), {}),
+    ("dashboard.adr_page", """
+        SELECT ar.id AS id, d.name AS drug_name, d.batch_number AS batch_number,
+               ar.patient_age_range AS patient_age_range, ar.patient_gender AS patient_gender,
+               ar.reaction_description AS reaction_description,
+               strftime('%Y-%m-%d %H:%M:%S', ar.report_date) AS report_date, ar.status AS status,
+               ar.report_date_epoch AS _epoch
+        FROM adr_reports ar JOIN drugs d ON ar.drug_id = d.id
+        WHERE (ar.report_date_epoch, ar.id) < (?, ?)
+        ORDER BY ar.report_date_epoch DESC, ar.id DESC LIMIT ?
+    """, (1735689600, 2500, 51), {}),
+    ("dashboard.adr_search", """
+        SELECT ar.id AS id, d.name AS drug_name, d.batch_number AS batch_number,
+               ar.patient_age_range AS patient_age_range, ar.patient_gender AS patient_gender,
+               ar.reaction_description AS reaction_description,
+               strftime('%Y-%m-%d %H:%M:%S', ar.report_date) AS report_date, ar.status AS status,
+               ar.report_date_epoch AS _epoch
+        FROM adr_reports ar JOIN drugs d ON ar.drug_id = d.id
+        WHERE (d.name LIKE ? OR d.batch_number LIKE ? OR ar.reaction_description LIKE ?)
+        ORDER BY ar.report_date_epoch DESC, ar.id DESC LIMIT ?
+    """, ("%x%", "%x%", "%x%", 51), {"adr_reports": "leading-wildcard LIKE search"}),
+    ("admin_register.recent_reports", """
+        SELECT id, drug_name, batch_number, location, note, image_filename,
+               strftime('%Y-%m-%d %H:%M:%S', reported_on) AS reported_on, status, duplicate_count
+        FROM reports WHERE cluster_id IS NULL ORDER BY reported_on_epoch DESC LIMIT 20
+    """, (), {}),
+    ("admin_drugs.page", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE 1=1
+        ORDER BY created_at_epoch DESC, id DESC LIMIT ?
+    """, (21,), {}),
+    ("admin_drugs.page_after", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE (created_at_epoch, id) < (?, ?)
+        ORDER BY created_at_epoch DESC, id DESC LIMIT ?
+    """, (1735689600, 100, 21), {}),
+    ("admin_drugs.page_before", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE (created_at_epoch, id) > (?, ?)
+        ORDER BY created_at_epoch ASC, id ASC LIMIT ?
+    """, (1735689600, 100, 21), {}),
+    ("admin_drugs.capped_count", """
+        SELECT COUNT(*) FROM (SELECT 1 FROM drugs WHERE expiry_date_epoch < ? LIMIT ?)
+    """, (1767225600, 10001), {}),
+    ("admin_drugs.registered_between", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE created_at_epoch >= ? AND created_at_epoch < ?
+        ORDER BY created_at_epoch DESC, id DESC LIMIT ?
+    """, (1735689600, 1738368000, 21), {}),
+    # --- backend/drug_filters.py (admin_drugs and the drug exports) ---
+    ("admin_drugs.expired", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE expiry_date_epoch < ?
+        ORDER BY created_at_epoch DESC, id DESC LIMIT ?
+    """, (1767225600, 21), {}),
+    ("admin_drugs.soon", """
+        SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
+        FROM drugs WHERE expiry_date_epoch >= ? AND expiry_date_epoch < ?
+        ORDER BY created_at_epoch DESC, id DESC LIMIT ?
+    """, (1751241600, 1753920000, 21), {}),
+    ("admin_drugs.count_valid", "SELECT COUNT(*) FROM drugs WHERE expiry_date_epoch >= ?", (1767225600,), {}),
+    ("admin_drugs.search", """
+        SELECT COUNT(*) FROM drugs WHERE 1=1 AND (name LIKE ? OR batch_number LIKE ?)
+    """, ("%x%", "%x%"), {"drugs": "leading-wildcard LIKE search"}),
+    ("delete_drug.adr", "DELETE FROM adr_reports WHERE drug_id = ?", (1,), {}),
+    ("delete_drug.drug", "DELETE FROM drugs WHERE id = ?", (1,), {}),
+    ("report_locations", """
+        SELECT latitude, longitude, drug_name, batch_number, reported_on, duplicate_count
+        FROM reports WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND cluster_id IS NULL
+    """, (), {"reports": "hotspot map plots every located report"}),
+    # --- routes/report.py ---
+    ("get_reports.search", f"""
+        SELECT r.id, r.drug_name, r.batch_number, r.reported_on_epoch,
+               {RANK_EXPRESSION} AS score, {SNIPPET_EXPRESSION} AS snippet
+        FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid
+        WHERE reports_fts MATCH ?
+        ORDER BY score, r.id LIMIT ?
+    """, ('"amox"*', 51), {}),
+    ("get_reports.search_keyset_page", f"""
+        SELECT r.id, r.drug_name, r.batch_number, r.reported_on_epoch,
+               {RANK_EXPRESSION} AS score, {SNIPPET_EXPRESSION} AS snippet
+        FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid
+        WHERE reports_fts MATCH ? AND ({RANK_EXPRESSION}, r.id) > (?, ?)
+        ORDER BY score, r.id LIMIT ?
+    """, ('"amox"*', -1.5, 100, 51), {}),
+    ("get_reports.search_recent", f"""
+        SELECT r.id, r.drug_name, r.batch_number, r.reported_on_epoch, {SNIPPET_EXPRESSION} AS snippet
+        FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid
+        WHERE reports_fts MATCH ?
+        ORDER BY r.reported_on_epoch DESC, r.id DESC LIMIT ?
+    """, ('"amox"*', 51), {}),
+    ("get_reports.search_like", """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, reported_on_epoch
+        FROM reports WHERE 1=1
+        AND (drug_name LIKE ? OR batch_number LIKE ? OR location LIKE ? OR note LIKE ?)
+        ORDER BY reported_on_epoch DESC, id DESC LIMIT ?
+    """, ("%x%",) * 4 + (51,), {"reports": "LIKE fallback for SQLite builds without FTS5"}),
+    ("get_reports.first_page", """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, reported_on_epoch
+        FROM reports WHERE 1=1
+        ORDER BY reported_on_epoch DESC, id DESC LIMIT ?
+    """, (51,), {}),
+    ("get_reports.keyset_page", """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, reported_on_epoch
+        FROM reports WHERE 1=1 AND (reported_on_epoch, id) < (?, ?)
+        ORDER BY reported_on_epoch DESC, id DESC LIMIT ?
+    """, (1735689600, 2500, 51), {}),
+    ("get_reports.date_range", """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, reported_on_epoch
+        FROM reports WHERE 1=1 AND reported_on_epoch >= ? AND reported_on_epoch < ?
+        AND (reported_on_epoch, id) < (?, ?)
+        ORDER BY reported_on_epoch DESC, id DESC LIMIT ?
+    """, (1704067200, 1738368000, 1735689600, 2500, 51), {}),
+    ("update_report_status", "UPDATE reports SET status = ? WHERE id = ?", ("Resolved", 1), {}),
+    ("count_new_reports", "SELECT count FROM report_counters WHERE table_name = ? AND status = 'New'", ("reports",), {}),
+    ("report_counters.all", "SELECT table_name, status, count FROM report_counters", (),
+     {"report_counters": "one row per (table, status)"}),
+    ("report_counters.generation", "SELECT generation FROM report_counter_state WHERE id = 1", (), {}),
+    ("drug_cache.generation",
+     "SELECT generation, rebuild_generation FROM drug_cache_state WHERE id = 1", (), {}),
+    ("drug_cache.new_rows", "SELECT id, batch_number FROM drugs WHERE id > ? ORDER BY id", (100,), {}),
+    ("delete_report", "DELETE FROM reports WHERE id = ?", (1,), {}),
+    # --- backend/report_clusters.py ---
+    ("report_clusters.same_image", """
+        SELECT id, cluster_id FROM reports
+        WHERE image_filename = ? AND reported_on_epoch >= ?
+        ORDER BY reported_on_epoch, id LIMIT 1
+    """, ("ab.jpg", 1735689600), {}),
+    ("report_clusters.same_key", """
+        SELECT id, cluster_id, note_minhash FROM reports WHERE dedup_key = ? ORDER BY id LIMIT 50
+    """, ("B-1|600:300|2025-01-01",), {}),
+    ("report_clusters.members", """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, cluster_id
+        FROM reports WHERE id = ?
+        UNION ALL
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, cluster_id
+        FROM reports WHERE cluster_id = ?
+        ORDER BY id
+    """, (1, 1), {}),
+    ("report_clusters.promote", """
+        UPDATE reports SET cluster_id = (SELECT MIN(id) FROM reports WHERE cluster_id = ?)
+        WHERE cluster_id = ? AND id != (SELECT MIN(id) FROM reports WHERE cluster_id = ?)
+    """, (1, 1, 1), {}),
+    # --- routes/analysis.py (backend/packaging_match.py) ---
+    ("packaging_match.report", """
+        SELECT image_filename, drug_name, image_analysis_result FROM reports WHERE id = ?
+    """, (1,), {}),
+    ("packaging_match.store", "UPDATE reports SET image_analysis_result = ? WHERE id = ?", ("{}", 1), {}),
+    ("packaging_match.references", "SELECT id, product, label, phash, dhash FROM packaging_references", (),
+     {"packaging_references": "each worker loads the reference set into its BK-trees"}),
+    # --- routes/verify.py and the modules it calls ---
+    ("verify.drug_lookup", """
+        SELECT id, name, batch_number, mfg_date, expiry_date, manufacturer FROM drugs WHERE batch_number = ?
+    """, ("B-1",), {}),
+    ("verify.anomaly_state", """
+        SELECT total_scans, head_minute, buckets, last_scanned_at, last_latitude, last_longitude
+        FROM scan_anomaly_state WHERE batch_number = ?
+    """, ("B-1",), {}),
+    ("verify.anomaly_bootstrap_rolled_up", """
+        SELECT COALESCE(SUM(scans), 0) FROM scan_rollups_daily WHERE batch_number = ?
+    """, ("B-1",), {}),
+    ("verify.anomaly_bootstrap_pending", """
+        SELECT COUNT(*) FROM scan_logs WHERE batch_number = ? AND id > ?
+    """, ("B-1", 100), {}),
+    ("verify.anomaly_bootstrap_window", """
+        SELECT scanned_at_epoch / 60 AS minute, COUNT(*)
+        FROM scan_logs
+        WHERE batch_number = ? AND scanned_at_epoch >= CAST(strftime('%s', 'now') AS INTEGER) - 3600
+        GROUP BY minute
+    """, ("B-1",), {}),
+    ("verify.anomaly_bootstrap_last", """
+        SELECT scanned_at_epoch, latitude, longitude
+        FROM scan_logs WHERE batch_number = ? ORDER BY scanned_at_epoch DESC, id DESC LIMIT 1
+    """, ("B-1",), {}),
+    ("verify.ledger_history", """
+        SELECT seq, event_type, payload, created_at, event_hash, block_height
+        FROM ledger_events WHERE batch_number = ? ORDER BY seq
+    """, ("B-1",), {}),
+    # --- ledger.py (writes and proofs) ---
+    ("ledger.head", "SELECT seq, event_hash FROM ledger_events ORDER BY seq DESC LIMIT 1", (),
+     {"ledger_events": "reverse rowid walk that stops after one row"}),
+    ("ledger.pending", """
+        SELECT seq, event_hash, created_at FROM ledger_events
+        WHERE block_height IS NULL ORDER BY seq LIMIT ?
+    """, (500,), {}),
+    ("ledger.oldest_pending", """
+        SELECT created_at FROM ledger_events WHERE block_height IS NULL ORDER BY seq LIMIT 1
+    """, (), {}),
+    ("ledger.block_leaves", "SELECT event_hash FROM ledger_events WHERE seq BETWEEN ? AND ? ORDER BY seq", (1, 500), {}),
+    # --- scan_rollups.py ---
+    ("rollup.next_chunk", """
+        SELECT COUNT(*), MAX(id) FROM (SELECT id FROM scan_logs WHERE id > ? ORDER BY id LIMIT ?)
+    """, (100, 5000), {}),
+    ("rollup.aggregate", """
+        SELECT batch_number, scanned_at_epoch - scanned_at_epoch % 3600 AS period, COUNT(*), 0,
+               MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude)
+        FROM scan_logs
+        WHERE id > ? AND id <= ? AND scanned_at_epoch IS NOT NULL
+        GROUP BY batch_number, period
+    """, (100, 5100), {}),
+    ("rollup.distinct_ips", """
+        UPDATE scan_rollups_hourly SET distinct_ips = (
+            SELECT COUNT(*) FROM scan_rollup_ips i
+            WHERE i.granularity = ? AND i.period_start = scan_rollups_hourly.period_start
+              AND i.batch_number = scan_rollups_hourly.batch_number
+        )
+        WHERE (batch_number, period_start) IN (
+            SELECT DISTINCT batch_number, scanned_at_epoch - scanned_at_epoch % 3600
+            FROM scan_logs WHERE id > ? AND id <= ? AND scanned_at_epoch IS NOT NULL
+        )
+    """, ("hourly", 100, 5100), {}),
+    ("purge.walk", """
+        SELECT id, scanned_at_epoch FROM scan_logs WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+    """, (0, 5000, 1000), {}),
+    ("purge.scan_logs", """
+        DELETE FROM scan_logs WHERE id >= ? AND id <= ? AND scanned_at_epoch < ?
+    """, (1, 5000, 1735689600), {}),
+    ("purge.oldest_hour", """
+        SELECT MIN(period_start) FROM scan_rollups_hourly WHERE period_start < ?
+    """, (1735689600,), {}),
+    ("purge.oldest_ip_period", """
+        SELECT MIN(period_start) FROM scan_rollup_ips WHERE period_start < ? AND granularity = 'hourly'
+    """, (1735689600,), {}),
+    ("batch_activity", """
+        SELECT period_start, scans, distinct_ips, min_latitude, max_latitude, min_longitude, max_longitude
+        FROM scan_rollups_daily
+        WHERE batch_number = ? AND period_start >= ? AND period_start < ?
+        ORDER BY period_start
+    """, ("B-1", 0, 2 ** 62), {}),
+    # --- routes/verify_api.py ---
+    ("bulk_verify.drugs", """
+        SELECT id, name, batch_number, mfg_date, expiry_date, manufacturer
+        FROM drugs WHERE batch_number IN (?, ?, ?)
+    """, ("B-1", "B-2", "B-3"), {}),
+    ("bulk_verify.report_counts", """
+        SELECT batch_number, COUNT(*) FROM reports
+        WHERE batch_number IN (?, ?, ?) AND cluster_id IS NULL GROUP BY batch_number
+    """, ("B-1", "B-2", "B-3"), {}),
+    # --- moderation.py (bulk moderation) ---
+    ("moderation.cluster_duplicates", """
+        SELECT id FROM reports WHERE cluster_id IN (?, ?, ?)
+    """, (1, 2, 3), {}),
+    ("moderation.rows", """
+        SELECT id, status, cluster_id IS NOT NULL FROM reports WHERE id IN (?, ?, ?)
+    """, (1, 2, 3), {}),
+    # --- routes/auth.py ---
+    ("login", "SELECT * FROM users WHERE email = ?", ("a@b.c",), {}),
+    ("my_reports", """
+        SELECT id, drug_name, batch_number, location, note, reported_on, status
+        FROM reports WHERE user_id = ? ORDER BY reported_on_epoch DESC
+    """, (1,), {}),
+    ("delete_my_report.check", "SELECT id FROM reports WHERE id = ? AND user_id = ?", (1, 1), {}),
+    ("delete_my_report", "DELETE FROM reports WHERE id = ? AND user_id = ?", (1, 1), {}),
+    # --- backend/analytics.py (/admin/api/analytics and the cube triggers) ---
+    ("analytics.trend_by_state", """
+        SELECT date(day, 'weekday 0', '-6 days') AS period, state, SUM(count) AS count
+        FROM analytics_cube
+        WHERE source = ? AND day >= ? AND day <= ? AND status != 'Duplicate'
+        GROUP BY period, state ORDER BY period, state
+    """, ("reports", "2024-01-01", "2024-03-31"), {}),
+    ("analytics.fact_cell", """
+        UPDATE analytics_cube SET count = count - 1
+        WHERE (source, day, state, drug, manufacturer, status) =
+              (SELECT source, day, state, drug, manufacturer, status FROM analytics_facts
+               WHERE source = 'reports' AND row_id = ?)
+    """, (1,), {}),
+    # --- routes/adr.py ---
+    ("delete_adr_report", "DELETE FROM adr_reports WHERE id = ?", (1,), {}),
+    ("update_adr_status", "UPDATE adr_reports SET status = ? WHERE id = ?", ("Resolved", 1), {}),
+    # --- backend/exports.py, backend/export_jobs.py ---
+    ("export.adr_reports", """
+        SELECT ar.id, ar.patient_age_range, ar.patient_gender, ar.reaction_description, ar.status,
+               strftime('%Y-%m-%d', ar.report_date) AS report_date,
+               d.name as drug_name, d.batch_number
+        FROM adr_reports ar
+        JOIN drugs d ON ar.drug_id = d.id
+        WHERE ar.report_date_epoch >= ? AND ar.report_date_epoch < ?
+        ORDER BY ar.report_date_epoch DESC, ar.id DESC
+    """, (1735689600, 1738368000), {}),
+]
+
+# Queries allowed to build a temporary B-tree, with the reason. Every other
+# ORDER BY / GROUP BY / DISTINCT must be answered in index order.
+ALLOW_TEMP_BTREE = {
+    "dashboard.reports_search_oldest": "FTS matches have no index order; only the matches are sorted",
+    "get_reports.search": "ranked FTS matches; only the matches are sorted",
+    "get_reports.search_keyset_page": "ranked FTS matches; only the matches are sorted",
+    "get_reports.search_recent": "FTS matches have no index order; only the matches are sorted",
+    "admin_drugs.soon": "range on expiry, ordered by creation; only drugs expiring soon are sorted",
+    "verify.anomaly_bootstrap_window": "groups one batch's last hour of scans by minute",
+    "rollup.aggregate": "groups one run's id range of new scan_logs rows",
+    "rollup.distinct_ips": "de-duplicates one run's id range of new scan_logs rows",
+    "analytics.trend_by_state": "groups a date range of the cube by a computed week",
+}
+
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$")
+# Newer SQLite names an aliased table by its alias (`SCAN r`), so aliases are
+# mapped back to their tables.
+TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", re.IGNORECASE)
+SQL_KEYWORDS = {"WHERE", "JOIN", "LEFT", "INNER", "ON", "ORDER", "GROUP", "LIMIT", "UNION", "USING", "SET"}
+
+
+def seed(conn, rows=SEED_ROWS):
+    """Fill the large tables with synthetic rows and refresh planner statistics."""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+
+    def stamp(i):
+        return (start + timedelta(minutes=i * 7)).strftime("%Y-%m-%d %H:%M:%S")
+
+    conn.executemany(
+        "INSERT INTO users (full_name, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+        [(f"User {i}", f"user{i}@example.com", "x", stamp(i)) for i in range(rows)]
+    )
+    conn.executemany(
+        """INSERT INTO drugs (name, batch_number, mfg_date, expiry_date, manufacturer, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        [(f"Drug {i % 300}", f"B-{i}", "2024-01-01", f"202{5 + i % 4}-06-30", f"Maker {i % 40}", stamp(i))
+         for i in range(rows)]
+    )
+    conn.executemany(
+        """INSERT INTO reports (user_id, drug_name, batch_number, location, note, latitude, longitude, reported_on, status)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        [(rng.randint(1, rows), f"Drug {i % 300}", f"B-{rng.randint(0, rows)}", "Lagos", "note",
+          6 + rng.random(), 3 + rng.random(), stamp(i), rng.choice(["New", "Under Review", "Resolved"]))
+         for i in range(rows)]
+    )
+    conn.executemany(
+        "INSERT INTO adr_reports (drug_id, reaction_description, report_date, status) VALUES (?, ?, ?, ?)",
+        [(rng.randint(1, rows), "rash", stamp(i), "New") for i in range(rows)]
+    )
+    conn.executemany(
+        "INSERT INTO scan_logs (batch_number, scanned_at, ip_address) VALUES (?, ?, ?)",
+        [(f"B-{rng.randint(0, rows)}", stamp(i), "127.0.0.1") for i in range(rows * 4)]
+    )
+    conn.commit()
+    backfill(conn)
+    rollup(conn)
+    conn.execute("ANALYZE")
+
+
+def full_scans(conn, sql, params):
+    """Return the large tables a query reads with a plain full table scan."""
+    aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql) if alias.upper() not in SQL_KEYWORDS}
+    tables = set()
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        match = FULL_SCAN.match(detail.strip())
+        table = match and aliases.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES:
+            tables.add(table)
+    return tables
+
+
+def temp_btrees(conn, sql, params):
+    """Return the `USE TEMP B-TREE FOR ...` steps of a query's plan."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            if row[3].startswith("USE TEMP B-TREE")]
+
+
+def check(conn, queries=HOT_QUERIES):
+    """
+    Return a list of (query name, problem) pairs: `SCAN <table>` for a full scan
+    of a large table, or the plan step of a temporary B-tree that is not allowed.
+    """
+    failures = []
+    for name, sql, params, allow_scan in queries:
+        for table in sorted(full_scans(conn, sql, params)):
+            if table not in allow_scan:
+                failures.append((name, f"SCAN {table}"))
+        if name not in ALLOW_TEMP_BTREE:
+            failures.extend((name, step) for step in temp_btrees(conn, sql, params))
+    return failures
+
+
+def build_database(db_path):
+    """Create and seed the throwaway database the check runs against."""
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    seed(conn)
+    return conn
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "query_plans.db")
+        conn = build_database(db_path)
+        failures = check(conn)
+        conn.close()
+
+    for name, sql, params, allow_scan in HOT_QUERIES:
+        status = "FAIL" if any(f[0] == name for f in failures) else "ok"
+        print(f"{status:4}  {name}")
+    if failures:
+        print("\n❌ Unexpected full table scans or temporary B-trees:")
+        for name, problem in failures:
+            print(f"  - {name}: {problem}")
+        return 1
+    print(f"\n✅ {len(HOT_QUERIES)} queries checked, no unexpected full table scans or temporary B-trees.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
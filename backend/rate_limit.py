@@ -0,0 +1,55 @@
+# backend/rate_limit.py
+
+# =============================================================================
+# P E R - C L I E N T   R A T E   L I M I T
+# =============================================================================
+# A token bucket per client key (user, API key or IP address). Each bucket holds
+# up to `capacity` tokens and refills at `capacity / window` tokens per second;
+# a request takes as many tokens as the work it asks for, so one request for
+# 5000 items costs as much as 5000 requests for one.
+#
+# Buckets live in each gunicorn worker, like the drug lookup cache, so the
+# effective limit is per worker. The map is bounded: the least recently used
+# clients are forgotten first, which at worst gives them a full bucket again.
+# =============================================================================
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Token buckets keyed by client, refilled continuously."""
+
+    def __init__(self, capacity: float, window: float, max_clients: int = 10000):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, cost: float = 1.0) -> float:
+        """
+        Take `cost` tokens from the client's bucket. Returns 0 when allowed, or the
+        number of seconds to wait before the same request would be allowed.
+        """
+        cost = min(cost, self.capacity)  # a request larger than the bucket waits for a full one
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if cost <= tokens:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+def retry_after(wait: float) -> str:
+    """Value for a Retry-After header."""
+    return str(max(1, math.ceil(wait)))
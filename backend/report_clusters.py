@@ -0,0 +1,222 @@
+# backend/report_clusters.py
+
+# =============================================================================
+# N E A R - D U P L I C A T E   R E P O R T   C L U S T E R S
+# =============================================================================
+# When a fake batch is in the news, many people report the same packs. A new
+# report joins the cluster of an earlier one when either:
+#
+#   - it carries the same photo (same image-store content hash) as a report
+#     from the last REPORT_DEDUP_WINDOW_DAYS days, or
+#   - it has the same normalized key, and its note is similar (MinHash
+#     Jaccard estimate >= REPORT_DEDUP_NOTE_SIMILARITY) or one of the notes is
+#     empty. The normalized key is:
+#         batch number | lat/lon cell of REPORT_DEDUP_CELL degrees | UTC day
+#     When a report has no coordinates, its normalized location text replaces
+#     the cell.
+#
+# The first report of a cluster is its primary: `cluster_id` is NULL and
+# `duplicate_count` says how many reports were linked to it. Duplicates have
+# `cluster_id` set to the primary's id. Triggers keep `duplicate_count`
+# correct. When a primary is deleted, its oldest duplicate becomes the new
+# primary.
+#
+# Duplicates do not page regulators. The dashboard, the map, the unread
+# counters and the per-batch report counts only use primaries.
+#
+# Reports saved before this module existed have no key. To cluster them:
+#
+#   python -m backend.report_clusters backfill
+# =============================================================================
+
+import hashlib
+import random
+import re
+import sqlite3
+import struct
+import sys
+from calendar import timegm
+from datetime import datetime, timezone
+
+from backend.config import get_config
+
+cfg = get_config()
+
+NUM_PERM = 32
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240917)  # Fixed seed: stored signatures must stay comparable.
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+SHINGLE_SIZE = 4
+
+CLUSTER_COLUMNS = [
+    ("dedup_key", "TEXT"),
+    ("note_minhash", "BLOB"),
+    ("cluster_id", "INTEGER"),
+    ("duplicate_count", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_cluster_insert AFTER INSERT ON reports
+    WHEN new.cluster_id IS NOT NULL BEGIN
+        UPDATE reports SET duplicate_count = duplicate_count + 1 WHERE id = new.cluster_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_cluster_delete_duplicate AFTER DELETE ON reports
+    WHEN old.cluster_id IS NOT NULL BEGIN
+        UPDATE reports SET duplicate_count = duplicate_count - 1 WHERE id = old.cluster_id;
+    END
+    """,
+    # The oldest duplicate of a deleted primary takes over: the others are
+    # pointed at it first, then it becomes a primary itself.
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_cluster_delete_primary AFTER DELETE ON reports
+    WHEN old.cluster_id IS NULL AND old.duplicate_count > 0 BEGIN
+        UPDATE reports SET cluster_id = (SELECT MIN(id) FROM reports WHERE cluster_id = old.id)
+        WHERE cluster_id = old.id AND id != (SELECT MIN(id) FROM reports WHERE cluster_id = old.id);
+        UPDATE reports SET cluster_id = NULL, duplicate_count = old.duplicate_count - 1
+        WHERE cluster_id = old.id;
+    END
+    """,
+]
+
+
+def init_report_clusters(conn):
+    """Add the cluster columns and triggers to `reports` (called from init_db)."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_xinfo(reports)")}
+    for column, definition in CLUSTER_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE reports ADD COLUMN {column} {definition}")
+    for statement in TRIGGERS:
+        conn.execute(statement)
+
+
+# --- Keys and signatures ------------------------------------------------------------
+
+def _clean(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def dedup_key(batch_number, latitude, longitude, location, reported_at):
+    """Normalized key: batch | location cell | UTC day."""
+    try:
+        cell_size = cfg.REPORT_DEDUP_CELL
+        place = f"{int(float(latitude) // cell_size)}:{int(float(longitude) // cell_size)}"
+    except (TypeError, ValueError):
+        place = _clean(location)
+    return f"{(batch_number or '').strip().upper()}|{place}|{reported_at:%Y-%m-%d}"
+
+
+def minhash(text):
+    """MinHash signature of a note's character shingles, packed as bytes. None for empty notes."""
+    cleaned = _clean(text)
+    if not cleaned:
+        return None
+    shingles = {cleaned[i:i + SHINGLE_SIZE] for i in range(max(len(cleaned) - SHINGLE_SIZE + 1, 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+              for s in shingles]
+    signature = [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+    return struct.pack(f"<{NUM_PERM}Q", *signature)
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures. Empty notes never contradict a match."""
+    if a is None or b is None:
+        return 1.0
+    left, right = struct.unpack(f"<{NUM_PERM}Q", a), struct.unpack(f"<{NUM_PERM}Q", b)
+    return sum(x == y for x, y in zip(left, right)) / NUM_PERM
+
+
+# --- Matching -----------------------------------------------------------------------
+
+def find_cluster(conn, batch_number, latitude, longitude, location, note, image_filename, reported_at=None):
+    """
+    Work out the clustering columns for a new report.
+    Returns (dedup_key, note_minhash, cluster_id); cluster_id is None for a new primary.
+    """
+    reported_at = reported_at or datetime.now(timezone.utc).replace(tzinfo=None)
+    key = dedup_key(batch_number, latitude, longitude, location, reported_at)
+    signature = minhash(note)
+
+    if image_filename:
+        since = timegm(reported_at.timetuple()) - cfg.REPORT_DEDUP_WINDOW_DAYS * 86400
+        row = conn.execute(
+            """
+            SELECT id, cluster_id FROM reports
+            WHERE image_filename = ? AND reported_on_epoch >= ?
+            ORDER BY reported_on_epoch, id LIMIT 1
+            """,
+            (image_filename, since),
+        ).fetchone()
+        if row:
+            return key, signature, row[1] or row[0]
+
+    for report_id, cluster_id, other in conn.execute(
+        "SELECT id, cluster_id, note_minhash FROM reports WHERE dedup_key = ? ORDER BY id LIMIT 50", (key,)
+    ):
+        if similarity(signature, other) >= cfg.REPORT_DEDUP_NOTE_SIMILARITY:
+            return key, signature, cluster_id or report_id
+    return key, signature, None
+
+
+def get_cluster(conn, report_id):
+    """The primary of a report's cluster followed by its duplicates, oldest first."""
+    row = conn.execute("SELECT id, cluster_id FROM reports WHERE id = ?", (report_id,)).fetchone()
+    if row is None:
+        return None
+    primary = row[1] or row[0]
+    return conn.execute(
+        """
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, cluster_id
+        FROM reports WHERE id = ?
+        UNION ALL
+        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status, cluster_id
+        FROM reports WHERE cluster_id = ?
+        ORDER BY id
+        """,
+        (primary, primary),
+    ).fetchall()
+
+
+def backfill(conn):
+    """Compute keys and clusters for reports that have no key yet, oldest first. Returns the count."""
+    rows = conn.execute(
+        """
+        SELECT id, batch_number, latitude, longitude, location, note, image_filename, reported_on
+        FROM reports WHERE dedup_key IS NULL ORDER BY id
+        """
+    ).fetchall()
+    for report_id, batch, lat, lon, location, note, image, reported_on in rows:
+        try:
+            reported_at = datetime.strptime(str(reported_on)[:19], "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            reported_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        key, signature, cluster_id = find_cluster(conn, batch, lat, lon, location, note, image, reported_at)
+        if cluster_id == report_id:
+            cluster_id = None
+        conn.execute("UPDATE reports SET dedup_key = ?, note_minhash = ? WHERE id = ?", (key, signature, report_id))
+        if cluster_id is not None:
+            # The insert trigger does not fire for an UPDATE, so count the duplicate here.
+            conn.execute("UPDATE reports SET cluster_id = ? WHERE id = ?", (cluster_id, report_id))
+            conn.execute("UPDATE reports SET duplicate_count = duplicate_count + 1 WHERE id = ?", (cluster_id,))
+    return len(rows)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "backfill":
+        init_report_clusters(conn)
+        count = backfill(conn)
+        conn.commit()
+        print(f"✅ {count} reports keyed and clustered.")
+    elif command == "status":
+        primaries, duplicates = conn.execute(
+            "SELECT SUM(cluster_id IS NULL), SUM(cluster_id IS NOT NULL) FROM reports"
+        ).fetchone()
+        print(f"{primaries or 0} independent reports, {duplicates or 0} linked duplicates")
+    else:
+        print("Usage: python -m backend.report_clusters [backfill|status]")
+        sys.exit(2)
+    conn.close()
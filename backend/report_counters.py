@@ -0,0 +1,281 @@
+# backend/report_counters.py
+
+# =============================================================================
+# R E P O R T   C O U N T E R S
+# =============================================================================
+# The admin badges show how many counterfeit and ADR reports are still unread.
+# Instead of a COUNT(*) per request, `report_counters` keeps one row per
+# (table, status). Triggers on `reports` and `adr_reports` update it in the same
+# transaction as the INSERT, DELETE or status UPDATE that changed the count.
+#
+#   - Status 0 (the old integer default), NULL and 'New' all count as "New".
+#     Every other status counts as "checked".
+#   - Reports linked into another report's cluster (backend/report_clusters.py)
+#     are counted under 'Duplicate', so they do not inflate the unread badge.
+#   - Registered drug batches are counted too, in one ('drugs', 'Registered')
+#     row, for the unfiltered total on the drugs page. That row changes no
+#     badge, so it does not bump the generation.
+#   - Every change also bumps `report_counter_state.generation`. Each worker runs
+#     one background task that reads that single row every
+#     REPORT_COUNTS_PUSH_INTERVAL seconds. When it changes, the task pushes the
+#     new counts and the difference since the last push (`report_counts` event)
+#     to the admin sockets connected to that worker. Admin tabs therefore do not
+#     poll, and the cost does not grow with the number of open tabs.
+#
+# The counters are built from the tables the first time. To rebuild them:
+#
+#   python -m backend.report_counters rebuild
+#   python -m backend.report_counters show
+# =============================================================================
+
+import os
+import sqlite3
+import sys
+import threading
+
+from flask import session
+from flask_socketio import emit, join_room
+
+from backend.config import get_config
+
+cfg = get_config()
+
+COUNTED_TABLES = ("reports", "adr_reports")
+ADMIN_ROOM = "regulators"
+
+
+def status_key(column):
+    """SQL expression mapping a status value to its counter key."""
+    return f"(CASE WHEN {column} IS NULL OR {column} = 0 OR {column} = 'New' THEN 'New' ELSE CAST({column} AS TEXT) END)"
+
+
+def counter_key(table, row):
+    """SQL expression for the counter key of `row` (new, old or a table name) in `table`."""
+    if table == "reports":
+        return f"(CASE WHEN {row}.cluster_id IS NOT NULL THEN 'Duplicate' ELSE {status_key(row + '.status')} END)"
+    return status_key(f"{row}.status")
+
+
+def _bump(table, key, delta):
+    sign = "+" if delta > 0 else "-"
+    return f"""
+        INSERT INTO report_counters (table_name, status, count) VALUES ('{table}', {key}, {delta})
+        ON CONFLICT (table_name, status) DO UPDATE SET count = count {sign} 1;
+    """
+
+
+BUMP_GENERATION = "UPDATE report_counter_state SET generation = generation + 1 WHERE id = 1;"
+
+
+def _triggers(table):
+    new_key, old_key = counter_key(table, "new"), counter_key(table, "old")
+    watched = "status, cluster_id" if table == "reports" else "status"
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_counters_insert AFTER INSERT ON {table} BEGIN
+            {_bump(table, new_key, 1)}
+            {BUMP_GENERATION}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_counters_delete AFTER DELETE ON {table} BEGIN
+            {_bump(table, old_key, -1)}
+            {BUMP_GENERATION}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_counters_update AFTER UPDATE OF {watched} ON {table}
+        WHEN {old_key} IS NOT {new_key} BEGIN
+            {_bump(table, old_key, -1)}
+            {_bump(table, new_key, 1)}
+            {BUMP_GENERATION}
+        END
+        """,
+    ]
+
+
+REGISTRY_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS drugs_counters_insert AFTER INSERT ON drugs BEGIN
+        {_bump("drugs", "'Registered'", 1)}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS drugs_counters_delete AFTER DELETE ON drugs BEGIN
+        {_bump("drugs", "'Registered'", -1)}
+    END
+    """,
+]
+
+
+def init_report_counters(conn):
+    """Create the counter tables and triggers (called from init_db). Builds the counts the first time."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'report_counters'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_counters (
+            table_name TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (table_name, status)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_counter_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO report_counter_state (id, generation) VALUES (1, 0)")
+    stale = not exists or not conn.execute(
+        "SELECT 1 FROM report_counters WHERE table_name = 'drugs'"
+    ).fetchone()
+    for statement in [s for table in COUNTED_TABLES for s in _triggers(table)] + REGISTRY_TRIGGERS:
+        name = statement.split("EXISTS", 1)[1].split()[0]
+        current = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)
+        ).fetchone()
+        expected = statement.strip().replace("IF NOT EXISTS ", "")
+        if current and current[0] != expected:
+            # The counting rules changed; recreate the trigger and recount.
+            conn.execute(f"DROP TRIGGER {name}")
+            stale = True
+        conn.execute(statement)
+    if stale:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Recount every status from the report tables."""
+    conn.execute("DELETE FROM report_counters")
+    for table in COUNTED_TABLES:
+        conn.execute(f"""
+            INSERT INTO report_counters (table_name, status, count)
+            SELECT '{table}', {counter_key(table, table)}, COUNT(*) FROM {table} GROUP BY 2
+        """)
+    conn.execute("INSERT INTO report_counters (table_name, status, count) SELECT 'drugs', 'Registered', COUNT(*) FROM drugs")
+    conn.execute("UPDATE report_counter_state SET generation = generation + 1 WHERE id = 1")
+
+
+def get_counts(conn):
+    """
+    Counts per table, read from the counter rows:
+        {"reports": {"new": 3, "checked": 10, "total": 13, "duplicates": 4, "by_status": {...}}, ...}
+    `total` counts independent reports; linked duplicates are only in `duplicates`.
+    """
+    counts = {table: {"new": 0, "checked": 0, "total": 0, "duplicates": 0, "by_status": {}}
+              for table in COUNTED_TABLES}
+    for table, status, count in conn.execute("SELECT table_name, status, count FROM report_counters"):
+        if table not in counts or not count:
+            continue
+        entry = counts[table]
+        entry["by_status"][status] = count
+        if status == "Duplicate":
+            entry["duplicates"] += count
+            continue
+        entry["total"] += count
+        entry["new" if status == "New" else "checked"] += count
+    return counts
+
+
+def new_count(conn, table="reports"):
+    row = conn.execute(
+        "SELECT count FROM report_counters WHERE table_name = ? AND status = 'New'", (table,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def registered_drug_count(conn):
+    row = conn.execute(
+        "SELECT count FROM report_counters WHERE table_name = 'drugs' AND status = 'Registered'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _delta(before, after):
+    delta = {}
+    for table, entry in after.items():
+        old = before.get(table, {})
+        changed = {key: entry[key] - old.get(key, 0) for key in ("new", "checked", "total", "duplicates")}
+        if any(changed.values()):
+            delta[table] = changed
+    return delta
+
+
+# --- SocketIO push ------------------------------------------------------------------
+
+class CountPusher:
+    """Per-worker task that pushes counter changes to the admin sockets of that worker."""
+
+    def __init__(self, db_path, interval):
+        self.db_path = db_path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._counts = None
+
+    def ensure_started(self, socketio):
+        # gunicorn forks workers after import, so the task is started lazily,
+        # once per process, by the first admin socket that connects.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._counts = None
+                socketio.start_background_task(self._run, socketio)
+
+    def _run(self, socketio):
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        generation = None
+        while self._pid == os.getpid():
+            try:
+                current = conn.execute("SELECT generation FROM report_counter_state WHERE id = 1").fetchone()[0]
+                if current != generation:
+                    counts = get_counts(conn)
+                    if generation is not None:
+                        socketio.emit("report_counts", {"counts": counts, "delta": _delta(self._counts, counts)},
+                                      to=ADMIN_ROOM, namespace="/")
+                    generation, self._counts = current, counts
+            except sqlite3.Error as e:
+                print(f"ERROR: Reading report counters failed - {e}")
+            socketio.sleep(self.interval)
+
+
+count_pusher = CountPusher(cfg.DB_PATH, cfg.REPORT_COUNTS_PUSH_INTERVAL)
+
+
+def register_socket_handlers(socketio):
+    """Put admin sockets in the push room and send them the current counts on connect."""
+
+    @socketio.on("connect")
+    def on_connect(auth=None):
+        if not session.get("admin_id"):
+            return
+        join_room(ADMIN_ROOM)
+        count_pusher.ensure_started(socketio)
+        conn = sqlite3.connect(str(cfg.DB_PATH), timeout=30)
+        try:
+            counts = get_counts(conn)
+        finally:
+            conn.close()
+        emit("report_counts", {"counts": counts, "delta": {}})
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "show"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "rebuild":
+        init_report_counters(conn)
+        rebuild(conn)
+        conn.commit()
+        print("✅ Report counters rebuilt.")
+    elif command == "show":
+        for table, entry in get_counts(conn).items():
+            print(f"{table}: {entry['new']} new, {entry['checked']} checked, {entry['total']} total {entry['by_status']}")
+        print(f"drugs: {registered_drug_count(conn)} registered")
+    else:
+        print("Usage: python -m backend.report_counters [rebuild|show]")
+        sys.exit(2)
+    conn.close()
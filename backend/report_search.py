@@ -0,0 +1,143 @@
+# backend/report_search.py
+
+# =============================================================================
+# F U L L - T E X T   S E A R C H   O V E R   C O U N T E R F E I T   R E P O R T S
+# =============================================================================
+# `reports_fts` is an external-content FTS5 index over the text columns of
+# `reports` (drug_name, batch_number, location, note). It holds only the index.
+# The text stays in `reports`, and triggers keep the index in sync on every
+# INSERT, DELETE and text UPDATE. A status change does not touch the index.
+#
+#   - User input becomes a prefix phrase per word, so `amox lag` matches
+#     "Amoxicillin ... Lagos", and `AMX-2024` matches the batch AMX-2024-001
+#     (the tokenizer splits on '-', and the phrase keeps the parts adjacent).
+#   - Results are ranked with bm25, weighting batch numbers and drug names
+#     above free text, and come with a highlighted snippet.
+#
+# The index is built when the table is first created. To rebuild it on an
+# existing database:
+#
+#   python -m backend.report_search rebuild
+#   python -m backend.report_search check      # FTS5 integrity check
+# =============================================================================
+
+import html
+import re
+import sqlite3
+import sys
+
+from backend.config import get_config
+
+cfg = get_config()
+
+FTS_COLUMNS = ("drug_name", "batch_number", "location", "note")
+# bm25 weights, in FTS_COLUMNS order.
+RANK_EXPRESSION = "bm25(reports_fts, 4.0, 8.0, 1.0, 1.0)"
+# Private-use characters mark the hits so the snippet can be HTML-escaped first.
+MARK_OPEN, MARK_CLOSE = "\ue000", "\ue001"
+SNIPPET_EXPRESSION = f"snippet(reports_fts, -1, '{MARK_OPEN}', '{MARK_CLOSE}', '…', 12)"
+
+SCHEMA = [
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_fts_insert AFTER INSERT ON reports BEGIN
+        INSERT INTO reports_fts (rowid, drug_name, batch_number, location, note)
+        VALUES (new.id, new.drug_name, new.batch_number, new.location, new.note);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_fts_delete AFTER DELETE ON reports BEGIN
+        INSERT INTO reports_fts (reports_fts, rowid, drug_name, batch_number, location, note)
+        VALUES ('delete', old.id, old.drug_name, old.batch_number, old.location, old.note);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reports_fts_update AFTER UPDATE OF drug_name, batch_number, location, note ON reports BEGIN
+        INSERT INTO reports_fts (reports_fts, rowid, drug_name, batch_number, location, note)
+        VALUES ('delete', old.id, old.drug_name, old.batch_number, old.location, old.note);
+        INSERT INTO reports_fts (rowid, drug_name, batch_number, location, note)
+        VALUES (new.id, new.drug_name, new.batch_number, new.location, new.note);
+    END
+    """,
+]
+
+
+def _fts5_available():
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+FTS5_AVAILABLE = _fts5_available()
+
+
+def init_report_search(conn):
+    """Create the FTS index and its triggers (called from init_db). Builds the index the first time."""
+    if not FTS5_AVAILABLE:
+        print("WARNING: SQLite was built without FTS5; report search falls back to LIKE.")
+        return
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports_fts'"
+    ).fetchone()
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+            drug_name, batch_number, location, note,
+            content='reports', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    for statement in SCHEMA:
+        conn.execute(statement)
+    if not exists:
+        rebuild(conn)
+
+
+def rebuild(conn):
+    """Re-index every report from the `reports` table."""
+    conn.execute("INSERT INTO reports_fts (reports_fts) VALUES ('rebuild')")
+
+
+def build_match_query(text):
+    """
+    Turn free text into an FTS5 query: one prefix phrase per word, all required.
+    Returns None when nothing searchable is left.
+    """
+    phrases = []
+    for word in text.split():
+        tokens = re.findall(r"\w+", word)
+        if tokens:
+            phrases.append('"' + " ".join(tokens) + '"*')
+    return " ".join(phrases) or None
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and turn the hit markers into <mark> tags."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "rebuild"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30)
+    if command == "rebuild":
+        init_report_search(conn)
+        rebuild(conn)
+        conn.execute("INSERT INTO reports_fts (reports_fts) VALUES ('optimize')")
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        print(f"✅ Search index rebuilt for {count} reports.")
+    elif command == "check":
+        try:
+            conn.execute("INSERT INTO reports_fts (reports_fts, rank) VALUES ('integrity-check', 1)")
+            print("✅ Search index matches the reports table.")
+        except sqlite3.DatabaseError as e:
+            print(f"❌ Search index is out of sync ({e}). Run: python -m backend.report_search rebuild")
+            sys.exit(1)
+    else:
+        print("Usage: python -m backend.report_search [rebuild|check]")
+        sys.exit(2)
+    conn.close()
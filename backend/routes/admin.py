@@ -1,19 +1,22 @@
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from datetime import datetime, date, timedelta
-from flask import Blueprint, request, send_file, jsonify, url_for, render_template, Response, session, redirect
+from datetime import datetime
+from flask import Blueprint, request, send_file, jsonify, url_for, render_template, Response, session, redirect, current_app
 from sqlite3 import IntegrityError
 from backend.models import insert_drug
 from backend.database import get_db
-import qrcode
-import io
+from backend.drug_cache import invalidate_drug
+from backend.qr_utils import generate_qr_png
+from backend.report_counters import get_counts
+from backend.dashboard_queries import (
+    ADR_COLUMNS, REPORT_COLUMNS, PageRequestError, adr_page, counterfeit_page, page_options
+)
+from backend.routes.report import decode_cursor, report_image_url
+from backend.analytics import AnalyticsQueryError, query as analytics_query
+from backend.exports import export_response
+from backend.drug_filters import compile_drug_filter, drug_page, drug_total
+from backend.export_jobs import (
+    FORMATS as EXPORT_FORMATS, ExportJobError, download_name, export_jobs, get_job, job_path
+)
 import traceback
-from docx import Document
-from docx.oxml.ns import qn
-from docx.shared import Inches
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
 from functools import wraps
 
 admin_bp = Blueprint("admin_api", __name__)
@@ -31,81 +34,103 @@ def role_required(role):
 # =========================
 # MODIFIED: Admin Dashboard (Now handles all filtering)
 # =========================
+# Renders the first page of each table; the template fetches the rest from
+# the dashboard data API below as the regulator scrolls.
 @admin_bp.route('/dashboard')
 @role_required('regulator')
 def admin_dashboard():
     try:
         conn = get_db()
-
-        # --- Counterfeit Reports Filtering Logic ---
-        start_date = request.args.get("start", "").strip()
-        end_date = request.args.get("end", "").strip()
-        filter_type = request.args.get("filter", "").strip()
-
-        counterfeit_query = """
-            SELECT r.id, r.drug_name, r.batch_number, r.location, r.note, r.image_filename,
-                   strftime('%Y-%m-%d %H:%M:%S', r.reported_on) AS reported_on, r.status,
-                   u.email AS submitted_by
-            FROM reports r
-            LEFT JOIN users u ON r.user_id = u.id
-            WHERE 1=1
-        """
-        counterfeit_params = []
-
-        if filter_type == 'today':
-            counterfeit_query += " AND date(r.reported_on) = date('now','localtime')"
-        elif start_date and end_date:
-            counterfeit_query += " AND date(r.reported_on) BETWEEN date(?) AND date(?)"
-            counterfeit_params.extend([start_date, end_date])
-        
-        counterfeit_query += " ORDER BY r.reported_on DESC, r.id DESC"
-        
-        counterfeit_rows = conn.execute(counterfeit_query, counterfeit_params).fetchall()
-        counterfeit_reports = [dict(r) for r in counterfeit_rows]
-
-        # --- ADR Reports Filtering Logic (Unchanged) ---
-        adr_search = request.args.get("adr_search", "").strip()
-        adr_start = request.args.get("adr_start", "").strip()
-        adr_end = request.args.get("adr_end", "").strip()
-
-        adr_query = """
-            SELECT
-                ar.id, ar.patient_age_range, ar.patient_gender,
-                ar.reaction_description, ar.status,
-                strftime('%Y-%m-%d %H:%M:%S', ar.report_date) AS report_date,
-                d.name as drug_name, d.batch_number
-            FROM adr_reports ar
-            JOIN drugs d ON ar.drug_id = d.id
-            WHERE 1=1
-        """
-        adr_params = []
-
-        if adr_search:
-            adr_query += " AND (d.name LIKE ? OR d.batch_number LIKE ? OR ar.reaction_description LIKE ?)"
-            adr_params.extend([f"%{adr_search}%", f"%{adr_search}%", f"%{adr_search}%"])
-
-        if adr_start and adr_end:
-            adr_query += " AND date(ar.report_date) BETWEEN date(?) AND date(?)"
-            adr_params.extend([adr_start, adr_end])
-
-        adr_query += " ORDER BY ar.report_date DESC"
-
-        adr_rows = conn.execute(adr_query, adr_params).fetchall()
-        adr_reports = [dict(r) for r in adr_rows]
+        try:
+            reports, reports_next = counterfeit_page(conn, request.args)
+            adr_reports, adr_next = adr_page(conn, request.args)
+        except PageRequestError:
+            reports, reports_next = counterfeit_page(conn, {})
+            adr_reports, adr_next = adr_page(conn, {})
 
         return render_template(
             'admin.html',
-            reports=counterfeit_reports,
+            reports=reports,
             adr_reports=adr_reports,
+            reports_next_cursor=reports_next,
+            adr_next_cursor=adr_next,
             current_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            adr_search=adr_search,
-            adr_start=adr_start,
-            adr_end=adr_end
+            adr_search=request.args.get("adr_search", "").strip(),
+            adr_start=request.args.get("adr_start", "").strip(),
+            adr_end=request.args.get("adr_end", "").strip()
         )
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+
+# =========================
+# Dashboard data API (paginated)
+# =========================
+#   GET /admin/api/reports       counterfeit reports (filter, start, end, search)
+#   GET /admin/api/adr-reports   ADR reports (adr_search, adr_start, adr_end)
+# Both take limit, cursor, sort=newest|oldest and fields=..., and return
+# {"items": [...], "next_cursor": "..." or null}. See backend/dashboard_queries.py.
+def _dashboard_api_page(page, columns):
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+    try:
+        fields, sort, limit, cursor = page_options(request.args, columns)
+        items, next_cursor = page(get_db(), request.args, fields, sort, limit, cursor)
+    except PageRequestError as e:
+        return jsonify({"error": str(e)}), 400
+    if "image_filename" in fields:
+        for item in items:
+            if item["image_filename"]:
+                item["image_url"] = report_image_url(item["image_filename"])
+                item["thumb_url"] = report_image_url(item["image_filename"], "thumb")
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+
+@admin_bp.get("/api/reports")
+@role_required('regulator')
+def dashboard_reports():
+    return _dashboard_api_page(counterfeit_page, REPORT_COLUMNS)
+
+
+@admin_bp.get("/api/adr-reports")
+@role_required('regulator')
+def dashboard_adr_reports():
+    return _dashboard_api_page(adr_page, ADR_COLUMNS)
+
+
+# =========================
+# Analytics (trend charts and KPIs)
+# =========================
+#   GET /admin/api/analytics?source=reports&bucket=week&start=2024-01-01&end=2024-03-31
+#       &group_by=state,drug&state=Lagos,Kano&manufacturer=...
+# Reads the pre-aggregated cube in backend/analytics.py.
+@admin_bp.get("/api/analytics")
+@role_required('regulator')
+def dashboard_analytics():
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+    args = request.args
+    group_by = [d.strip() for d in args.get("group_by", "").split(",") if d.strip()]
+    filters = {
+        dimension: [v.strip() for v in args[dimension].split(",") if v.strip()]
+        for dimension in ("state", "drug", "manufacturer", "status") if args.get(dimension, "").strip()
+    }
+    start, end = args.get("start", "").strip() or None, args.get("end", "").strip() or None
+    try:
+        for bound in (start, end):
+            if bound:
+                datetime.strptime(bound, "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "start and end must be dates in YYYY-MM-DD format"}), 400
+    try:
+        result = analytics_query(
+            get_db(), args.get("source", "reports"), args.get("bucket", "day"), start, end, group_by, filters
+        )
+    except AnalyticsQueryError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result)
+
 # =========================
 # Register a new drug batch
 # =========================
@@ -130,11 +155,7 @@ def admin_register():
             )
         except IntegrityError:
             return jsonify({"error": "Batch number already exists"}), 409
-        verify_url = data['batch_number']
-        qr_img = qrcode.make(verify_url, box_size=15, border=4)
-        buf = io.BytesIO()
-        qr_img.save(buf, format="PNG")
-        buf.seek(0)
+        buf = generate_qr_png(data['batch_number'], box_size=15, border=4)
         if request.is_json:
             return send_file(buf, mimetype="image/png", download_name=f"{data['batch_number']}.png")
         import base64
@@ -142,9 +163,10 @@ def admin_register():
         conn = get_db()
         rows = conn.execute("""
             SELECT id, drug_name, batch_number, location, note, image_filename,
-                   strftime('%Y-%m-%d %H:%M:%S', reported_on) AS reported_on, status
+                   strftime('%Y-%m-%d %H:%M:%S', reported_on) AS reported_on, status, duplicate_count
             FROM reports
-            ORDER BY reported_on DESC
+            WHERE cluster_id IS NULL
+            ORDER BY reported_on_epoch DESC
             LIMIT 20
         """).fetchall()
         reports = [dict(r) for r in rows]
@@ -168,31 +190,25 @@ def admin_drugs():
         status = request.args.get("status", "").strip()
         start = request.args.get("start", "").strip()
         end = request.args.get("end", "").strip()
-        page = int(request.args.get("page", 1))
-        per_page = 20
-        offset = (page - 1) * per_page
-        base_query = "FROM drugs WHERE 1=1"
-        params = []
-        if search:
-            base_query += " AND (name LIKE ? OR batch_number LIKE ?)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        if status == "valid":
-            base_query += " AND date(expiry_date) >= date('now','localtime')"
-        elif status == "expired":
-            base_query += " AND date(expiry_date) < date('now','localtime')"
-        elif status == "soon":
-            base_query += " AND date(expiry_date) BETWEEN date('now','localtime') AND date('now','+30 day','localtime')"
-        if start and end:
-            base_query += " AND date(created_at) BETWEEN date(?) AND date(?)"
-            params.extend([start, end])
-        total = conn.execute(f"SELECT COUNT(*) {base_query}", params).fetchone()[0]
-        rows = conn.execute(f"""
-            SELECT id, name, batch_number, manufacturer, mfg_date, expiry_date, created_at
-            {base_query}
-            ORDER BY created_at DESC
-            LIMIT ? OFFSET ?
-        """, params + [per_page, offset]).fetchall()
-        total_pages = (total + per_page - 1) // per_page
+        page = max(request.args.get("page", 1, type=int) or 1, 1)
+        try:
+            where, params = compile_drug_filter(request.args)
+        except PageRequestError:
+            where, params = [], []
+        after = before = None
+        try:
+            if request.args.get("after"):
+                after = decode_cursor(request.args["after"], int, int)
+            elif request.args.get("before"):
+                before = decode_cursor(request.args["before"], int, int)
+        except (ValueError, UnicodeDecodeError):
+            page = 1
+        if after is None and before is None:
+            page = 1
+        per_page = current_app.config.get("DRUGS_PAGE_SIZE", 20)
+        rows, prev_cursor, next_cursor = drug_page(conn, where, params, after, before, per_page)
+        total, total_exact = drug_total(conn, where, params)
+        total_pages = -(-total // per_page) if total_exact else None
         return render_template(
             "admin_drugs.html",
             drugs=rows,
@@ -200,10 +216,13 @@ def admin_drugs():
             status=status,
             start=start,
             end=end,
-            current_date=date.today().isoformat(),
-            soon_date=(date.today() + timedelta(days=30)).isoformat(),
             page=page,
-            total_pages=total_pages
+            per_page=per_page,
+            total=total,
+            total_exact=total_exact,
+            total_pages=total_pages,
+            prev_cursor=prev_cursor,
+            next_cursor=next_cursor
         )
     except Exception as e:
         print("Error in /drugs:", e)
@@ -224,6 +243,7 @@ def delete_drug(drug_id):
         conn.execute("DELETE FROM adr_reports WHERE drug_id = ?", (drug_id,))
         cursor = conn.execute("DELETE FROM drugs WHERE id = ?", (drug_id,))
         conn.commit()
+        invalidate_drug()
 
         if cursor.rowcount == 0:
             return jsonify({"error": "Drug not found"}), 404
@@ -237,169 +257,101 @@ def delete_drug(drug_id):
 
 
 # =========================
-# Export Registered Drugs (Word)
+# Streaming exports (CSV, NDJSON, XLSX)
 # =========================
-@admin_bp.get("/drugs/export/word")
-@role_required('regulator')
-def export_drugs_word():
+# Same filters as the page the link sits on; see backend/exports.py.
+def _streamed_export(dataset, fmt):
     if not session.get("admin_id"):
-        return redirect(url_for("admin_login"))
+        return jsonify({"error": "Authentication required"}), 401
     try:
-        conn = get_db()
-        search = request.args.get("search", "").strip()
-        status = request.args.get("status", "").strip()
-        start = request.args.get("start", "").strip()
-        end = request.args.get("end", "").strip()
-        base_query = "FROM drugs WHERE 1=1"
-        params = []
-        if search:
-            base_query += " AND (name LIKE ? OR batch_number LIKE ?)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        if status == "valid":
-            base_query += " AND date(expiry_date) >= date('now','localtime')"
-        elif status == "expired":
-            base_query += " AND date(expiry_date) < date('now','localtime')"
-        elif status == "soon":
-            base_query += " AND date(expiry_date) BETWEEN date('now','localtime') AND date('now','+30 day','localtime')"
-        if start and end:
-            base_query += " AND date(created_at) BETWEEN date(?) AND date(?)"
-            params.extend([start, end])
-        rows = conn.execute(f"""
-            SELECT name, batch_number, manufacturer, mfg_date, expiry_date, created_at
-            {base_query}
-            ORDER BY created_at DESC
-        """, params).fetchall()
-        today = date.today()
-        soon = today + timedelta(days=30)
-        def safe(val):
-            return str(val) if val is not None else "N/A"
-        doc = Document()
-        doc.add_heading("Registered Drugs Report", 0)
-        table = doc.add_table(rows=1, cols=7)
-        table.style = "Table Grid"
-        hdr_cells = table.rows[0].cells
-        hdr_cells[0].text = "Name"
-        hdr_cells[1].text = "Batch Number"
-        hdr_cells[2].text = "Manufacturer"
-        hdr_cells[3].text = "Mfg Date"
-        hdr_cells[4].text = "Expiry Date"
-        hdr_cells[5].text = "Status"
-        hdr_cells[6].text = "Registered On"
-        for row in rows:
-            try:
-                exp_date = datetime.strptime(
-                    safe(row["expiry_date"]), "%Y-%m-%d").date()
-            except Exception:
-                exp_date = today
-            if exp_date < today:
-                status_label = "Expired"
-            elif exp_date <= soon:
-                status_label = "Expiring Soon"
-            else:
-                status_label = "Valid"
-            cells = table.add_row().cells
-            cells[0].text = safe(row["name"])
-            cells[1].text = safe(row["batch_number"])
-            cells[2].text = safe(row["manufacturer"])
-            cells[3].text = safe(row["mfg_date"])
-            cells[4].text = safe(row["expiry_date"])
-            cells[5].text = status_label
-            cells[6].text = safe(row["created_at"])
-        doc.add_paragraph()
-        generated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        doc.add_paragraph(f"Generated on {generated_on} by Admin System")
-        buf = io.BytesIO()
-        doc.save(buf)
-        buf.seek(0)
-        return send_file(
-            buf,
-            mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            download_name="registered_drugs.docx",
-            as_attachment=True
-        )
-    except Exception as e:
-        print("Error exporting Word:", e)
-        traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
+        return export_response(dataset, fmt, request.args)
+    except PageRequestError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@admin_bp.get("/drugs/export/<any(csv, ndjson, xlsx):fmt>")
+@role_required('regulator')
+def export_drugs_table(fmt):
+    return _streamed_export("drugs", fmt)
+
+
+@admin_bp.get("/reports/export/<any(csv, ndjson, xlsx):fmt>")
+@role_required('regulator')
+def export_reports_table(fmt):
+    return _streamed_export("reports", fmt)
+
+
+@admin_bp.get("/adr-reports/export/<any(csv, ndjson, xlsx):fmt>")
+@role_required('regulator')
+def export_adr_reports_table(fmt):
+    return _streamed_export("adr_reports", fmt)
 
 # =========================
-# Export Registered Drugs (PDF)
+# Export jobs (Word, PDF)
 # =========================
-@admin_bp.get("/drugs/export/pdf")
+#   POST /admin/exports?dataset=drugs&format=pdf&<the page's filters>
+#       -> 202 {"job": {...}, "status_url": ..., "download_url": ...}
+#   GET  /admin/exports/<job_id>            job status
+#   GET  /admin/exports/<job_id>/download   the finished file
+# Rendering runs in a process pool and progress is pushed over SocketIO
+# (`export_progress`); see backend/export_jobs.py.
+def _job_urls(job):
+    return {
+        "job": job,
+        "status_url": url_for("admin_api.export_job_status", job_id=job["id"]),
+        "download_url": url_for("admin_api.download_export", job_id=job["id"]),
+    }
+
+
+def _own_job(job_id):
+    job = get_job(get_db(), job_id)
+    if job is None or job.pop("admin_id") != session.get("admin_id"):
+        return None
+    return job
+
+
+@admin_bp.post("/exports")
 @role_required('regulator')
-def export_drugs_pdf():
+def create_export():
     if not session.get("admin_id"):
-        return redirect(url_for("admin_login"))
+        return jsonify({"error": "Authentication required"}), 401
     try:
-        conn = get_db()
-        search = request.args.get("search", "").strip()
-        status = request.args.get("status", "").strip()
-        start = request.args.get("start", "").strip()
-        end = request.args.get("end", "").strip()
-        base_query = "FROM drugs WHERE 1=1"
-        params = []
-        if search:
-            base_query += " AND (name LIKE ? OR batch_number LIKE ?)"
-            params.extend([f"%{search}%", f"%{search}%"])
-        if status == "valid":
-            base_query += " AND date(expiry_date) >= date('now','localtime')"
-        elif status == "expired":
-            base_query += " AND date(expiry_date) < date('now','localtime')"
-        elif status == "soon":
-            base_query += " AND date(expiry_date) BETWEEN date('now','localtime') AND date('now','+30 day','localtime')"
-        if start and end:
-            base_query += " AND date(created_at) BETWEEN date(?) AND date(?)"
-            params.extend([start, end])
-        rows = conn.execute(f"""
-            SELECT name, batch_number, manufacturer, mfg_date, expiry_date, created_at
-            {base_query}
-            ORDER BY created_at DESC
-        """, params).fetchall()
-        buf = io.BytesIO()
-        doc = SimpleDocTemplate(buf, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        elements.append(Paragraph("Registered Drugs Report", styles["Title"]))
-        elements.append(Spacer(1, 12))
-        data = [["Name", "Batch Number", "Manufacturer",
-                 "Mfg Date", "Expiry Date", "Status", "Registered On"]]
-        today = date.today()
-        soon = today + timedelta(days=30)
-        for row in rows:
-            if row["expiry_date"] < today.isoformat():
-                status_label = "Expired"
-            elif row["expiry_date"] <= soon.isoformat():
-                status_label = "Expiring Soon"
-            else:
-                status_label = "Valid"
-            data.append([
-                row["name"], row["batch_number"], row["manufacturer"],
-                row["mfg_date"], row["expiry_date"], status_label, row["created_at"]
-            ])
-        table = Table(data, repeatRows=1)
-        table.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#f4f4f4")),
-            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ("FONTSIZE", (0, 0), (-1, 0), 11),
-            ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-            ("BOX", (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        elements.append(table)
-        elements.append(Spacer(1, 20))
-        generated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        footer_text = f"Generated on {generated_on} by Admin System"
-        elements.append(Paragraph(footer_text, styles["Normal"]))
-        doc.build(elements)
-        buf.seek(0)
-        return send_file(buf, mimetype="application/pdf",
-                         download_name="registered_drugs.pdf", as_attachment=True)
-    except Exception as e:
-        print("Error exporting PDF:", e)
-        traceback.print_exc()
-        return jsonify({"error": "Failed to export PDF"}), 500
+        job = export_jobs.submit(
+            get_db(), session["admin_id"], request.args.get("dataset", ""), request.args.get("format", ""),
+            request.args,
+        )
+    except (ExportJobError, PageRequestError) as e:
+        return jsonify({"error": str(e)}), 400
+    job.pop("admin_id")
+    return jsonify(_job_urls(job)), 202
+
+
+@admin_bp.get("/exports/<job_id>")
+@role_required('regulator')
+def export_job_status(job_id):
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Export not found or expired"}), 404
+    return jsonify(_job_urls(job))
+
+
+@admin_bp.get("/exports/<job_id>/download")
+@role_required('regulator')
+def download_export(job_id):
+    if not session.get("admin_id"):
+        return redirect(url_for("admin_login"))
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({"error": "Export not found or expired"}), 404
+    if job["status"] != "done":
+        return jsonify({"error": f"Export is {job['status']}", "job": job}), 409
+    path = job_path(job["id"], job["format"])
+    if not path.exists():
+        return jsonify({"error": "Export not found or expired"}), 404
+    return send_file(path, mimetype=EXPORT_FORMATS[job["format"]][0],
+                     download_name=download_name(job), as_attachment=True)
 
 # =========================
 # Reports Count (Unread)
@@ -410,9 +362,8 @@ def reports_count():
     if not session.get("admin_id"):
         return jsonify({"error": "Authentication required"}), 401
     try:
-        conn = get_db()
-        row = conn.execute("SELECT COUNT(*) as count FROM reports WHERE status = 0").fetchone()
-        return jsonify({"count": row["count"] if row else 0})
+        counts = get_counts(get_db())
+        return jsonify({"count": counts["reports"]["new"], "counts": counts})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"Server error: {str(e)}"}), 500
@@ -427,9 +378,9 @@ def get_report_locations():
         return jsonify({"error": "Authentication required"}), 401
     conn = get_db()
     rows = conn.execute("""
-        SELECT latitude, longitude, drug_name, batch_number, reported_on
+        SELECT latitude, longitude, drug_name, batch_number, reported_on, duplicate_count
         FROM reports
-        WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        WHERE latitude IS NOT NULL AND longitude IS NOT NULL AND cluster_id IS NULL
     """).fetchall()
     locations = [dict(row) for row in rows]
     return jsonify(locations)
@@ -1,12 +1,6 @@
-from flask import Blueprint, request, jsonify, session, send_file
+from flask import Blueprint, request, jsonify, session
 from backend.database import get_db
-from datetime import datetime
-import io
-from docx import Document
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+from backend.moderation import ModerationError, moderate
 
 adr_bp = Blueprint("adr_api", __name__)
 
@@ -96,129 +90,20 @@ def update_adr_status(report_id):
         return jsonify({"error": "An internal server error occurred."}), 500
 
 
-# --- Helper and Export Routes ---
-def get_filtered_adr_data(conn):
-    """Helper function to fetch and filter ADR data based on request arguments."""
-    adr_search = request.args.get("adr_search", "").strip()
-    adr_start = request.args.get("adr_start", "").strip()
-    adr_end = request.args.get("adr_end", "").strip()
-
-    query = """
-        SELECT
-            ar.id, ar.patient_age_range, ar.patient_gender,
-            ar.reaction_description, ar.status,
-            strftime('%Y-%m-%d', ar.report_date) AS report_date,
-            d.name as drug_name, d.batch_number
-        FROM adr_reports ar
-        JOIN drugs d ON ar.drug_id = d.id
-        WHERE 1=1
-    """
-    params = []
-
-    if adr_search:
-        query += " AND (d.name LIKE ? OR d.batch_number LIKE ? OR ar.reaction_description LIKE ?)"
-        params.extend([f"%{adr_search}%"] * 3)
-
-    if adr_start and adr_end:
-        query += " AND date(ar.report_date) BETWEEN date(?) AND date(?)"
-        params.extend([adr_start, adr_end])
-
-    query += " ORDER BY ar.report_date DESC"
-
-    rows = conn.execute(query, params).fetchall()
-    return [dict(row) for row in rows]
-
-
-@adr_bp.route("/admin/adr-reports/export/word")
-def export_adr_reports_word():
+@adr_bp.route("/api/adr-report/bulk", methods=["POST"])
+def bulk_moderate_adr_reports():
+    """Bulk status change or deletion of ADR reports; see backend/moderation.py."""
     if not session.get("admin_id"):
         return jsonify({"error": "Authentication required"}), 401
+    try:
+        return jsonify(moderate(get_db(), "adr_reports", request.get_json(silent=True) or {}))
+    except ModerationError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    except Exception as e:
+        print(f"Error in bulk ADR moderation: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
 
-    conn = get_db()
-    reports = get_filtered_adr_data(conn)
-
-    doc = Document()
-    doc.add_heading("Adverse Drug Reaction Reports", 0)
-
-    table = doc.add_table(rows=1, cols=7)
-    table.style = "Table Grid"
-    hdr_cells = table.rows[0].cells
-    hdr_cells[0].text = "Drug Name"
-    hdr_cells[1].text = "Batch #"
-    hdr_cells[2].text = "Patient"
-    hdr_cells[3].text = "Reaction"
-    hdr_cells[4].text = "Status"
-    hdr_cells[5].text = "Report Date"
-
-    for report in reports:
-        cells = table.add_row().cells
-        cells[0].text = report["drug_name"]
-        cells[1].text = report["batch_number"]
-        cells[2].text = (
-            f"{report['patient_age_range'] or 'N/A'} / {report['patient_gender'] or 'N/A'}"
-        )
-        cells[3].text = report["reaction_description"]
-        cells[4].text = report["status"] or "New"
-        cells[5].text = report["report_date"]
-
-    buf = io.BytesIO()
-    doc.save(buf)
-    buf.seek(0)
-    return send_file(
-        buf,
-        mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        download_name="adr_reports.docx",
-        as_attachment=True,
-    )
-
-
-@adr_bp.route("/admin/adr-reports/export/pdf")
-def export_adr_reports_pdf():
-    if not session.get("admin_id"):
-        return jsonify({"error": "Authentication required"}), 401
-
-    conn = get_db()
-    reports = get_filtered_adr_data(conn)
-
-    buf = io.BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    elements.append(Paragraph("Adverse Drug Reaction Reports", styles["Title"]))
-    elements.append(Spacer(1, 12))
-
-    data = [["Drug", "Batch #", "Patient", "Reaction", "Status", "Report Date"]]
-    for report in reports:
-        data.append(
-            [
-                report["drug_name"],
-                report["batch_number"],
-                f"{report['patient_age_range'] or 'N/A'} / {report['patient_gender'] or 'N/A'}",
-                report["reaction_description"],
-                report["status"] or "New",
-                report["report_date"],
-            ]
-        )
-
-    table = Table(data, repeatRows=1)
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.grey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.whitesmoke),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("BOTTOMPADDING", (0, 0), (-1, 0), 12),
-                ("BACKGROUND", (0, 1), (-1, -1), colors.beige),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-            ]
-        )
-    )
-    elements.append(table)
 
-    doc.build(elements)
-    buf.seek(0)
-    return send_file(
-        buf, mimetype="application/pdf", download_name="adr_reports.pdf", as_attachment=True
-    )
\ No newline at end of file
+# Word and PDF exports of ADR reports are export jobs (POST /admin/exports,
+# backend/export_jobs.py); CSV, NDJSON and XLSX stream from
+# /admin/adr-reports/export/<format> (backend/exports.py).
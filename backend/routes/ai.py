@@ -4,6 +4,7 @@ import re
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from backend.database import get_db
+from backend.drug_cache import lookup_drug
 
 ai_bp = Blueprint("ai_api", __name__)
 
@@ -33,7 +34,7 @@ def get_ai_response(user_message, knowledge_base):
         batch_number = batch_report_match.group(1).upper()
         conn = get_db()
         reports = conn.execute(
-            "SELECT location, reported_on FROM reports WHERE batch_number = ? ORDER BY reported_on DESC",
+            "SELECT location, reported_on FROM reports WHERE batch_number = ? AND cluster_id IS NULL ORDER BY reported_on_epoch DESC",
             (batch_number,)
         ).fetchall()
         if not reports:
@@ -52,10 +53,7 @@ def get_ai_response(user_message, knowledge_base):
         batch_number = drug_status_match.group(1).upper()
         conn = get_db()
         
-        drug = conn.execute(
-            "SELECT name, manufacturer, expiry_date FROM drugs WHERE batch_number = ?",
-            (batch_number,)
-        ).fetchone()
+        drug = lookup_drug(conn, batch_number)
 
         if not drug:
             answer = f"<p>The batch number <strong>{batch_number}</strong> is not registered in the MedGuard system. This drug could be counterfeit.</p>"
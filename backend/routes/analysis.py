@@ -0,0 +1,36 @@
+from flask import Blueprint, jsonify, request, session
+from backend.database import get_db
+from backend.packaging_match import PENDING, analyze_report
+
+analysis_bp = Blueprint("analysis_api", __name__)
+
+
+# =========================
+# POST: Compare a report's photo with genuine reference packaging
+# =========================
+@analysis_bp.post("/analyze-image/<int:report_id>")
+def analyze_image(report_id):
+    """
+    Returns the stored packaging analysis for a report (computed when the report
+    was submitted), re-matching it if reference photos were added since.
+    `?refresh=1` hashes the photo again. When the photo has to be hashed the
+    answer is 202 {"status": "pending"}, and the result follows as a
+    `report_analysis` Socket.IO event.
+    """
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+
+    conn = get_db()
+    try:
+        result = analyze_report(conn, report_id, refresh=request.args.get("refresh") == "1")
+    except FileNotFoundError:
+        return jsonify({"error": "This report has no readable image."}), 404
+    except Exception as e:
+        print(f"Error analysing image for report {report_id}: {e}")
+        return jsonify({"error": "Image analysis failed."}), 500
+    if result is None:
+        return jsonify({"error": "Report not found"}), 404
+    if result is PENDING:
+        return jsonify({"status": "pending", "report_id": report_id}), 202
+    conn.commit()
+    return jsonify(result)
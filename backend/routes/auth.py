@@ -61,7 +61,7 @@ def my_reports():
     user_id = session["user_id"]
     conn = get_db()
     reports = conn.execute(
-        "SELECT id, drug_name, batch_number, location, note, reported_on, status FROM reports WHERE user_id = ? ORDER BY reported_on DESC",
+        "SELECT id, drug_name, batch_number, location, note, reported_on, status FROM reports WHERE user_id = ? ORDER BY reported_on_epoch DESC",
         (user_id,)
     ).fetchall()
 
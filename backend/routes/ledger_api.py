@@ -0,0 +1,23 @@
+from flask import Blueprint, jsonify
+from backend.database import get_db
+from backend.ledger import get_history_with_proofs
+
+ledger_bp = Blueprint("ledger_api", __name__)
+
+
+# =========================
+# GET: Supply-chain history of a batch with Merkle inclusion proofs
+# =========================
+@ledger_bp.get("/ledger/<path:batch_number>")
+def batch_history(batch_number):
+    """
+    Returns every ledger event for a batch. Events in a sealed block carry the
+    block header and a Merkle proof that the event hash is included in its root.
+    A pending block older than LEDGER_BLOCK_INTERVAL is sealed before the
+    answer, so only events younger than that have "block" and "proof" null.
+    """
+    conn = get_db()
+    history = get_history_with_proofs(conn, batch_number.strip())
+    if not history:
+        return jsonify({"error": "No ledger history for this batch"}), 404
+    return jsonify({"batch_number": batch_number.strip(), "events": history})
@@ -1,8 +1,14 @@
-import os
-from flask import Blueprint, jsonify, request, current_app, session
-from werkzeug.utils import secure_filename
-from backend.database import get_db
-from datetime import datetime
+import base64
+import json
+from flask import (
+    Blueprint, jsonify, request, session, send_file, abort, url_for,
+    current_app, Response, stream_with_context
+)
+from backend.database import get_db, epoch_day_range
+from backend import image_store, packaging_match, report_search
+from backend.notifications import notify_new_report
+from backend.report_counters import new_count
+from backend.report_clusters import find_cluster, get_cluster
 from flask_socketio import emit
 
 report_bp = Blueprint("report_api", __name__)
@@ -34,65 +40,216 @@ def create_report():
 
     image_filename = None
     if image_file and allowed_file(image_file.filename):
-        image_filename = secure_filename(f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{image_file.filename}")
-        upload_folder = os.path.join(current_app.static_folder, 'uploads')
-        os.makedirs(upload_folder, exist_ok=True)
-        image_file.save(os.path.join(upload_folder, image_filename))
+        try:
+            image_filename = image_store.save_upload(image_file)
+        except image_store.UploadTooLarge as e:
+            return jsonify({"message": f"❌ {e}"}), 413
+        except image_store.InvalidImage as e:
+            return jsonify({"message": f"❌ {e}"}), 400
 
     conn = get_db()
-    conn.execute(
+    dedup_key, note_minhash, cluster_id = find_cluster(
+        conn, batch_number, latitude, longitude, location, note, image_filename
+    )
+    cursor = conn.execute(
         """
-        INSERT INTO reports (user_id, drug_name, batch_number, location, note, image_filename, latitude, longitude, reported_on, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        INSERT INTO reports (user_id, drug_name, batch_number, location, note, image_filename, latitude, longitude, status,
+                             dedup_key, note_minhash, cluster_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (user_id, drug_name, batch_number, location, note, image_filename, latitude, longitude, datetime.now(), 'New')
+        (user_id, drug_name, batch_number, location, note, image_filename, latitude, longitude, 'New',
+         dedup_key, note_minhash, cluster_id)
     )
+    # A near-duplicate is linked to its cluster and does not page regulators again.
+    if cluster_id is None:
+        # Queued in the same transaction; the notification worker sends them.
+        notify_new_report({"drug_name": drug_name, "batch_number": batch_number}, conn)
     conn.commit()
 
+    if image_filename:
+        packaging_match.submit_report(cursor.lastrowid, image_filename, drug_name)
+
     # Emit a WebSocket event to notify connected admin clients
-    try:
-        emit('new_report', {'message': 'A new counterfeit report has been submitted.'}, namespace='/', broadcast=True)
-    except RuntimeError as e:
-        print(f"SocketIO emit failed. Are you running under the SocketIO server? Error: {e}")
+    if cluster_id is None:
+        try:
+            emit('new_report', {'message': 'A new counterfeit report has been submitted.'}, namespace='/', broadcast=True)
+        except RuntimeError as e:
+            print(f"SocketIO emit failed. Are you running under the SocketIO server? Error: {e}")
 
     return jsonify({"message": "🚨 Report received. Thank you for helping keep patients safe."}), 201
 
 
+def report_image_url(image_filename, variant="original"):
+    """URL of a report image variant ('original', 'webp' or 'thumb'); used by templates."""
+    if image_store.parse_key(image_filename):
+        return url_for("report_api.report_image", key=image_filename, variant=variant)
+    # Uploads saved before the image store have no variants.
+    return url_for("static", filename="uploads/" + image_filename)
+
+
+# =========================
+# GET: Serve a report image variant from the image store
+# =========================
+@report_bp.get("/report/image/<key>/<variant>")
+def report_image(key, variant):
+    parsed = image_store.parse_key(key)
+    if not parsed or variant not in image_store.VARIANTS:
+        abort(404)
+    path = image_store.ensure_variant(*parsed, variant)
+    if path is None:
+        abort(404)
+    response = send_file(path, conditional=True, max_age=365 * 24 * 3600)
+    # The key is the hash of the content, so a URL never changes meaning.
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 # =========================
 # GET: Fetch counterfeit reports
 # =========================
+# Newest first, keyset-paginated on (reported_on_epoch, id).
+#   ?limit=50                 page size (capped at REPORT_PAGE_SIZE_MAX)
+#   ?cursor=<next_cursor>     continue after the last row of the previous page
+#   ?fields=id,batch_number   only return these columns
+#   ?format=ndjson            stream every matching row (from the cursor on) as
+#                             one JSON object per line, without building a list
+#   ?search=amox lagos        full-text search (FTS5, prefix match per word); results
+#                             are ranked and carry a highlighted `snippet`.
+#                             `sort=recent` orders them by date instead.
+#   ?duplicates=collapse      only the primary report of each near-duplicate cluster
+#                             (see backend/report_clusters.py)
+REPORT_FIELDS = ("id", "drug_name", "batch_number", "location", "note", "image_filename",
+                 "reported_on", "status", "latitude", "longitude", "cluster_id", "duplicate_count")
+DEFAULT_REPORT_FIELDS = ("id", "drug_name", "batch_number", "location", "note", "image_filename",
+                         "reported_on", "status")
+# Formatted in SQL, so the JSON page and the NDJSON stream send the same ISO-8601 UTC text.
+REPORT_FIELD_SQL = {"reported_on": "strftime('%Y-%m-%dT%H:%M:%SZ', r.reported_on) AS reported_on"}
+STREAM_FETCH_SIZE = 500
+
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(":".join(map(repr, values)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, *types):
+    """Return the cursor's values converted with `types`, or raise ValueError."""
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    parts = raw.split(":")
+    if len(parts) != len(types):
+        raise ValueError("cursor does not match the sort order")
+    return tuple(kind(part) for kind, part in zip(types, parts))
+
+
+def _report_row(row, fields, with_snippet=False):
+    report = {field: row[field] for field in fields}
+    if "status" in report:
+        report["status_label"] = "New" if report["status"] == 0 else "Checked"
+    if with_snippet:
+        report["snippet"] = report_search.highlight(row["snippet"])
+    return report
+
+
 @report_bp.get("/report")
 def get_reports():
     conn = get_db()
     search = request.args.get("search", "").strip()
     start = request.args.get("start", "").strip()
     end = request.args.get("end", "").strip()
+    cursor = request.args.get("cursor", "").strip()
+    stream = request.args.get("format", "json").lower() == "ndjson"
 
-    # Updated query to include the image_filename
-    query = """
-        SELECT id, drug_name, batch_number, location, note, image_filename, reported_on, status
-        FROM reports
-        WHERE 1=1
-    """
-    params = []
+    fields = [f.strip() for f in request.args.get("fields", "").split(",") if f.strip()] or list(DEFAULT_REPORT_FIELDS)
+    unknown = [f for f in fields if f not in REPORT_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+    max_page = current_app.config.get("REPORT_PAGE_SIZE_MAX", 500)
+    limit = request.args.get("limit", type=int)
+    if limit is None and not stream:
+        limit = current_app.config.get("REPORT_PAGE_SIZE", 50)
+    if limit is not None and not stream:
+        limit = max(1, min(limit, max_page))
+
+    match = report_search.build_match_query(search) if search and report_search.FTS5_AVAILABLE else None
+    ranked = match is not None and request.args.get("sort", "rank") != "recent"
+
+    columns = ", ".join(REPORT_FIELD_SQL.get(c, f"r.{c}") for c in dict.fromkeys(fields + ["id", "reported_on_epoch"]))
+    if match:
+        columns += f", {report_search.RANK_EXPRESSION} AS score, {report_search.SNIPPET_EXPRESSION} AS snippet"
+        query = f"""
+            SELECT {columns}
+            FROM reports_fts
+            JOIN reports r ON r.id = reports_fts.rowid
+            WHERE reports_fts MATCH ?
+        """
+        params = [match]
+    else:
+        query = f"""
+            SELECT {columns}
+            FROM reports r
+            WHERE 1=1
+        """
+        params = []
+        if search:
+            query += " AND (r.drug_name LIKE ? OR r.batch_number LIKE ? OR r.location LIKE ? OR r.note LIKE ?)"
+            params.extend([f"%{search}%"] * 4)
 
-    if search:
-        query += " AND (drug_name LIKE ? OR batch_number LIKE ? OR location LIKE ? OR note LIKE ?)"
-        params.extend([f"%{search}%"] * 4)
+    if request.args.get("duplicates") == "collapse":
+        query += " AND r.cluster_id IS NULL"
 
     if start and end:
-        query += " AND date(reported_on) BETWEEN date(?) AND date(?)"
-        params.extend([start, end])
+        try:
+            params.extend(epoch_day_range(start, end))
+        except ValueError:
+            return jsonify({"error": "start and end must be dates in YYYY-MM-DD format"}), 400
+        query += " AND r.reported_on_epoch >= ? AND r.reported_on_epoch < ?"
 
-    query += " ORDER BY reported_on DESC"
+    if cursor:
+        try:
+            params.extend(decode_cursor(cursor, float, int) if ranked else decode_cursor(cursor, int, int))
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+        if ranked:
+            query += f" AND ({report_search.RANK_EXPRESSION}, r.id) > (?, ?)"
+        else:
+            query += " AND (r.reported_on_epoch, r.id) < (?, ?)"
 
-    rows = conn.execute(query, params).fetchall()
+    if ranked:
+        query += " ORDER BY score, r.id"
+    else:
+        query += " ORDER BY r.reported_on_epoch DESC, r.id DESC"
 
-    reports = [dict(row) for row in rows]
-    for report in reports:
-        report["status_label"] = "New" if report["status"] == 0 else "Checked"
+    if stream:
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(max(1, limit))
+
+        def generate():
+            # The request's connection is closed when the view returns, so the
+            # stream opens its own for as long as it runs.
+            rows = get_db().execute(query, params)
+            while True:
+                batch = rows.fetchmany(STREAM_FETCH_SIZE)
+                if not batch:
+                    break
+                yield "".join(json.dumps(_report_row(row, fields, match is not None), default=str) + "\n"
+                              for row in batch)
 
-    return jsonify(reports)
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    rows = conn.execute(query + " LIMIT ?", params + [limit + 1]).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = (encode_cursor(last["score"], last["id"]) if ranked
+                       else encode_cursor(last["reported_on_epoch"], last["id"]))
+
+    return jsonify({
+        "reports": [_report_row(row, fields, match is not None) for row in rows],
+        "next_cursor": next_cursor,
+    })
 
 
 # =========================
@@ -130,14 +287,48 @@ def update_report_status(report_id):
         return jsonify({"error": "An internal server error occurred."}), 500
 
 
+# =========================
+# POST: Update or delete many reports at once
+# =========================
+@report_bp.post("/report/bulk")
+def bulk_moderate_reports():
+    """
+    Body: {"action": "status"|"delete", "status": "...", "ids": [...]}, or
+    "filter": {...} with the dashboard's filters instead of ids. See
+    backend/moderation.py.
+    """
+    # backend.moderation imports dashboard_queries, which imports this module.
+    from backend.moderation import ModerationError, moderate
+
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+    try:
+        return jsonify(moderate(get_db(), "reports", request.get_json(silent=True) or {}))
+    except ModerationError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    except Exception as e:
+        print(f"Error in bulk report moderation: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
+
+
 # =========================
 # GET: Count of New reports (for notification badge)
 # =========================
 @report_bp.get("/report/count")
 def count_new_reports():
-    conn = get_db()
-    row = conn.execute("SELECT COUNT(*) as count FROM reports WHERE status = 0").fetchone()
-    return jsonify({"count": row["count"] if row else 0})
+    return jsonify({"count": new_count(get_db())})
+
+# =========================
+# GET: The near-duplicate cluster a report belongs to
+# =========================
+@report_bp.get("/report/<int:report_id>/cluster")
+def report_cluster(report_id):
+    if not session.get("admin_id"):
+        return jsonify({"error": "Authentication required"}), 401
+    rows = get_cluster(get_db(), report_id)
+    if rows is None:
+        return jsonify({"error": "Report not found"}), 404
+    return jsonify({"primary_id": rows[0]["id"], "reports": [dict(row) for row in rows]})
 
 # =========================
 # NEW: Delete a specific report
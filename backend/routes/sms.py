@@ -1,6 +1,7 @@
 from flask import Blueprint, request
 from twilio.twiml.messaging_response import MessagingResponse
 from backend.database import get_db
+from backend.drug_cache import lookup_drug
 from datetime import datetime
 
 sms_bp = Blueprint("sms_api", __name__)
@@ -22,10 +23,7 @@ def sms_reply():
 
     # --- Database Lookup Logic ---
     conn = get_db()
-    row = conn.execute(
-        "SELECT name, expiry_date, manufacturer FROM drugs WHERE batch_number = ?",
-        (batch_number,)
-    ).fetchone()
+    row = lookup_drug(conn, batch_number)
 
     if not row:
         reply_msg = f"MedGuard: Batch '{batch_number}' not found. This drug may be counterfeit. Please report it."
@@ -0,0 +1,221 @@
+import hmac
+from datetime import datetime
+from flask import Blueprint, request, jsonify, session, current_app
+from backend.config import get_config
+from backend.database import get_db
+from backend.rate_limit import RateLimiter, retry_after
+from backend.scan_log_writer import scan_log_writer
+from backend.routes.verify import resolve_scan
+from backend.qr_utils import parse_scanned_data
+
+verify_api_bp = Blueprint("verify_api", __name__)
+
+cfg = get_config()
+bulk_verify_limiter = RateLimiter(cfg.BULK_VERIFY_RATE_ITEMS, cfg.BULK_VERIFY_RATE_WINDOW)
+
+# SQLite's default limit on bound parameters is 999 on older builds.
+IN_CHUNK_SIZE = 500
+
+
+def chunked(items, size=IN_CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def expiry_status(expiry_date, today=None):
+    """Return 'valid', 'expired' or 'invalid_expiry' for a stored expiry date string."""
+    today = today or datetime.today().date()
+    try:
+        expiry = datetime.strptime(str(expiry_date), "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return "invalid_expiry"
+    return "expired" if expiry < today else "valid"
+
+
+def bulk_client():
+    """
+    The rate-limit key of an allowed bulk caller: a signed-in user or regulator,
+    or a valid X-API-Key. None for anyone else.
+    """
+    if session.get("admin_id"):
+        return f"admin:{session['admin_id']}"
+    if session.get("user_id"):
+        return f"user:{session['user_id']}"
+    api_key = request.headers.get("X-API-Key", "")
+    for allowed in current_app.config.get("BULK_VERIFY_API_KEYS") or ():
+        if api_key and hmac.compare_digest(api_key, allowed):
+            return f"key:{allowed}"
+    return None
+
+
+def fetch_drugs(conn, batch_numbers):
+    """Resolve many batch numbers with chunked IN queries. Returns {batch_number: row}."""
+    drugs = {}
+    for chunk in chunked(batch_numbers):
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+            f"""
+            SELECT id, name, batch_number, mfg_date, expiry_date, manufacturer
+            FROM drugs WHERE batch_number IN ({placeholders})
+            """,
+            chunk
+        ):
+            drugs[row["batch_number"]] = row
+    return drugs
+
+
+def fetch_report_counts(conn, batch_numbers):
+    """Counterfeit report counts for many batch numbers. Returns {batch_number: count}."""
+    counts = {}
+    for chunk in chunked(batch_numbers):
+        placeholders = ",".join("?" * len(chunk))
+        for batch_number, count in conn.execute(
+            f"""
+            SELECT batch_number, COUNT(*) FROM reports
+            WHERE batch_number IN ({placeholders}) AND cluster_id IS NULL
+            GROUP BY batch_number
+            """,
+            chunk
+        ):
+            counts[batch_number] = count
+    return counts
+
+
+# =========================
+# POST: Bulk inventory verification
+# =========================
+@verify_api_bp.post("/verify/bulk")
+def bulk_verify():
+    """
+    Verify a whole shelf of products in one request.
+    Body: {"batch_numbers": ["BATCH-1", "BATCH-2", ...]}
+    Audit scans are written to scan_logs in one bulk insert. They do not feed
+    the per-scan clone detection on the verify page.
+
+    Only signed-in users and holders of a BULK_VERIFY_API_KEYS key may call it,
+    and each is limited to BULK_VERIFY_RATE_ITEMS batch numbers per
+    BULK_VERIFY_RATE_WINDOW seconds (429 with Retry-After beyond that).
+    """
+    client = bulk_client()
+    if client is None:
+        return jsonify({"error": "Sign in or send a valid X-API-Key to use bulk verification"}), 401
+
+    data = request.get_json(silent=True) or {}
+    batch_numbers = data.get("batch_numbers")
+    if not isinstance(batch_numbers, list) or not batch_numbers:
+        return jsonify({"error": "batch_numbers must be a non-empty list"}), 400
+
+    max_items = current_app.config.get("BULK_VERIFY_MAX_ITEMS", 5000)
+    if len(batch_numbers) > max_items:
+        return jsonify({"error": f"At most {max_items} batch numbers can be verified per request"}), 413
+
+    # Keep the caller's order, drop blanks and duplicates.
+    unique = list(dict.fromkeys(str(b).strip() for b in batch_numbers if str(b).strip()))
+
+    wait = bulk_verify_limiter.take(client, len(unique))
+    if wait:
+        response = jsonify({"error": "Too many batch numbers verified recently; try again later"})
+        response.headers["Retry-After"] = retry_after(wait)
+        return response, 429
+
+    conn = get_db()
+    drugs = fetch_drugs(conn, unique)
+    report_counts = fetch_report_counts(conn, unique)
+
+    today = datetime.today().date()
+    results = []
+    summary = {}
+    for batch_number in unique:
+        row = drugs.get(batch_number)
+        if row:
+            status = expiry_status(row["expiry_date"], today)
+            drug = {
+                "id": row["id"],
+                "name": row["name"],
+                "manufacturer": row["manufacturer"],
+                "mfg_date": row["mfg_date"],
+                "expiry_date": row["expiry_date"],
+            }
+        else:
+            status = "notfound"
+            drug = None
+        summary[status] = summary.get(status, 0) + 1
+        results.append({
+            "batch_number": batch_number,
+            "registered": row is not None,
+            "status": status,
+            "drug": drug,
+            "report_count": report_counts.get(batch_number, 0),
+        })
+
+    ip_address = request.remote_addr
+    user_id = session.get("user_id")
+    scan_log_writer.write_bulk(
+        (batch_number, None, None, None, ip_address, user_id) for batch_number in unique
+    )
+
+    return jsonify({
+        "count": len(results),
+        "summary": summary,
+        "results": results,
+        "verified_on": datetime.now().isoformat(timespec="seconds"),
+    })
+
+
+# =========================
+# GET: Compact JSON verification for mobile scanner apps (v1)
+# =========================
+@verify_api_bp.get("/v1/verify/<path:scanned_data>")
+def verify_v1(scanned_data):
+    """
+    Same lookup as the /verify page (scan log, clone checks, EMDEX fallback)
+    without the HTML render or the ledger history.
+
+    Example: {"status": "valid", "batch_number": "AMX-001", "anomaly": false,
+              "product": {"name": ..., "manufacturer": ..., "mfg_date": ..., "expiry_date": ...}}
+
+    Every scan must reach the server to be logged, so responses are
+    `private, no-cache`. The ETag lets the app revalidate and get an empty 304
+    while the product, its status and the anomaly flag are unchanged.
+
+    A signed code whose tag does not match is answered with
+    {"status": "invalid_signature"} before any database access. That answer
+    never changes, so it may be cached.
+    """
+    data, signature = parse_scanned_data(scanned_data.strip())
+    if signature is False:
+        response = jsonify({"status": "invalid_signature", "batch_number": data, "anomaly": False})
+        response.headers["Cache-Control"] = "public, max-age=86400"
+        return response
+
+    conn = get_db()
+    result = resolve_scan(
+        conn, data,
+        request.args.get("lat", type=float), request.args.get("lon", type=float),
+        ip_address=request.remote_addr, user_id=session.get("user_id"),
+    )
+
+    body = {
+        "status": result["status"],
+        "batch_number": data,
+        "anomaly": bool(result["anomaly_warning"]),
+    }
+    row = result["batch"]
+    public_data = result["public_data"]
+    if row:
+        body["product"] = {
+            "name": row["name"],
+            "manufacturer": row["manufacturer"],
+            "mfg_date": row["mfg_date"],
+            "expiry_date": row["expiry_date"],
+        }
+    elif public_data:
+        body["product"] = {
+            "name": public_data.get("drug_name"),
+            "manufacturer": public_data.get("manufacturer"),
+        }
+
+    response = jsonify(body)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.add_etag()
+    return response.make_conditional(request)
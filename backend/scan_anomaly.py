@@ -0,0 +1,274 @@
+# backend/scan_anomaly.py
+
+# =============================================================================
+# S C A N   A N O M A L Y   S T A T E
+# =============================================================================
+# Incrementally maintained per-batch state used to flag cloned QR codes of
+# registered batches (unregistered codes are not tracked, so they cannot grow it):
+#
+#   - a sliding one-hour scan counter, kept as 60 one-minute buckets in a ring
+#   - the total number of scans ever seen for the batch
+#   - the time and location of the most recent scan
+#
+# Each scan updates the state in O(1), so neither check needs to read the
+# batch's scan history. The state lives in memory per worker and is persisted to
+# the compact `scan_anomaly_state` table in the same transaction as the buffered
+# scan_logs rows (see backend/scan_log_writer.py). Workers only persist their
+# own deltas, and reload a batch's row at most every ANOMALY_STATE_REFRESH
+# seconds, so counts converge across gunicorn workers.
+#
+# The hourly window has one-minute resolution: it covers the current minute and
+# the 59 before it.
+# =============================================================================
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from math import radians, sin, cos, sqrt, atan2
+
+from backend.config import get_config
+from backend.scan_log_writer import scan_log_writer
+from backend.scan_rollups import total_scans
+
+cfg = get_config()
+
+WINDOW_MINUTES = 60
+MAX_SCANS_PER_HOUR = 50
+MAX_PLAUSIBLE_SPEED_KMH = 900
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Calculate the distance between two points on Earth."""
+    R = 6371
+    dLat, dLon = radians(lat2 - lat1), radians(lon2 - lon1)
+    a = sin(dLat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dLon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+
+def evaluate_scan(total_scans, scans_last_hour, previous, latest):
+    """
+    Decide whether the latest scan looks suspicious.
+    `previous` and `latest` are (timestamp, latitude, longitude) tuples, timestamps in epoch seconds.
+    """
+    if total_scans < 2:
+        return None
+
+    if scans_last_hour > MAX_SCANS_PER_HOUR:
+        return f"This code has been scanned an unusually high number of times ({scans_last_hour} times in the last hour)."
+
+    if previous and latest and latest[1] is not None and previous[1] is not None:
+        distance = haversine(latest[1], latest[2], previous[1], previous[2])
+        hours = (latest[0] - previous[0]) / 3600
+
+        if hours > 0:
+            speed = distance / hours
+            if speed > MAX_PLAUSIBLE_SPEED_KMH:
+                return (f"This code was recently scanned in two locations that are too far apart to be plausible "
+                        f"({int(distance)} km apart in {int(hours*60)} minutes). This suggests the code has been cloned.")
+
+    return None
+
+
+class BatchState:
+    """Persisted base state of one batch plus the deltas this worker has not written yet."""
+
+    __slots__ = ("total", "head_minute", "buckets", "last", "pending_total",
+                 "pending_minutes", "pending_last", "loaded_at")
+
+    def __init__(self, total=0, head_minute=0, buckets=None, last=None):
+        self.total = total
+        self.head_minute = head_minute
+        self.buckets = buckets if buckets is not None else array("I", [0] * WINDOW_MINUTES)
+        self.last = last
+        self.pending_total = 0
+        self.pending_minutes = {}
+        self.pending_last = None
+        self.loaded_at = time.monotonic()
+
+    @property
+    def dirty(self):
+        return self.pending_total > 0
+
+    def window_count(self, now_minute):
+        oldest = now_minute - WINDOW_MINUTES
+        count = sum(n for m, n in self.pending_minutes.items() if m > oldest)
+        for m in range(max(self.head_minute - WINDOW_MINUTES + 1, oldest + 1), self.head_minute + 1):
+            count += self.buckets[m % WINDOW_MINUTES]
+        return count
+
+
+def _advance(buckets, head_minute, minute):
+    """Move the ring forward to `minute`, clearing buckets that fell out of the window."""
+    if minute <= head_minute:
+        return head_minute
+    for m in range(max(head_minute + 1, minute - WINDOW_MINUTES + 1), minute + 1):
+        buckets[m % WINDOW_MINUTES] = 0
+    return minute
+
+
+class ScanAnomalyTracker:
+    """Per-worker map of batch number -> BatchState, bounded with LRU eviction."""
+
+    def __init__(self, max_entries: int, refresh_interval: float):
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self._states: "OrderedDict[str, BatchState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- Loading ---------------------------------------------------------------
+    def _load(self, conn, batch_number):
+        row = conn.execute(
+            """
+            SELECT total_scans, head_minute, buckets, last_scanned_at, last_latitude, last_longitude
+            FROM scan_anomaly_state WHERE batch_number = ?
+            """,
+            (batch_number,)
+        ).fetchone()
+        if row:
+            buckets = array("I")
+            buckets.frombytes(bytes(row[2]))
+            last = (row[3], row[4], row[5]) if row[3] is not None else None
+            return BatchState(row[0], row[1], buckets, last)
+        return self._bootstrap_from_logs(conn, batch_number)
+
+    def _bootstrap_from_logs(self, conn, batch_number):
+        """Build the initial state for a batch that has no state row yet (e.g. right after upgrading)."""
+        total = total_scans(conn, batch_number)
+        state = BatchState()
+        if not total:
+            return state
+        state.total = total
+        for minute, count in conn.execute(
+            """
+            SELECT scanned_at_epoch / 60 AS minute, COUNT(*)
+            FROM scan_logs
+            WHERE batch_number = ? AND scanned_at_epoch >= CAST(strftime('%s', 'now') AS INTEGER) - 3600
+            GROUP BY minute
+            """,
+            (batch_number,)
+        ):
+            state.head_minute = _advance(state.buckets, state.head_minute, minute)
+            state.buckets[minute % WINDOW_MINUTES] += count
+        last = conn.execute(
+            """
+            SELECT scanned_at_epoch, latitude, longitude
+            FROM scan_logs WHERE batch_number = ? ORDER BY scanned_at_epoch DESC, id DESC LIMIT 1
+            """,
+            (batch_number,)
+        ).fetchone()
+        if last:
+            state.last = tuple(last)
+        return state
+
+    def _get(self, conn, batch_number):
+        state = self._states.get(batch_number)
+        if state is not None and (state.dirty or time.monotonic() - state.loaded_at < self.refresh_interval):
+            self._states.move_to_end(batch_number)
+            return state
+        fresh = self._load(conn, batch_number)
+        if state is not None:
+            fresh.pending_total = state.pending_total
+            fresh.pending_minutes = state.pending_minutes
+            fresh.pending_last = state.pending_last
+        self._states[batch_number] = fresh
+        self._states.move_to_end(batch_number)
+        self._evict()
+        return fresh
+
+    def _evict(self):
+        if len(self._states) <= self.max_entries:
+            return
+        for batch_number in list(self._states):
+            if len(self._states) <= self.max_entries:
+                break
+            if not self._states[batch_number].dirty:
+                del self._states[batch_number]
+
+    # --- Recording -------------------------------------------------------------
+    def record(self, conn, batch_number, latitude=None, longitude=None, now=None):
+        """Account for one scan and return an anomaly warning string, or None."""
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        latest = (now, latitude, longitude)
+        with self._lock:
+            state = self._get(conn, batch_number)
+            previous = state.pending_last or state.last
+            state.pending_total += 1
+            state.pending_minutes[minute] = state.pending_minutes.get(minute, 0) + 1
+            state.pending_last = latest
+            total = state.total + state.pending_total
+            scans_last_hour = state.window_count(minute)
+        return evaluate_scan(total, scans_last_hour, previous, latest)
+
+    # --- Persistence -----------------------------------------------------------
+    def persist(self, conn):
+        """
+        Merge this worker's pending deltas into `scan_anomaly_state`.
+        Called by the scan log writer inside its transaction, before the rows are inserted.
+        """
+        with self._lock:
+            work = []
+            for batch_number, state in self._states.items():
+                if state.dirty:
+                    work.append((batch_number, state.pending_total, state.pending_minutes, state.pending_last))
+                    state.pending_total, state.pending_minutes, state.pending_last = 0, {}, None
+        if not work:
+            return
+
+        try:
+            merged = {}
+            for batch_number, delta_total, delta_minutes, delta_last in work:
+                base = self._load(conn, batch_number)
+                base.total += delta_total
+                for minute in sorted(delta_minutes):
+                    if minute <= base.head_minute - WINDOW_MINUTES:
+                        continue
+                    base.head_minute = _advance(base.buckets, base.head_minute, minute)
+                    base.buckets[minute % WINDOW_MINUTES] += delta_minutes[minute]
+                if base.last is None or delta_last[0] >= base.last[0]:
+                    base.last = delta_last
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO scan_anomaly_state
+                        (batch_number, total_scans, head_minute, buckets,
+                         last_scanned_at, last_latitude, last_longitude)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (batch_number, base.total, base.head_minute, base.buckets.tobytes(),
+                     base.last[0], base.last[1], base.last[2])
+                )
+                merged[batch_number] = base
+        except Exception:
+            # Put the deltas back so the next flush retries them.
+            with self._lock:
+                for batch_number, delta_total, delta_minutes, delta_last in work:
+                    state = self._states.setdefault(batch_number, BatchState())
+                    state.pending_total += delta_total
+                    for minute, count in delta_minutes.items():
+                        state.pending_minutes[minute] = state.pending_minutes.get(minute, 0) + count
+                    if state.pending_last is None:
+                        state.pending_last = delta_last
+            raise
+
+        with self._lock:
+            for batch_number, base in merged.items():
+                state = self._states.get(batch_number)
+                if state is not None:
+                    base.pending_total = state.pending_total
+                    base.pending_minutes = state.pending_minutes
+                    base.pending_last = state.pending_last
+                self._states[batch_number] = base
+
+
+anomaly_tracker = ScanAnomalyTracker(
+    max_entries=cfg.ANOMALY_STATE_MAX_ENTRIES,
+    refresh_interval=cfg.ANOMALY_STATE_REFRESH,
+)
+scan_log_writer.add_flush_hook(anomaly_tracker.persist)
+
+
+def record_scan(conn, batch_number, latitude=None, longitude=None):
+    """Update the batch's anomaly state for a new scan and return a warning message, if any."""
+    return anomaly_tracker.record(conn, batch_number, latitude, longitude)
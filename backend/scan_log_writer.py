@@ -0,0 +1,221 @@
+# backend/scan_log_writer.py
+
+# =============================================================================
+# S C A N   L O G   W R I T E R   (group commit)
+# =============================================================================
+# Scan logging is the highest-volume write in MedGuard. Instead of one
+# INSERT + COMMIT (and one fsync) per scan, each worker buffers rows in a
+# bounded in-memory queue and a background thread writes them with a single
+# `executemany` per transaction.
+#
+#   - A batch is flushed when SCAN_LOG_BATCH_SIZE rows are waiting, or when the
+#     oldest waiting row is SCAN_LOG_MAX_LATENCY_MS old. That latency is also the
+#     maximum data-loss window if the worker is killed without a clean shutdown.
+#   - When the queue is full the caller is slowed down (backpressure): it waits up
+#     to SCAN_LOG_PUT_TIMEOUT_MS and then flushes the queue itself.
+#   - Pending rows are flushed on interpreter exit and from gunicorn's
+#     `worker_exit` hook.
+#   - Flush hooks (e.g. the scan anomaly state) run inside the same transaction,
+#     just before the rows are inserted.
+# =============================================================================
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from backend.config import get_config
+
+cfg = get_config()
+
+INSERT_SQL = """
+    INSERT INTO scan_logs (batch_number, scanned_at, latitude, longitude, ip_address, user_id)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+MAX_RETRIES = 3
+RETRY_DELAY = 0.3  # seconds
+
+
+class ScanLogWriter:
+    """Buffers scan_logs rows and writes them in group-committed batches."""
+
+    def __init__(self, db_path, batch_size: int, max_latency_ms: int,
+                 queue_size: int, put_timeout_ms: int):
+        self.db_path = db_path
+        self.batch_size = max(batch_size, 1)
+        self.max_latency = max_latency_ms / 1000.0
+        self.put_timeout = put_timeout_ms / 1000.0
+        self.queue_size = queue_size
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._flush_hooks = []
+        self._reset()
+
+    def _reset(self):
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._conn = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._pid = os.getpid()
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "dropped": 0, "backpressure": 0}
+
+    # --- Lifecycle -------------------------------------------------------------
+    def _ensure_started(self):
+        # gunicorn forks workers after import, so the thread and connection
+        # are created lazily and recreated if we find ourselves in a new process.
+        # A thread that died is replaced, so the queue never fills up unserved.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if self._stopping.is_set():
+                return
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="scan-log-writer", daemon=True)
+                self._thread.start()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Stop the background thread and write everything still queued."""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def add_flush_hook(self, hook):
+        """Register `hook(conn)` to run inside every flush transaction."""
+        self._flush_hooks.append(hook)
+
+    # --- Producer side ---------------------------------------------------------
+    def log(self, batch_number, ip_address=None, user_id=None, latitude=None, longitude=None,
+            scanned_at=None):
+        """Queue a single scan for writing. `scanned_at` defaults to now (UTC, like CURRENT_TIMESTAMP)."""
+        self.log_many([(batch_number, scanned_at, latitude, longitude, ip_address, user_id)])
+
+    def log_many(self, rows):
+        """Queue several (batch_number, scanned_at, latitude, longitude, ip_address, user_id) rows."""
+        self._ensure_started()
+        now = _utc_timestamp()
+        for batch_number, scanned_at, latitude, longitude, ip_address, user_id in rows:
+            item = (batch_number, scanned_at or now, latitude, longitude, ip_address, user_id)
+            try:
+                self._queue.put(item, timeout=self.put_timeout)
+            except queue.Full:
+                # Backpressure: the writer is behind, so this request pays for a flush.
+                self.stats["backpressure"] += 1
+                self.flush()
+                self._queue.put(item)
+            self.stats["enqueued"] += 1
+
+    def write_bulk(self, rows):
+        """
+        Write many rows right away in a single transaction, bypassing the queue.
+        Used by bulk endpoints whose rows would otherwise span several group commits.
+        """
+        now = _utc_timestamp()
+        rows = [(batch_number, scanned_at or now, latitude, longitude, ip_address, user_id)
+                for batch_number, scanned_at, latitude, longitude, ip_address, user_id in rows]
+        if rows:
+            self.stats["enqueued"] += len(rows)
+            self._write(rows)
+
+    def flush(self):
+        """Synchronously write every row currently in the queue."""
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            self._write(rows)
+
+    # --- Consumer side ---------------------------------------------------------
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            rows = [first]
+            deadline = time.monotonic() + self.max_latency
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(rows)
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL;")
+        return self._conn
+
+    def _write(self, rows):
+        with self._write_lock:
+            for attempt in range(MAX_RETRIES):
+                try:
+                    conn = self._connect()
+                    with conn:
+                        # sqlite3 does not BEGIN before a SAVEPOINT: the first
+                        # one would open the transaction and its RELEASE would
+                        # commit the hook's writes apart from the rows.
+                        conn.execute("BEGIN IMMEDIATE")
+                        for hook in self._flush_hooks:
+                            conn.execute("SAVEPOINT flush_hook")
+                            try:
+                                hook(conn)
+                            except Exception as e:
+                                conn.execute("ROLLBACK TO flush_hook")
+                                print(f"ERROR: Scan log flush hook {hook.__qualname__} failed - {e}")
+                            conn.execute("RELEASE flush_hook")
+                        conn.executemany(INSERT_SQL, rows)
+                    self.stats["written"] += len(rows)
+                    self.stats["batches"] += 1
+                    return
+                except sqlite3.OperationalError as e:
+                    if "locked" in str(e).lower() and attempt < MAX_RETRIES - 1:
+                        time.sleep(RETRY_DELAY)
+                        continue
+                    self.stats["dropped"] += len(rows)
+                    print(f"ERROR: Failed to write {len(rows)} scan log rows - {e}")
+                    return
+                except Exception as e:
+                    # e.g. an IntegrityError from one row: the batch is rolled
+                    # back as a whole. Never let it escape into the writer thread.
+                    self.stats["dropped"] += len(rows)
+                    print(f"ERROR: Failed to write {len(rows)} scan log rows - {e}")
+                    return
+
+
+def _utc_timestamp() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+scan_log_writer = ScanLogWriter(
+    db_path=cfg.DB_PATH,
+    batch_size=cfg.SCAN_LOG_BATCH_SIZE,
+    max_latency_ms=cfg.SCAN_LOG_MAX_LATENCY_MS,
+    queue_size=cfg.SCAN_LOG_QUEUE_SIZE,
+    put_timeout_ms=cfg.SCAN_LOG_PUT_TIMEOUT_MS,
+)
+atexit.register(scan_log_writer.shutdown)
+
+
+def log_scan(batch_number, ip_address=None, user_id=None, latitude=None, longitude=None):
+    """Queue one scan_logs row; it is committed within SCAN_LOG_MAX_LATENCY_MS."""
+    scan_log_writer.log(batch_number, ip_address=ip_address, user_id=user_id,
+                        latitude=latitude, longitude=longitude)
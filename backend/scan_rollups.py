@@ -0,0 +1,322 @@
+# backend/scan_rollups.py
+
+# =============================================================================
+# S C A N   L O G   R O L L U P S   A N D   R E T E N T I O N
+# =============================================================================
+# `scan_logs` gets one row per scan. This module summarizes those rows per
+# batch into hourly and daily rollups, then prunes the raw rows:
+#
+#   - scan_rollups_hourly / scan_rollups_daily hold, per (batch, period), the
+#     scan count, the number of distinct IPs and the bounding box of the scan
+#     locations.
+#   - Rollups are maintained incrementally. `scan_rollup_state` keeps a
+#     high-water mark on scan_logs.id and each pass only aggregates rows above
+#     it, in chunks of SCAN_ROLLUP_CHUNK rows. SQLite serializes writers, so ids
+#     become visible in order and no row is skipped or counted twice.
+#   - Distinct IPs are exact: the IPs seen in each open period are kept in
+#     `scan_rollup_ips` until the period passes the raw-row retention.
+#   - Retention deletes raw rows older than SCAN_LOG_RETENTION_DAYS, and hourly
+#     rollups older than SCAN_ROLLUP_HOURLY_RETENTION_DAYS, in small
+#     transactions. Only rows that are already rolled up are deleted. Daily
+#     rollups are kept. SQLite reuses the freed pages, so the file stops growing.
+#
+# Each worker rolls up one chunk at most every SCAN_ROLLUP_INTERVAL seconds,
+# as a flush hook of the scan log writer. Purging runs from cron:
+#
+#   python -m backend.scan_rollups rollup   # catch up on every pending row
+#   python -m backend.scan_rollups purge    # roll up, then apply retention
+#   python -m backend.scan_rollups status
+# =============================================================================
+
+import sqlite3
+import sys
+import threading
+import time
+
+from backend.config import get_config
+from backend.scan_log_writer import scan_log_writer
+
+cfg = get_config()
+
+HOUR = 3600
+DAY = 86400
+
+# granularity -> (table, period length in seconds)
+ROLLUPS = {
+    "hourly": ("scan_rollups_hourly", HOUR),
+    "daily": ("scan_rollups_daily", DAY),
+}
+
+HIGH_WATER_MARK = "scan_logs.id"
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS scan_rollup_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scan_rollup_ips (
+        granularity TEXT NOT NULL,
+        period_start INTEGER NOT NULL,
+        batch_number TEXT NOT NULL,
+        ip_address TEXT NOT NULL,
+        PRIMARY KEY (granularity, period_start, batch_number, ip_address)
+    ) WITHOUT ROWID
+    """,
+] + [
+    f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        batch_number TEXT NOT NULL,
+        period_start INTEGER NOT NULL,
+        scans INTEGER NOT NULL,
+        distinct_ips INTEGER NOT NULL DEFAULT 0,
+        min_latitude REAL,
+        max_latitude REAL,
+        min_longitude REAL,
+        max_longitude REAL,
+        PRIMARY KEY (batch_number, period_start)
+    ) WITHOUT ROWID
+    """
+    for table, _ in ROLLUPS.values()
+] + [
+    f"CREATE INDEX IF NOT EXISTS idx_{table}_period ON {table} (period_start)"
+    for table, _ in ROLLUPS.values()
+]
+
+
+def init_rollups(conn):
+    """Create the rollup tables (called from init_db)."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def high_water_mark(conn):
+    row = conn.execute("SELECT value FROM scan_rollup_state WHERE name = ?", (HIGH_WATER_MARK,)).fetchone()
+    return row[0] if row else 0
+
+
+# --- Incremental rollup ----------------------------------------------------------
+
+def rollup_chunk(conn, chunk_size=None):
+    """
+    Aggregate the next chunk of scan_logs rows above the high-water mark into the
+    rollups and advance the mark. Runs in the caller's transaction.
+    Returns the number of raw rows rolled up.
+    """
+    chunk_size = chunk_size or cfg.SCAN_ROLLUP_CHUNK
+    low = high_water_mark(conn)
+    count, high = conn.execute(
+        "SELECT COUNT(*), MAX(id) FROM (SELECT id FROM scan_logs WHERE id > ? ORDER BY id LIMIT ?)",
+        (low, chunk_size)
+    ).fetchone()
+    if not count:
+        return 0
+
+    for granularity, (table, seconds) in ROLLUPS.items():
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO scan_rollup_ips (granularity, period_start, batch_number, ip_address)
+            SELECT DISTINCT ?, scanned_at_epoch - scanned_at_epoch % ?, batch_number, ip_address
+            FROM scan_logs
+            WHERE id > ? AND id <= ? AND ip_address IS NOT NULL AND scanned_at_epoch IS NOT NULL
+            """,
+            (granularity, seconds, low, high)
+        )
+        conn.execute(
+            f"""
+            INSERT INTO {table} (batch_number, period_start, scans, distinct_ips,
+                                 min_latitude, max_latitude, min_longitude, max_longitude)
+            SELECT batch_number, scanned_at_epoch - scanned_at_epoch % ? AS period, COUNT(*), 0,
+                   MIN(latitude), MAX(latitude), MIN(longitude), MAX(longitude)
+            FROM scan_logs
+            WHERE id > ? AND id <= ? AND scanned_at_epoch IS NOT NULL
+            GROUP BY batch_number, period
+            ON CONFLICT (batch_number, period_start) DO UPDATE SET
+                scans = scans + excluded.scans,
+                min_latitude = COALESCE(MIN(min_latitude, excluded.min_latitude), min_latitude, excluded.min_latitude),
+                max_latitude = COALESCE(MAX(max_latitude, excluded.max_latitude), max_latitude, excluded.max_latitude),
+                min_longitude = COALESCE(MIN(min_longitude, excluded.min_longitude), min_longitude, excluded.min_longitude),
+                max_longitude = COALESCE(MAX(max_longitude, excluded.max_longitude), max_longitude, excluded.max_longitude)
+            """,
+            (seconds, low, high)
+        )
+        conn.execute(
+            f"""
+            UPDATE {table} SET distinct_ips = (
+                SELECT COUNT(*) FROM scan_rollup_ips i
+                WHERE i.granularity = ? AND i.period_start = {table}.period_start
+                  AND i.batch_number = {table}.batch_number
+            )
+            WHERE (batch_number, period_start) IN (
+                SELECT DISTINCT batch_number, scanned_at_epoch - scanned_at_epoch % ?
+                FROM scan_logs WHERE id > ? AND id <= ? AND scanned_at_epoch IS NOT NULL
+            )
+            """,
+            (granularity, seconds, low, high)
+        )
+
+    conn.execute(
+        "INSERT OR REPLACE INTO scan_rollup_state (name, value) VALUES (?, ?)",
+        (HIGH_WATER_MARK, high)
+    )
+    return count
+
+
+def rollup(conn, chunk_size=None):
+    """Roll up every pending row, one committed transaction per chunk. Returns the row count."""
+    total = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = rollup_chunk(conn, chunk_size)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        total += count
+        if not count:
+            return total
+
+
+_last_rollup = 0.0
+_rollup_lock = threading.Lock()
+
+
+def rollup_hook(conn):
+    """
+    Scan log writer flush hook: roll up one chunk at most every SCAN_ROLLUP_INTERVAL
+    seconds. A full chunk means there is a backlog, so the next flush continues it.
+    """
+    global _last_rollup
+    if time.monotonic() - _last_rollup < cfg.SCAN_ROLLUP_INTERVAL:
+        return
+    with _rollup_lock:
+        chunk_size = cfg.SCAN_ROLLUP_CHUNK
+        if rollup_chunk(conn, chunk_size) < chunk_size:
+            _last_rollup = time.monotonic()
+
+
+scan_log_writer.add_flush_hook(rollup_hook)
+
+
+# --- Retention -------------------------------------------------------------------
+
+def _delete_periods(conn, table, cutoff, where=""):
+    """Delete whole periods older than `cutoff` from a rollup table, one period per transaction."""
+    deleted = 0
+    while True:
+        period = conn.execute(
+            f"SELECT MIN(period_start) FROM {table} WHERE period_start < ? {where}", (cutoff,)
+        ).fetchone()[0]
+        if period is None:
+            return deleted
+        deleted += conn.execute(f"DELETE FROM {table} WHERE period_start = ? {where}", (period,)).rowcount
+        conn.commit()
+
+
+def purge(conn, retention_days=None, hourly_retention_days=None, chunk_size=None, now=None):
+    """
+    Roll up pending rows, then delete raw scan_logs rows older than the retention in
+    chunks of `chunk_size`, each in its own short transaction so scans keep flowing.
+    Returns a dict with the number of rows deleted per table.
+    """
+    retention_days = retention_days if retention_days is not None else cfg.SCAN_LOG_RETENTION_DAYS
+    hourly_retention_days = (hourly_retention_days if hourly_retention_days is not None
+                             else cfg.SCAN_ROLLUP_HOURLY_RETENTION_DAYS)
+    chunk_size = chunk_size or cfg.SCAN_ROLLUP_CHUNK
+    now = int(time.time() if now is None else now)
+    cutoff = now - retention_days * DAY
+
+    rollup(conn, chunk_size)
+    mark = high_water_mark(conn)
+    deleted = {"scan_logs": 0}
+
+    # ids follow insertion time, so old rows are at the front of the table. Walk
+    # them in id order and stop at the first row still inside the retention
+    # window. Rows whose timestamp did not parse (NULL epoch) are never rolled
+    # up or deleted; the walk steps over them so they cannot stall the purge.
+    after = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, scanned_at_epoch FROM scan_logs WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+            (after, mark, chunk_size)
+        ).fetchall()
+        old = []
+        reached_window = False
+        for row_id, epoch in rows:
+            if epoch is None:
+                continue
+            if epoch >= cutoff:
+                reached_window = True
+                break
+            old.append(row_id)
+        if old:
+            deleted["scan_logs"] += conn.execute(
+                "DELETE FROM scan_logs WHERE id >= ? AND id <= ? AND scanned_at_epoch < ?",
+                (old[0], old[-1], cutoff)
+            ).rowcount
+            conn.commit()
+        if reached_window or len(rows) < chunk_size:
+            break
+        after = rows[-1][0]
+
+    deleted["scan_rollup_ips"] = _delete_periods(conn, "scan_rollup_ips", cutoff, "AND granularity = 'hourly'")
+    deleted["scan_rollup_ips"] += _delete_periods(conn, "scan_rollup_ips", cutoff - DAY, "AND granularity = 'daily'")
+    deleted["scan_rollups_hourly"] = _delete_periods(
+        conn, "scan_rollups_hourly", now - hourly_retention_days * DAY
+    )
+    return deleted
+
+
+# --- Reading ---------------------------------------------------------------------
+
+def total_scans(conn, batch_number):
+    """All scans ever recorded for a batch: daily rollups plus raw rows not rolled up yet."""
+    rolled = conn.execute(
+        "SELECT COALESCE(SUM(scans), 0) FROM scan_rollups_daily WHERE batch_number = ?", (batch_number,)
+    ).fetchone()[0]
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM scan_logs WHERE batch_number = ? AND id > ?",
+        (batch_number, high_water_mark(conn))
+    ).fetchone()[0]
+    return rolled + pending
+
+
+def batch_activity(conn, batch_number, granularity="daily", start=None, end=None):
+    """Rolled-up scan activity of a batch as a list of dicts, oldest period first."""
+    table, _ = ROLLUPS[granularity]
+    rows = conn.execute(
+        f"""
+        SELECT period_start, scans, distinct_ips, min_latitude, max_latitude, min_longitude, max_longitude
+        FROM {table}
+        WHERE batch_number = ? AND period_start >= ? AND period_start < ?
+        ORDER BY period_start
+        """,
+        (batch_number, start or 0, end or 2 ** 62)
+    ).fetchall()
+    keys = ("period_start", "scans", "distinct_ips", "min_latitude", "max_latitude",
+            "min_longitude", "max_longitude")
+    return [dict(zip(keys, row)) for row in rows]
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    conn = sqlite3.connect(cfg.DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL;")
+    init_rollups(conn)
+    if command == "rollup":
+        print(f"✅ {rollup(conn)} scan log rows rolled up.")
+    elif command == "purge":
+        for table, count in purge(conn).items():
+            print(f"✅ {count} rows deleted from {table}.")
+    elif command == "status":
+        mark = high_water_mark(conn)
+        pending = conn.execute("SELECT COUNT(*) FROM scan_logs WHERE id > ?", (mark,)).fetchone()[0]
+        raw = conn.execute("SELECT COUNT(*) FROM scan_logs").fetchone()[0]
+        print(f"High-water mark: scan_logs.id {mark}; {pending} rows pending; {raw} raw rows kept.")
+    else:
+        print("Usage: python -m backend.scan_rollups [rollup|purge|status]")
+        sys.exit(2)
+    conn.close()
@@ -0,0 +1,46 @@
+# backend/worker_pool.py
+
+# =============================================================================
+# S H A R E D   P R O C E S S   P O O L
+# =============================================================================
+# CPU-bound work that must not run on a web worker's request threads goes to
+# one ProcessPoolExecutor per web worker, shared by:
+#
+#   - backend/image_store.py       WebP and thumbnail variants of report photos
+#   - backend/packaging_match.py   perceptual hashes of report photos
+#   - backend/export_jobs.py       Word and PDF exports
+#
+# gunicorn runs several web workers, and each gets its own pool of
+# BACKGROUND_WORKERS processes. Keep BACKGROUND_WORKERS x gunicorn workers
+# within the machine's cores.
+#
+# The pool is created on first use in each process, because gunicorn forks
+# workers after import and a pool does not survive a fork.
+# =============================================================================
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.config import get_config
+
+cfg = get_config()
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """This process's pool, created on first use."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=cfg.BACKGROUND_WORKERS)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def submit(fn, *args):
+    """Run `fn(*args)` in the pool and return its Future. `fn` must be a module-level function."""
+    return get_pool().submit(fn, *args)
@@ -1,3 +1,26 @@
+// ===================================
+// Packaging Image Analysis
+// ===================================
+const renderImageAnalysis = (container, data) => {
+  delete container.dataset.pending;
+  if (data.error) {
+    container.innerHTML = `<p style="color: red;">${data.error}</p>`;
+  } else {
+    const confidence = (data.confidence * 100).toFixed(1);
+    container.innerHTML = `<p><strong>${data.label}</strong><br><em>(Confidence: ${confidence}%)</em></p>`;
+  }
+};
+
+window.setupImageAnalysis = (socket) => {
+  socket.on("report_analysis", (msg) => {
+    const container = document.getElementById(`analysis-${msg.report_id}`);
+    // Only for analyses this page asked for; new reports are analysed too.
+    if (container && container.dataset.pending) {
+      renderImageAnalysis(container, msg.error ? msg : msg.result);
+    }
+  });
+};
+
 // ===================================
 // Assisted Registration Scanner
 // ===================================
@@ -127,18 +150,16 @@ document.addEventListener("DOMContentLoaded", () => {
     const reportId = event.target.dataset.id;
     const container = document.getElementById(`analysis-${reportId}`);
     container.innerHTML = "<p><em>Analyzing...</em></p>";
+    container.dataset.pending = "1";
 
     fetch(`/api/analyze-image/${reportId}`, {
       method: "POST",
     })
       .then((response) => response.json())
       .then((data) => {
-        if (data.error) {
-          container.innerHTML = `<p style="color: red;">${data.error}</p>`;
-        } else {
-          const confidence = (data.confidence * 100).toFixed(1);
-          container.innerHTML = `<p><strong>${data.label}</strong><br><em>(Confidence: ${confidence}%)</em></p>`;
-        }
+        // "pending": the photo is being hashed; the result arrives as a
+        // report_analysis Socket.IO event (see setupImageAnalysis).
+        if (data.status !== "pending") renderImageAnalysis(container, data);
       })
       .catch((error) => {
         console.error("Analysis error:", error);
@@ -150,29 +171,4 @@ document.addEventListener("DOMContentLoaded", () => {
   if (reportsTable) {
     reportsTable.addEventListener("click", handleAnalysisClick);
   }
-
-  // --- Real-Time Report Search ---
-  const handleReportSearch = () => {
-    const searchInput = document.getElementById("report-search");
-    if (!searchInput) return;
-
-    searchInput.addEventListener("keyup", () => {
-      const searchTerm = searchInput.value.toLowerCase();
-      const tableBody = document.getElementById("reports-body");
-      const rows = tableBody.getElementsByTagName("tr");
-
-      for (let i = 0; i < rows.length; i++) {
-        const row = rows[i];
-        const rowText = row.textContent.toLowerCase();
-
-        if (rowText.includes(searchTerm)) {
-          row.style.display = "";
-        } else {
-          row.style.display = "none";
-        }
-      }
-    });
-  };
-
-  handleReportSearch();
 });
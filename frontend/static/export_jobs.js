@@ -0,0 +1,62 @@
+// ===================================
+// Word/PDF Export Jobs
+// ===================================
+// Links with class "export-job" point at POST /admin/exports. Clicking one
+// starts a background export; progress is shown in the .export-status element
+// of the same .export-links block and the file downloads when it is ready.
+// Progress arrives as `export_progress` events on the page's socket. The
+// status URL is also polled, because the job may run on another worker.
+window.setupExportJobs = (socket) => {
+  const links = document.querySelectorAll("a.export-job");
+  if (!links.length) return;
+  const jobs = {};
+  const POLL_MS = 3000;
+
+  const update = (job) => {
+    const entry = jobs[job.id];
+    if (!entry || entry.finished) return;
+    const { status } = entry;
+    if (job.status === "done") {
+      entry.finished = true;
+      clearInterval(entry.timer);
+      status.textContent = "";
+      window.location.href = entry.downloadUrl;
+    } else if (job.status === "failed") {
+      entry.finished = true;
+      clearInterval(entry.timer);
+      status.textContent = `Export failed: ${job.error || "unknown error"}`;
+    } else if (job.total_rows) {
+      const percent = Math.floor((100 * job.rows_done) / job.total_rows);
+      status.textContent = `Preparing ${job.format.toUpperCase()}… ${percent}% (${job.rows_done} of ${job.total_rows} rows)`;
+    } else {
+      status.textContent = `Preparing ${job.format.toUpperCase()}…`;
+    }
+  };
+
+  if (socket) socket.on("export_progress", update);
+
+  links.forEach((link) =>
+    link.addEventListener("click", (event) => {
+      event.preventDefault();
+      const status = link.closest(".export-links").querySelector(".export-status");
+      status.textContent = "Starting export…";
+      fetch(link.href, { method: "POST" })
+        .then((response) => response.json())
+        .then((data) => {
+          if (data.error) throw new Error(data.error);
+          const entry = { status, downloadUrl: data.download_url, finished: false };
+          entry.timer = setInterval(() => {
+            fetch(data.status_url)
+              .then((response) => response.json())
+              .then((body) => body.job && update(body.job))
+              .catch(() => {});
+          }, POLL_MS);
+          jobs[data.job.id] = entry;
+          update(data.job);
+        })
+        .catch((error) => {
+          status.textContent = `Export failed: ${error.message}`;
+        });
+    })
+  );
+};
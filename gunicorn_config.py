@@ -15,6 +15,17 @@ timeout = 120
 
 def post_fork(server, worker):
     server.log.info("Worker spawned (pid: %d)", worker.pid)
+    # With preload_app, create_app ran in the master and its notification
+    # worker thread did not survive the fork: start this worker's own.
+    if server.cfg.preload_app:
+        from backend.notification_queue import notification_worker
+        notification_worker.ensure_started()
+
+
+def worker_exit(server, worker):
+    # Commit any scan logs still buffered in this worker before it goes away.
+    from backend.scan_log_writer import scan_log_writer
+    scan_log_writer.shutdown()
 
 
 def when_ready(server):
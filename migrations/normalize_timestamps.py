@@ -0,0 +1,51 @@
+import sqlite3
+import sys
+
+# Adjust the path to your database if necessary
+DB_PATH = "medguard.db"
+
+# (table, column) pairs that must hold canonical 'YYYY-MM-DD HH:MM:SS' UTC text
+# so that the generated *_epoch columns (see backend/database.py) are correct.
+TIMESTAMP_COLUMNS = [
+    ("reports", "reported_on"),
+    ("adr_reports", "report_date"),
+    ("scan_logs", "scanned_at"),
+    ("drugs", "created_at"),
+]
+
+# Rows already in the canonical format came from CURRENT_TIMESTAMP and are UTC.
+# Rows in any other format (e.g. Python's datetime.now() with microseconds)
+# were written in the server's local time. They are converted to UTC with
+# SQLite's 'utc' modifier, which uses the time zone of the machine running this
+# script: run it with the same TZ as the server that wrote them, e.g.
+#
+#   TZ=Africa/Lagos python migrations/normalize_timestamps.py
+#
+# With --keep-local the rows are only reformatted, and keep the host's offset.
+
+def upgrade(to_utc=True):
+    """Rewrites timestamps stored in other formats, converting them from local time to UTC."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+    modifier = ", 'utc'" if to_utc else ""
+
+    try:
+        for table, column in TIMESTAMP_COLUMNS:
+            c.execute(f"""
+                UPDATE {table}
+                SET {column} = strftime('%Y-%m-%d %H:%M:%S', {column}{modifier})
+                WHERE {column} IS NOT NULL
+                  AND strftime('%Y-%m-%d %H:%M:%S', {column}) IS NOT NULL
+                  AND {column} != strftime('%Y-%m-%d %H:%M:%S', {column})
+            """)
+            print(f"'{table}.{column}': {c.rowcount} rows normalized"
+                  f"{' to UTC' if to_utc else ' (local time kept)'}.")
+        conn.commit()
+        print("✅ Timestamps normalized successfully.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade(to_utc="--keep-local" not in sys.argv[1:])
@@ -0,0 +1,25 @@
+import sqlite3
+
+# Adjust the path to your database if necessary
+DB_PATH = "medguard.db"
+
+def upgrade():
+    """Removes scan_anomaly_state rows of batch numbers that are not registered drugs."""
+    conn = sqlite3.connect(DB_PATH)
+    c = conn.cursor()
+
+    try:
+        # Earlier versions tracked every scanned code, including fake ones.
+        c.execute("""
+            DELETE FROM scan_anomaly_state
+            WHERE batch_number NOT IN (SELECT batch_number FROM drugs)
+        """)
+        conn.commit()
+        print(f"✅ {c.rowcount} anomaly state rows of unregistered codes removed.")
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,34 @@
+"""
+EXPLAIN QUERY PLAN regression tests for the hot SQL listed in
+backend/query_plans.py: no full scan of a large table and no temporary B-tree
+beyond the ones allowed there, against a seeded database with the real schema.
+"""
+
+import pytest
+
+from backend.query_plans import ALLOW_TEMP_BTREE, HOT_QUERIES, build_database, check, full_scans, temp_btrees
+
+
+@pytest.fixture(scope="module")
+def conn(tmp_path_factory):
+    conn = build_database(str(tmp_path_factory.mktemp("query_plans") / "plans.db"))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("query", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_plan(conn, query):
+    assert check(conn, [query]) == []
+
+
+def test_allowed_temp_btrees_name_hot_queries():
+    assert set(ALLOW_TEMP_BTREE) <= {q[0] for q in HOT_QUERIES}
+
+
+def test_check_reports_scans_and_temp_btrees(conn):
+    sql = "SELECT id FROM reports WHERE note = ? ORDER BY location"
+    assert full_scans(conn, sql, ("x",)) == {"reports"}
+    assert temp_btrees(conn, sql, ("x",)) == ["USE TEMP B-TREE FOR ORDER BY"]
+    assert check(conn, [("probe", sql, ("x",), {})]) == [
+        ("probe", "SCAN reports"), ("probe", "USE TEMP B-TREE FOR ORDER BY"),
+    ]
@@ -0,0 +1,157 @@
+"""
+Parity of the incremental scan anomaly state (backend/scan_anomaly.py) with
+the check it replaced, which re-read a batch's whole scan history from
+scan_logs on every scan. The same scan sequences are replayed through both.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from math import atan2, cos, radians, sin, sqrt
+
+import pytest
+
+from backend.database import init_db
+from backend.scan_anomaly import MAX_SCANS_PER_HOUR, ScanAnomalyTracker, evaluate_scan, haversine
+
+BATCH = "AMX-001"
+START = 1_750_000_020  # a whole minute, in epoch seconds
+
+LAGOS = (6.5244, 3.3792)
+ABUJA = (9.0765, 7.3986)
+IBADAN = (7.3775, 3.9470)
+
+
+# --- The old check, as it was in backend/routes/verify.py ------------------------------
+# Only `now` is a parameter, so the replay controls the clock, and haversine
+# uses the corrected lon2 - lon1 term.
+
+def old_haversine(lat1, lon1, lat2, lon2):
+    R = 6371
+    dLat, dLon = radians(lat2 - lat1), radians(lon2 - lon1)
+    a = sin(dLat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dLon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+
+def old_check_scan_anomalies(conn, batch_number, now):
+    logs = conn.execute(
+        "SELECT latitude, longitude, scanned_at FROM scan_logs WHERE batch_number = ? ORDER BY scanned_at DESC",
+        (batch_number,)
+    ).fetchall()
+
+    if len(logs) < 2:
+        return None
+
+    recent_scans = [log for log in logs if log['scanned_at'] > now - timedelta(hours=1)]
+    if len(recent_scans) > 50:
+        return f"This code has been scanned an unusually high number of times ({len(recent_scans)} times in the last hour)."
+
+    latest_log = logs[0]
+    previous_log = logs[1]
+
+    if latest_log['latitude'] and previous_log['latitude']:
+        distance = old_haversine(latest_log['latitude'], latest_log['longitude'],
+                                 previous_log['latitude'], previous_log['longitude'])
+        time_diff = latest_log['scanned_at'] - previous_log['scanned_at']
+        hours = time_diff.total_seconds() / 3600
+
+        if hours > 0:
+            speed = distance / hours
+            if speed > 900:
+                return (f"This code was recently scanned in two locations that are too far apart to be plausible "
+                        f"({int(distance)} km apart in {int(hours*60)} minutes). This suggests the code has been cloned.")
+
+    return None
+
+
+# --- Replay -----------------------------------------------------------------------------
+
+def _naive_utc(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+@pytest.fixture
+def replay(tmp_path):
+    """Feed (epoch, latitude, longitude) scans to both checks; return both warning lists."""
+    old_conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    old_conn.row_factory = sqlite3.Row
+    old_conn.execute(
+        "CREATE TABLE scan_logs (batch_number TEXT, scanned_at TIMESTAMP, latitude REAL, longitude REAL)"
+    )
+
+    db_path = str(tmp_path / "scan_anomaly.db")
+    init_db(db_path)
+    new_conn = sqlite3.connect(db_path)
+    tracker = ScanAnomalyTracker(max_entries=100, refresh_interval=60)
+
+    def run(scans):
+        old, new = [], []
+        for epoch, latitude, longitude in scans:
+            old_conn.execute(
+                "INSERT INTO scan_logs VALUES (?, ?, ?, ?)",
+                (BATCH, _naive_utc(epoch), latitude, longitude)
+            )
+            old.append(old_check_scan_anomalies(old_conn, BATCH, _naive_utc(epoch)))
+            new.append(tracker.record(new_conn, BATCH, latitude, longitude, now=epoch))
+        return old, new
+
+    yield run
+    old_conn.close()
+    new_conn.close()
+
+
+def test_first_scan_is_never_flagged(replay):
+    old, new = replay([(START, *LAGOS)])
+    assert old == new == [None]
+
+
+def test_first_scan_ignores_the_rate_threshold():
+    assert evaluate_scan(1, MAX_SCANS_PER_HOUR + 10, None, (START, *LAGOS)) is None
+
+
+@pytest.mark.parametrize("count", [MAX_SCANS_PER_HOUR, MAX_SCANS_PER_HOUR + 1, MAX_SCANS_PER_HOUR + 5])
+def test_rate_threshold(replay, count):
+    scans = [(START + 30 * i, None, None) for i in range(count)]
+    old, new = replay(scans)
+    assert old == new
+    assert new[-1] == (None if count <= MAX_SCANS_PER_HOUR else
+                       f"This code has been scanned an unusually high number of times "
+                       f"({count} times in the last hour).")
+
+
+def test_rate_ignores_scans_older_than_an_hour(replay):
+    earlier = [(START + 60 * i, None, None) for i in range(30)]
+    later = [(START + 7200 + 30 * i, None, None) for i in range(40)]
+    old, new = replay(earlier + later)
+    assert old == new
+    assert not any(new)
+
+
+def test_impossible_travel(replay):
+    old, new = replay([(START, *LAGOS), (START + 600, *ABUJA)])
+    assert old == new
+    assert new[0] is None
+    assert "km apart in 10 minutes" in new[1]
+
+
+def test_plausible_travel(replay):
+    old, new = replay([(START, *LAGOS), (START + 3 * 3600, *IBADAN)])
+    assert old == new == [None, None]
+
+
+def test_travel_needs_both_locations(replay):
+    old, new = replay([(START, *LAGOS), (START + 60, None, None), (START + 120, *ABUJA)])
+    assert old == new == [None, None, None]
+
+
+def test_travel_uses_the_longitude_difference(replay):
+    # 10 degrees apart along latitude 5: about 1,108 km. With the old
+    # lon2 - lat1 term this measured 1,662 km and was flagged at 90 minutes.
+    assert haversine(5, 10, 5, 20) == pytest.approx(1108, abs=1)
+    # lon2 - lat1 = 15 degrees, i.e. what the old term measured.
+    assert old_haversine(5, 10, 5, 25) == pytest.approx(1662, abs=1)
+    old, new = replay([(START, 5.0, 10.0), (START + 5400, 5.0, 20.0)])
+    assert old == new == [None, None]
+    old, new = replay([(START + 6000, 5.0, 30.0)])
+    assert old == new
+    assert "1107 km apart in 10 minutes" in new[0]